@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CustomUser, BusinessProfile, SearchHistory, PosterGeneration, Festival, UserHistory
+from .models import CustomUser, BusinessProfile, SearchHistory, PosterGeneration, Festival, UserHistory, PosterJob, VideoJob, PosterCacheEntry, PosterBackground, CaptionCacheEntry, FestivalDraft
 from django.contrib.auth.admin import UserAdmin
 from django.db import transaction
 from django.contrib import messages
@@ -178,9 +178,51 @@ class UserHistoryAdmin(admin.ModelAdmin):
     is_text_action.boolean = True
     is_text_action.short_description = 'Text Action'
 
+class PosterJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'promotion_name', 'status', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('user__username', 'promotion_name')
+    readonly_fields = ('created_at', 'started_at', 'finished_at', 'poster_url')
+
+class VideoJobAdmin(admin.ModelAdmin):
+    list_display = ('user', 'campaign_name', 'status', 'polls', 'attempts', 'created_at', 'finished_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('user__username', 'campaign_name', 'operation_name')
+    readonly_fields = ('created_at', 'submitted_at', 'finished_at', 'operation_name', 'video_url')
+
+class PosterCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('cache_key', 'model_id', 'language', 'hit_count', 'created_at', 'last_used_at')
+    list_filter = ('model_id', 'language')
+    search_fields = ('cache_key', 'poster_url')
+    readonly_fields = ('created_at', 'last_used_at')
+
+class PosterBackgroundAdmin(admin.ModelAdmin):
+    list_display = ('business_type', 'theme', 'model_id', 'hit_count', 'created_at', 'last_used_at')
+    list_filter = ('model_id',)
+    search_fields = ('business_type', 'theme', 'background_key')
+    readonly_fields = ('created_at', 'last_used_at')
+
+class CaptionCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('user', 'user_input', 'language', 'length', 'hit_count', 'created_at', 'last_used_at')
+    list_filter = ('language', 'length')
+    search_fields = ('user__username', 'user_input', 'cache_key')
+    readonly_fields = ('created_at', 'last_used_at')
+
+class FestivalDraftAdmin(admin.ModelAdmin):
+    list_display = ('user', 'festival', 'status', 'language', 'poster_job', 'generated_at')
+    list_filter = ('status', 'festival')
+    search_fields = ('user__username', 'festival__name')
+    readonly_fields = ('created_at', 'generated_at')
+
 admin.site.register(CustomUser, CustomUserAdmin)
 admin.site.register(BusinessProfile, BusinessProfileAdmin)
 admin.site.register(SearchHistory, SearchHistoryAdmin)
 admin.site.register(PosterGeneration, PosterGenerationAdmin)
 admin.site.register(Festival, FestivalAdmin)
 admin.site.register(UserHistory, UserHistoryAdmin)
+admin.site.register(PosterJob, PosterJobAdmin)
+admin.site.register(VideoJob, VideoJobAdmin)
+admin.site.register(PosterCacheEntry, PosterCacheEntryAdmin)
+admin.site.register(PosterBackground, PosterBackgroundAdmin)
+admin.site.register(CaptionCacheEntry, CaptionCacheEntryAdmin)
+admin.site.register(FestivalDraft, FestivalDraftAdmin)
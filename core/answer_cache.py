@@ -0,0 +1,239 @@
+"""
+Similarity-based answer cache for the chatbot
+
+Most chat messages are navigational and repeat with small wording changes
+("how do i make a poster", "How can I make a poster?"). Answers are kept in
+an in-process index keyed by context (page + profile version); questions are
+compared by Jaccard similarity of their character trigrams (filler words such
+as "how do i" left out), estimated with a 32-value MinHash and bucketed with
+LSH bands, so a lookup is a handful of dict probes plus an exact check of the
+few candidates (well under a millisecond with tens of thousands of entries).
+
+Each process has its own index. Staff invalidation clears the local index and
+records the invalidation in the "shared" cache (Redis or the database, see
+CACHES), where other processes pick it up within ANSWER_CACHE_SYNC_SECONDS.
+"""
+import hashlib
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+NUM_PERMUTATIONS = 32
+BANDS = 8  # 8 bands of 4 rows: pairs above ~0.6 similarity share a bucket with high probability
+ROWS = NUM_PERMUTATIONS // BANDS
+
+# Invalidations must reach every worker, so they go to the cache all processes share
+shared_cache = caches["shared"]
+
+# Fixed XOR masks standing in for independent hash permutations
+_MASKS = random.Random(20240601).sample(range(1, 2 ** 63), NUM_PERMUTATIONS)
+
+_GENERATION_KEY = "answer_cache:generation"
+_PAGE_INVALIDATIONS_KEY = "answer_cache:page_invalidations"
+_WORD_RE = re.compile(r"[^\w\s]+")
+# Filler words that change how a question is phrased but not what it asks
+_STOPWORDS = frozenset(
+    "a an the i me my we our you your is are am do does did can could would will should "
+    "how what where please pls hi hello hey to in on of for it this that there".split()
+)
+
+
+def normalize_question(text):
+    """Lower-case, drop punctuation and collapse whitespace"""
+    return " ".join(_WORD_RE.sub(" ", (text or "").lower()).split())
+
+
+def _shingles(normalized):
+    words = [word for word in normalized.split() if word not in _STOPWORDS] or normalized.split()
+    padded = f" {' '.join(words)} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _hash(shingle):
+    return int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def _signature(shingles):
+    hashes = [_hash(shingle) for shingle in shingles]
+    return [min(value ^ mask for value in hashes) for mask in _MASKS]
+
+
+def _band_keys(context, signature):
+    return [(context, band, tuple(signature[band * ROWS:(band + 1) * ROWS])) for band in range(BANDS)]
+
+
+class _Entry:
+    __slots__ = ("question", "context", "shingles", "band_keys", "answer", "hits", "created")
+
+    def __init__(self, question, context, shingles, band_keys, answer):
+        self.question = question
+        self.context = context
+        self.shingles = shingles
+        self.band_keys = band_keys
+        self.answer = answer
+        self.hits = 0
+        self.created = time.time()
+
+
+class AnswerCache:
+    """LRU-bounded MinHash/LSH index of chatbot answers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._buckets = {}
+        self._next_id = 0
+        self._generation = None
+        self._page_invalidations = {}
+        self._synced_at = 0.0
+
+    def _sync(self):
+        """Drop the local index when another process invalidated the cache"""
+        now = time.monotonic()
+        if now - self._synced_at < settings.ANSWER_CACHE_SYNC_SECONDS:
+            return
+        self._synced_at = now
+        generation = shared_cache.get(_GENERATION_KEY, 0)
+        if self._generation is not None and generation != self._generation:
+            self._clear()
+        self._generation = generation
+
+        page_invalidations = shared_cache.get(_PAGE_INVALIDATIONS_KEY) or {}
+        for page, invalidated_at in page_invalidations.items():
+            if self._page_invalidations.get(page) != invalidated_at:
+                self._remove_page(page, before=invalidated_at)
+        self._page_invalidations = page_invalidations
+
+    def _clear(self):
+        self._entries.clear()
+        self._buckets.clear()
+
+    def _remove(self, entry_id):
+        entry = self._entries.pop(entry_id)
+        for key in entry.band_keys:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _remove_page(self, page, before=None):
+        prefix = f"{page}|"
+        stale = [
+            entry_id for entry_id, entry in self._entries.items()
+            if entry.context.startswith(prefix) and (before is None or entry.created <= before)
+        ]
+        for entry_id in stale:
+            self._remove(entry_id)
+        return len(stale)
+
+    def lookup(self, question, context):
+        """
+        Cached answer to a similar question asked in the same context
+
+        Returns:
+            tuple: (answer, similarity) or (None, 0.0)
+        """
+        normalized = normalize_question(question)
+        if len(normalized) < settings.ANSWER_CACHE_MIN_CHARS:
+            return None, 0.0
+        shingles = _shingles(normalized)
+        band_keys = _band_keys(context, _signature(shingles))
+
+        with self._lock:
+            self._sync()
+            candidates = set()
+            for key in band_keys:
+                candidates.update(self._buckets.get(key, ()))
+
+            best_id, best_score = None, 0.0
+            expired = []
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if time.time() - entry.created > settings.ANSWER_CACHE_TTL_SECONDS:
+                    expired.append(entry_id)
+                    continue
+                score = len(shingles & entry.shingles) / len(shingles | entry.shingles)
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+            for entry_id in expired:
+                self._remove(entry_id)
+
+            if best_id is None or best_score < settings.ANSWER_CACHE_SIMILARITY:
+                metrics.incr("answer_cache.miss")
+                return None, best_score
+            entry = self._entries[best_id]
+            entry.hits += 1
+            self._entries.move_to_end(best_id)
+        metrics.incr("answer_cache.hit")
+        return entry.answer, best_score
+
+    def store(self, question, context, answer):
+        """Index an answer (questions shorter than ANSWER_CACHE_MIN_CHARS are not cached)"""
+        normalized = normalize_question(question)
+        if len(normalized) < settings.ANSWER_CACHE_MIN_CHARS or not answer:
+            return
+        shingles = _shingles(normalized)
+        band_keys = _band_keys(context, _signature(shingles))
+
+        with self._lock:
+            self._sync()
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = _Entry(normalized, context, shingles, band_keys, answer)
+            for key in band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > settings.ANSWER_CACHE_MAX_ENTRIES:
+                self._remove(next(iter(self._entries)))
+                metrics.incr("answer_cache.evicted")
+        metrics.incr("answer_cache.store")
+
+    def invalidate(self, page=None):
+        """
+        Drop cached answers, all of them or those of one page
+
+        Returns:
+            int: number of entries removed from this process
+        """
+        with self._lock:
+            if page is None:
+                removed = len(self._entries)
+                self._clear()
+                try:
+                    self._generation = shared_cache.incr(_GENERATION_KEY)
+                except ValueError:
+                    shared_cache.set(_GENERATION_KEY, 1, None)
+                    self._generation = 1
+            else:
+                removed = self._remove_page(page)
+                self._page_invalidations = dict(shared_cache.get(_PAGE_INVALIDATIONS_KEY) or {}, **{page: time.time()})
+                shared_cache.set(_PAGE_INVALIDATIONS_KEY, self._page_invalidations, settings.ANSWER_CACHE_TTL_SECONDS)
+        metrics.incr("answer_cache.invalidated", removed)
+        return removed
+
+    def stats(self):
+        with self._lock:
+            entries = len(self._entries)
+            buckets = len(self._buckets)
+        return {
+            'hits': metrics.get_counter("answer_cache.hit"),
+            'misses': metrics.get_counter("answer_cache.miss"),
+            'hit_rate': metrics.hit_rate("answer_cache"),
+            'entries': entries,
+            'buckets': buckets,
+        }
+
+
+answer_cache = AnswerCache()
+
+
+def answer_context(current_page, business):
+    """Context an answer is valid in: the page and the user's profile version"""
+    return f"{current_page or ''}|{business.profile_version}"
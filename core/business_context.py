@@ -0,0 +1,107 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import BusinessProfile, PosterGeneration, UserHistory
+
+NOT_SET = "(not set)"
+
+
+def _cache_key(user_id):
+    return f"business_context:{user_id}"
+
+
+class BusinessContext:
+    """
+    Business details every AI prompt is built from, for one user
+
+    Built from the BusinessProfile plus recent activity in a single pass and
+    kept in the per-process cache until a post_save signal on BusinessProfile,
+    PosterGeneration or UserHistory invalidates it (see core.models).
+    """
+
+    PROFILE_FIELDS = [
+        'business_name', 'description', 'country', 'state', 'district', 'town', 'address', 'phone',
+    ]
+
+    def __init__(self, user_id, profile=None, recent_posters=None, caption_count=0):
+        self.user_id = user_id
+        self.exists = profile is not None
+        for field in self.PROFILE_FIELDS:
+            setattr(self, field, getattr(profile, field, "") or "")
+
+        if profile and profile.business_hours_start and profile.business_hours_end:
+            self.timing = f"{profile.business_hours_start.strftime('%I:%M %p')} - {profile.business_hours_end.strftime('%I:%M %p')}"
+        else:
+            self.timing = ""
+
+        self.recent_posters = list(recent_posters or [])
+        self.caption_count = caption_count
+        self.profile_version = self._compute_version(include_activity=False)
+        self.version = self._compute_version()
+
+    def _compute_version(self, include_activity=True):
+        """
+        Short hash of everything a prompt can contain; changes whenever the context does
+
+        With include_activity=False only the profile is hashed, so the value
+        survives new posters and captions (used to key cached captions).
+        """
+        payload = {field: getattr(self, field) for field in self.PROFILE_FIELDS}
+        payload.update(timing=self.timing)
+        if include_activity:
+            payload.update(recent_posters=self.recent_posters, caption_count=self.caption_count)
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+    def get(self, field, default=NOT_SET):
+        """Profile value, or the default when it is blank"""
+        return getattr(self, field) or default
+
+    @property
+    def business_type(self):
+        """First sentence of the description, e.g. "Beauty parlour" """
+        return self.description.split('.')[0] if self.description else "Business"
+
+    def location(self, parts=('town', 'district', 'state', 'country'), default="Your Location"):
+        """Comma separated location from the given fields, skipping blanks"""
+        values = [getattr(self, part) for part in parts if getattr(self, part)]
+        return ", ".join(values) if values else default
+
+    def recent_posters_text(self):
+        return ", ".join(self.recent_posters) if self.recent_posters else "No posters generated yet."
+
+
+def build_business_context(user):
+    """Query the profile and recent activity of a user (3 queries)"""
+    profile = BusinessProfile.objects.filter(user=user).first()
+    recent_posters = [
+        f"{promotion_name} ({offer_type})"
+        for promotion_name, offer_type in PosterGeneration.objects.filter(user=user)
+        .order_by('-id').values_list('promotion_name', 'offer_type')[:3]
+    ]
+    caption_count = UserHistory.objects.filter(user=user, action_type='text_generation').count()
+    return BusinessContext(user.pk, profile, recent_posters, caption_count)
+
+
+def get_business_context(user):
+    """
+    Cached BusinessContext of a user
+
+    Args:
+        user: CustomUser instance
+
+    Returns:
+        BusinessContext (check .exists before relying on profile fields)
+    """
+    key = _cache_key(user.pk)
+    context = cache.get(key)
+    if context is None:
+        context = build_business_context(user)
+        cache.set(key, context, settings.BUSINESS_CONTEXT_CACHE_SECONDS)
+    return context
+
+
+def invalidate_business_context(user_id):
+    cache.delete(_cache_key(user_id))
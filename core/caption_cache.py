@@ -0,0 +1,175 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import metrics
+from .models import CaptionCacheEntry
+
+
+def normalize_focus(text):
+    """Lower-case, collapse whitespace and drop trailing punctuation so retyped focus text shares a key"""
+    return " ".join((text or "").lower().split()).rstrip(" .!?")
+
+
+def caption_cache_key(business, user_input, language, length):
+    """
+    Content address of a caption request
+
+    Args:
+        business: BusinessContext of the user (its profile_version is part of the key,
+                  so editing the profile starts new pools)
+        user_input: Focus text typed by the user
+        language: Caption language
+        length: Caption length option
+
+    Returns:
+        str: hex SHA-256 digest
+    """
+    payload = "\x1f".join([
+        str(business.user_id),
+        business.profile_version,
+        normalize_focus(user_input),
+        (language or "").strip().lower(),
+        (length or "").strip().lower(),
+    ])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _saved_seconds():
+    """Typical provider time a cache hit avoids: p50 of recent caption calls"""
+    for name in ("caption.generate", "text_stream.caption.total"):
+        seconds = metrics.percentile(name, 50)
+        if seconds is not None:
+            return seconds
+    return 0.0
+
+
+def get_cached_caption(cache_key):
+    """
+    Next caption from a full pool, rotating through it on every hit
+
+    A pool that is still filling (fewer than CAPTION_CACHE_POOL_SIZE captions)
+    counts as a miss, so the first requests for a key still produce new captions.
+
+    Returns:
+        str or None
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CAPTION_CACHE_TTL_SECONDS)
+    entry = CaptionCacheEntry.objects.filter(cache_key=cache_key, created_at__gte=cutoff).first()
+    if not entry or len(entry.captions) < settings.CAPTION_CACHE_POOL_SIZE:
+        metrics.incr("caption_cache.miss")
+        return None
+
+    caption = entry.captions[entry.next_index % len(entry.captions)]
+    CaptionCacheEntry.objects.filter(pk=entry.pk).update(
+        next_index=F("next_index") + 1,
+        hit_count=F("hit_count") + 1,
+        last_used_at=timezone.now()
+    )
+    metrics.incr("caption_cache.hit")
+    metrics.incr("caption_cache.saved_seconds", _saved_seconds())
+    return caption
+
+
+def get_cached_captions(cache_keys):
+    """
+    get_cached_caption for many keys with a single lookup query
+
+    Returns:
+        dict: cache key -> caption, for the keys with a full pool
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.CAPTION_CACHE_TTL_SECONDS)
+    entries = CaptionCacheEntry.objects.filter(cache_key__in=set(cache_keys), created_at__gte=cutoff)
+    full = {entry.cache_key: entry for entry in entries if len(entry.captions) >= settings.CAPTION_CACHE_POOL_SIZE}
+
+    captions = {}
+    for cache_key in cache_keys:
+        entry = full.get(cache_key)
+        if entry is None:
+            metrics.incr("caption_cache.miss")
+            continue
+        # Repeated keys in one request rotate through the pool too
+        captions[cache_key] = entry.captions[entry.next_index % len(entry.captions)]
+        entry.next_index += 1
+        entry.hit_count += 1
+        metrics.incr("caption_cache.hit")
+        metrics.incr("caption_cache.saved_seconds", _saved_seconds())
+
+    if full:
+        now = timezone.now()
+        for entry in full.values():
+            entry.last_used_at = now
+        CaptionCacheEntry.objects.bulk_update(full.values(), ["next_index", "hit_count", "last_used_at"])
+    return captions
+
+
+def store_cached_caption(cache_key, user, business, user_input, language, length, caption):
+    """
+    Add a freshly generated caption to its pool
+
+    Expired pools start over. Pools the user built for an older profile are
+    dropped, then the TTL / CAPTION_CACHE_MAX_ENTRIES LRU bounds are applied.
+    """
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=settings.CAPTION_CACHE_TTL_SECONDS)
+    entry = CaptionCacheEntry.objects.filter(cache_key=cache_key).first()
+
+    if entry and entry.created_at >= cutoff:
+        if caption not in entry.captions and len(entry.captions) < settings.CAPTION_CACHE_POOL_SIZE:
+            entry.captions = entry.captions + [caption]
+            entry.last_used_at = now
+            entry.save(update_fields=["captions", "last_used_at"])
+    else:
+        CaptionCacheEntry.objects.update_or_create(
+            cache_key=cache_key,
+            defaults={
+                'user': user,
+                'context_version': business.profile_version,
+                'user_input': normalize_focus(user_input),
+                'language': (language or "").strip().lower(),
+                'length': length or "",
+                'captions': [caption],
+                'next_index': 0,
+                'created_at': now,
+                'last_used_at': now,
+            }
+        )
+    metrics.incr("caption_cache.store")
+
+    stale, _ = CaptionCacheEntry.objects.filter(user=user).exclude(context_version=business.profile_version).delete()
+    if stale:
+        metrics.incr("caption_cache.evicted", stale)
+    evict_caption_cache()
+
+
+def evict_caption_cache():
+    """Apply TTL expiry and the CAPTION_CACHE_MAX_ENTRIES LRU bound"""
+    cutoff = timezone.now() - timedelta(seconds=settings.CAPTION_CACHE_TTL_SECONDS)
+    expired, _ = CaptionCacheEntry.objects.filter(created_at__lt=cutoff).delete()
+
+    overflow_ids = list(
+        CaptionCacheEntry.objects.order_by("-last_used_at")
+        .values_list("id", flat=True)[settings.CAPTION_CACHE_MAX_ENTRIES:]
+    )
+    evicted = 0
+    if overflow_ids:
+        evicted, _ = CaptionCacheEntry.objects.filter(id__in=overflow_ids).delete()
+
+    if expired or evicted:
+        metrics.incr("caption_cache.evicted", expired + evicted)
+    return expired + evicted
+
+
+def caption_cache_stats():
+    """Counters of this process plus totals stored in the database"""
+    return {
+        'hits': metrics.get_counter("caption_cache.hit"),
+        'misses': metrics.get_counter("caption_cache.miss"),
+        'hit_rate': metrics.hit_rate("caption_cache"),
+        'saved_provider_seconds': round(metrics.get_counter("caption_cache.saved_seconds"), 2),
+        'entries': CaptionCacheEntry.objects.count(),
+        'lifetime_hits': CaptionCacheEntry.objects.aggregate(total=Sum("hit_count"))['total'] or 0,
+    }
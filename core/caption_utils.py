@@ -0,0 +1,440 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from . import metrics
+from .business_context import invalidate_business_context
+from .caption_cache import caption_cache_key, get_cached_caption, get_cached_captions, store_cached_caption
+from .models import SearchHistory, UserHistory
+from .rate_limit import backoff_delay, is_rate_limit_error
+from .sse_utils import format_sse, iterate_in_thread
+from .text_router import agenerate_text, generate_text, stream_text
+
+# Provider order for captions until the text router has latency samples
+CAPTION_PROVIDERS = ["cohere", "gemini"]
+CAPTION_TEMPERATURE = 0.7
+
+# Caption length option -> max tokens
+CAPTION_TOKENS = {"small": 100, "medium": 200, "long": 300}
+
+RATE_LIMITED_MESSAGE = "❌ Error: 🚦 Too many requests! Please wait a minute and try again."
+
+
+def build_caption_prompt(business, user_input, language):
+    """
+    Prompt for a social media caption
+
+    Args:
+        business: BusinessContext of the user
+        user_input: What the caption should focus on
+        language: Caption language
+
+    Returns:
+        str: the prompt
+    """
+    location_str = business.location(parts=('town', 'state'), default="your area")
+    return f"""Task: Output only a funny and engaging social media caption for a business named {business.business_name}.
+Language: {language}
+Business Name: {business.business_name}
+Services: {business.description}
+Location: {location_str}
+Focus: {user_input}
+Instructions: Use at least 4 relevant emojis. Output only the caption text."""
+
+
+def caption_error_message(error):
+    """User-facing text for a failed caption request"""
+    if is_rate_limit_error(error):
+        return RATE_LIMITED_MESSAGE
+    return f"❌ Error: {str(error)}"
+
+
+def generate_caption(prompt, max_tokens):
+    """Complete caption from the text router (raises on provider errors)"""
+    started = time.monotonic()
+    ok = False
+    try:
+        caption, provider = generate_text(
+            prompt, "caption", preferred=CAPTION_PROVIDERS, max_tokens=max_tokens, temperature=CAPTION_TEMPERATURE
+        )
+        ok = True
+    finally:
+        metrics.observe("caption.generate", time.monotonic() - started, ok=ok)
+    return caption
+
+
+def get_or_generate_caption(cache_key, user, business, prompt, max_tokens, input_data):
+    """
+    Caption from the cache pool, or a new one from Cohere that is added to the pool
+
+    Args:
+        cache_key: caption_cache_key of the request
+        user: Requesting user
+        business: BusinessContext of the user
+        prompt: Prompt from build_caption_prompt
+        max_tokens: Token limit for the length option
+        input_data: dict with user_input, language and length
+
+    Returns:
+        tuple: (caption, cache_hit)
+    """
+    cached = get_cached_caption(cache_key)
+    if cached:
+        return cached, True
+    caption = generate_caption(prompt, max_tokens)
+    if caption:
+        store_cached_caption(cache_key, user, business, input_data['user_input'],
+                             input_data['language'], input_data['length'], caption)
+    return caption, False
+
+
+async def aget_or_generate_caption(cache_key, user, business, prompt, max_tokens, input_data):
+    """get_or_generate_caption for async views: no thread is held while the provider works"""
+    cached = await sync_to_async(get_cached_caption)(cache_key)
+    if cached:
+        return cached, True
+    started = time.monotonic()
+    ok = False
+    try:
+        caption, provider = await agenerate_text(
+            prompt, "caption", preferred=CAPTION_PROVIDERS, max_tokens=max_tokens, temperature=CAPTION_TEMPERATURE
+        )
+        ok = True
+    finally:
+        metrics.observe("caption.generate", time.monotonic() - started, ok=ok)
+    if caption:
+        await sync_to_async(store_cached_caption)(cache_key, user, business, input_data['user_input'],
+                                                  input_data['language'], input_data['length'], caption)
+    return caption, False
+
+
+def record_caption(user, input_data, caption, prompt):
+    """UserHistory row for a generated caption"""
+    UserHistory.objects.create(
+        user=user,
+        action_type='text_generation',
+        input_data=input_data,
+        output_data=caption,
+        prompt_used=prompt
+    )
+
+
+def _record_streamed_caption(cache_key, user, business, input_data, caption, prompt, cache_hit):
+    if input_data.get('user_input'):
+        SearchHistory.objects.get_or_create(user=user, search_query=input_data['user_input'])
+    if cache_hit:
+        input_data = dict(input_data, cache_hit=True)
+    elif caption:
+        store_cached_caption(cache_key, user, business, input_data['user_input'],
+                             input_data['language'], input_data['length'], caption)
+    record_caption(user, input_data, caption, prompt)
+
+
+async def caption_events(cache_key, user, business, prompt, max_tokens, input_data):
+    """
+    Server-sent events for a streamed caption
+
+    Emits a 'token' event per chunk, then 'done' with the full caption or
+    'failed' with an error message. A cached caption is sent as a single token.
+    The search, history and cache rows are written once the stream has
+    completed, and only for a successful caption; if the client disconnects
+    first, the provider stream is closed and nothing is stored.
+    """
+    caption = await sync_to_async(get_cached_caption)(cache_key)
+    cache_hit = bool(caption)
+    if cache_hit:
+        yield format_sse('token', {'text': caption})
+    else:
+        cancelled = threading.Event()
+        chunks = stream_text(prompt, "caption", preferred=CAPTION_PROVIDERS, max_tokens=max_tokens,
+                             temperature=CAPTION_TEMPERATURE, cancelled=cancelled)
+        parts = []
+        try:
+            async for chunk in iterate_in_thread(chunks):
+                parts.append(chunk)
+                yield format_sse('token', {'text': chunk})
+        except Exception as e:
+            print(f"DEBUG: Caption stream failed: {e}")
+            yield format_sse('failed', {'error': caption_error_message(e)})
+            return
+        finally:
+            # Runs on disconnect too (the response is cancelled): close the provider stream now,
+            # or, if a worker thread is still waiting on it, at its next chunk
+            cancelled.set()
+            try:
+                chunks.close()
+            except ValueError:
+                pass
+        caption = "".join(parts).strip()
+
+    await sync_to_async(_record_streamed_caption)(cache_key, user, business, input_data, caption, prompt, cache_hit)
+    yield format_sse('done', {'marketing_text': caption})
+
+
+# Rough word budget per caption for the length options, used in batched prompts
+CAPTION_WORDS = {"small": 40, "medium": 80, "long": 120}
+
+
+def build_batch_caption_prompt(business, focuses, language, length):
+    """
+    One prompt asking for a caption per focus, answered as a JSON array
+
+    Args:
+        business: BusinessContext of the user
+        focuses: Focus texts, one caption each
+        language: Caption language (shared by the batch)
+        length: Length option (shared by the batch)
+
+    Returns:
+        str: the prompt
+    """
+    location_str = business.location(parts=('town', 'state'), default="your area")
+    numbered = "\n".join(f"{number}. {focus}" for number, focus in enumerate(focuses, start=1))
+    return f"""Task: Write {len(focuses)} separate funny and engaging social media captions for a business named {business.business_name}, one for each focus below.
+Language: {language}
+Business Name: {business.business_name}
+Services: {business.description}
+Location: {location_str}
+Focuses:
+{numbered}
+Instructions: Use at least 4 relevant emojis in every caption. Keep each caption under {CAPTION_WORDS.get(length, 40)} words.
+Output only a JSON array of {len(focuses)} strings, the captions in the same order as the focuses, with no other text."""
+
+
+def parse_batch_captions(text, count):
+    """
+    Captions from a batched answer
+
+    Returns:
+        list of str, or None if the answer is not a JSON array of `count` non-empty strings
+    """
+    start, end = text.find('['), text.rfind(']')
+    if start == -1 or end <= start:
+        return None
+    try:
+        captions = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(captions, list) or len(captions) != count:
+        return None
+    if not all(isinstance(caption, str) and caption.strip() for caption in captions):
+        return None
+    return [caption.strip() for caption in captions]
+
+
+def _generate_batch(business, items, language, length):
+    """One provider call for several items of the same language and length; None if unusable"""
+    prompt = build_batch_caption_prompt(business, [item['focus'] for item in items], language, length)
+    max_tokens = CAPTION_TOKENS.get(length, 100) * len(items) + 50
+    started = time.monotonic()
+    text, provider = generate_text(prompt, "caption_batch", preferred=CAPTION_PROVIDERS,
+                                   max_tokens=max_tokens, temperature=CAPTION_TEMPERATURE)
+    captions = parse_batch_captions(text, len(items))
+    metrics.observe("caption_batch.generate", time.monotonic() - started, ok=captions is not None)
+    if captions is None:
+        print(f"DEBUG: Batched caption answer from {provider} was not a list of {len(items)} captions")
+        return None
+    return [(caption, prompt) for caption in captions]
+
+
+def _generate_single(business, item):
+    prompt = build_caption_prompt(business, item['focus'], item['language'])
+    return generate_caption(prompt, CAPTION_TOKENS.get(item['length'], 100)), prompt
+
+
+def parse_bulk_items(raw_items):
+    """
+    Validate bulk caption items
+
+    Args:
+        raw_items: list of dicts with 'focus' (or 'user_input'), optional 'language' and 'length'
+
+    Returns:
+        tuple: (items, error message or None)
+    """
+    if not isinstance(raw_items, list) or not raw_items:
+        return None, "Provide a non-empty list of items."
+    if len(raw_items) > settings.CAPTION_BULK_MAX_ITEMS:
+        return None, f"At most {settings.CAPTION_BULK_MAX_ITEMS} captions per request."
+
+    items = []
+    for number, raw in enumerate(raw_items, start=1):
+        if not isinstance(raw, dict):
+            return None, f"Item {number} must be an object."
+        focus = str(raw.get('focus', raw.get('user_input', ''))).strip()
+        language = str(raw.get('language') or 'english').strip()
+        length = str(raw.get('length') or 'small').strip().lower()
+        if not focus:
+            return None, f"Item {number} has no focus."
+        if length not in CAPTION_TOKENS:
+            return None, f"Item {number}: length must be one of {', '.join(CAPTION_TOKENS)}."
+        items.append({'focus': focus, 'language': language, 'length': length})
+    return items, None
+
+
+def _record_bulk_captions(user, results):
+    """
+    SearchHistory and UserHistory rows for bulk captions, one bulk_create each
+
+    bulk_create sends no signals, so the BusinessContext is invalidated here.
+    """
+    SearchHistory.objects.bulk_create(
+        [SearchHistory(user=user, search_query=focus[:200])
+         for focus in dict.fromkeys(result['focus'] for result in results if result['focus'])],
+        ignore_conflicts=True
+    )
+    UserHistory.objects.bulk_create([
+        UserHistory(
+            user=user,
+            action_type='text_generation',
+            input_data={
+                'user_input': result['focus'],
+                'language': result['language'],
+                'length': result['length'],
+                'bulk': True,
+                **({'cache_hit': True} if result['cache_hit'] else {}),
+            },
+            output_data=result['caption'],
+            prompt_used=result['prompt']
+        )
+        for result in results
+    ])
+    invalidate_business_context(user.pk)
+
+
+def generate_bulk_captions(user, business, items, record=True):
+    """
+    Captions for many (focus, language, length) items in one go
+
+    Cached captions are used as-is. The rest are grouped by language and
+    length and sent CAPTION_BATCH_SIZE at a time as one batched prompt; lone
+    items get their own call alongside the batches, as do the items of a batch
+    whose answer cannot be parsed. A rate-limited batch is re-queued whole
+    (after a backoff, up to AI_RATE_LIMIT_MAX_RETRIES times) rather than split
+    into more calls against the exhausted bucket. Provider calls run on a pool
+    of CAPTION_BULK_CONCURRENCY threads.
+    All SearchHistory and UserHistory rows are written with one bulk_create
+    each (see _record_bulk_captions).
+
+    Args:
+        user: Requesting user
+        business: BusinessContext of the user
+        items: list of dicts with 'focus', 'language' and 'length'
+        record: Write SearchHistory / UserHistory rows (False for content
+                generated on the user's behalf, e.g. festival drafts)
+
+    Returns:
+        list of dicts, in item order: index, focus, language, length, success,
+        caption, error, cache_hit
+    """
+    started = time.monotonic()
+    cache_keys = [caption_cache_key(business, item['focus'], item['language'], item['length']) for item in items]
+    cached_captions = get_cached_captions(cache_keys)
+    results = []
+    for index, (item, cache_key) in enumerate(zip(items, cache_keys)):
+        cached = cached_captions.get(cache_key)
+        results.append({
+            'index': index,
+            'focus': item['focus'],
+            'language': item['language'],
+            'length': item['length'],
+            'success': bool(cached),
+            'caption': cached or "",
+            'error': "",
+            'cache_hit': bool(cached),
+            'cache_key': cache_key,
+            'prompt': build_caption_prompt(business, item['focus'], item['language']) if cached else "",
+        })
+
+    groups = {}
+    for result in results:
+        if not result['cache_hit']:
+            groups.setdefault((result['language'], result['length']), []).append(result)
+
+    batches, singles = [], []
+    batch_size = max(1, settings.CAPTION_BATCH_SIZE)
+    for (language, length), group in groups.items():
+        for offset in range(0, len(group), batch_size):
+            chunk = group[offset:offset + batch_size]
+            if len(chunk) > 1:
+                batches.append((language, length, chunk))
+            else:
+                singles.extend(chunk)
+
+    def finish(result, caption, prompt):
+        result.update(success=True, caption=caption, prompt=prompt)
+
+    def fail(result, error):
+        if is_rate_limit_error(error):
+            error = "Too many requests! Please wait a minute and try again."
+        result.update(success=False, error=str(error))
+
+    def run_batch(language, length, chunk, attempt):
+        if attempt:
+            # Re-queued after a rate limit error: give the bucket time to refill
+            time.sleep(backoff_delay(attempt - 1, settings.AI_RATE_LIMIT_BASE_DELAY))
+        return _generate_batch(business, chunk, language, length)
+
+    with ThreadPoolExecutor(max_workers=max(1, settings.CAPTION_BULK_CONCURRENCY),
+                            thread_name_prefix='bulk-captions') as pool:
+        # Batches and lone items run side by side, so no item waits for the slowest batch
+        pending = {
+            pool.submit(run_batch, language, length, chunk, 0): ('batch', (language, length, chunk, 0))
+            for language, length, chunk in batches
+        }
+        pending.update({pool.submit(_generate_single, business, result): ('single', result) for result in singles})
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                kind, job = pending.pop(future)
+                if kind == 'single':
+                    try:
+                        caption, prompt = future.result()
+                    except Exception as e:
+                        fail(job, e)
+                        continue
+                    finish(job, caption, prompt)
+                    continue
+
+                language, length, chunk, attempt = job
+                try:
+                    answers = future.result()
+                except Exception as e:
+                    if is_rate_limit_error(e):
+                        # One call per item would only spend more of the exhausted bucket
+                        if attempt < settings.AI_RATE_LIMIT_MAX_RETRIES:
+                            metrics.incr("caption_bulk.batch_requeued")
+                            retry = (language, length, chunk, attempt + 1)
+                            pending[pool.submit(run_batch, *retry)] = ('batch', retry)
+                        else:
+                            for result in chunk:
+                                fail(result, e)
+                        continue
+                    print(f"DEBUG: Batched caption call failed: {e}")
+                    answers = None
+                if answers is None:
+                    for result in chunk:
+                        pending[pool.submit(_generate_single, business, result)] = ('single', result)
+                    continue
+                for result, (caption, prompt) in zip(chunk, answers):
+                    finish(result, caption, prompt)
+
+    generated = [result for result in results if result['success'] and not result['cache_hit']]
+    for result in generated:
+        store_cached_caption(result['cache_key'], user, business, result['focus'],
+                             result['language'], result['length'], result['caption'])
+
+    succeeded = [result for result in results if result['success']]
+    if record:
+        _record_bulk_captions(user, succeeded)
+
+    metrics.incr("caption_bulk.items", len(items))
+    metrics.incr("caption_bulk.batched_calls", len(batches))
+    metrics.observe("caption_bulk.request", time.monotonic() - started, ok=len(succeeded) == len(items))
+    for result in results:
+        del result['cache_key'], result['prompt']
+    return results
@@ -0,0 +1,245 @@
+"""
+Server-side chatbot transcript
+
+Chat turns are appended as ChatTurn rows instead of rewriting a list in the
+session, so a message costs two small inserts however long the chat runs. The
+prompt gets at most CHAT_TRANSCRIPT_TOKEN_BUDGET tokens of verbatim turns;
+older turns are folded into a running ChatSummary (cached like the
+BusinessContext) and, once summarized, only the last CHAT_TRANSCRIPT_MAX_TURNS
+rows of a conversation are kept.
+"""
+import threading
+import uuid
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from . import metrics
+from .answer_cache import answer_cache
+from .models import ChatSummary, ChatTurn
+from .rate_limit import is_rate_limit_error
+from .sse_utils import format_sse, iterate_in_thread
+from .text_router import agenerate_text, stream_text
+
+RATE_LIMITED_MESSAGE = "🚦 Too many requests! Please wait a minute and try again."
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token), good enough for budgeting"""
+    return max(1, len(text or "") // 4)
+
+
+def _summary_cache_key(user_id, conversation_id):
+    return f"chat_summary:{user_id}:{conversation_id}"
+
+
+def get_conversation_id(request, reset=False):
+    """
+    ID of the session's current chat conversation
+
+    The session is only written when a conversation starts (reset=True, or the
+    first message of a session). Starting one also drops the user's
+    transcripts older than CHAT_TRANSCRIPT_RETENTION_DAYS.
+    """
+    conversation_id = request.session.get('chat_conversation')
+    if reset or not conversation_id:
+        conversation_id = uuid.uuid4().hex
+        request.session['chat_conversation'] = conversation_id
+        cutoff = timezone.now() - timedelta(days=settings.CHAT_TRANSCRIPT_RETENTION_DAYS)
+        ChatTurn.objects.filter(user=request.user, created_at__lt=cutoff).delete()
+        ChatSummary.objects.filter(user=request.user, updated_at__lt=cutoff).delete()
+    return conversation_id
+
+
+def get_summary(user, conversation_id):
+    """
+    Running summary of a conversation
+
+    Returns:
+        tuple: (summary text, last folded ChatTurn.seq)
+    """
+    key = _summary_cache_key(user.pk, conversation_id)
+    summary = cache.get(key)
+    if summary is None:
+        row = (
+            ChatSummary.objects.filter(user=user, conversation_id=conversation_id)
+            .values_list('summary', 'through_seq').first()
+        )
+        summary = tuple(row) if row else ("", 0)
+        cache.set(key, summary, settings.CHAT_SUMMARY_CACHE_SECONDS)
+    return summary
+
+
+def append_turn(user, conversation_id, role, content):
+    """
+    Append one message to the transcript
+
+    Returns:
+        ChatTurn
+    """
+    turns = ChatTurn.objects.filter(user=user, conversation_id=conversation_id)
+    for attempt in range(3):
+        last_seq = turns.order_by('-seq').values_list('seq', flat=True).first() or 0
+        try:
+            with transaction.atomic():
+                return ChatTurn.objects.create(
+                    user=user,
+                    conversation_id=conversation_id,
+                    seq=last_seq + 1,
+                    role=role,
+                    content=content,
+                    token_count=estimate_tokens(content)
+                )
+        except IntegrityError:
+            # Another tab appended the same seq first
+            if attempt == 2:
+                raise
+
+
+def record_exchange(user, conversation_id, user_message, reply):
+    """Append a finished question and answer (nothing is stored for a failed reply)"""
+    append_turn(user, conversation_id, 'user', user_message)
+    append_turn(user, conversation_id, 'bot', reply)
+
+
+def format_turn(turn):
+    prefix = "User:" if turn.role == 'user' else "Bot:"
+    return f"{prefix} {turn.content}"
+
+
+async def _summarize(previous_summary, turns):
+    """Fold turns into the running summary with one short provider call"""
+    transcript = "\n".join(format_turn(turn) for turn in turns)
+    prompt = (
+        "Summarize this conversation between a business owner and the ParlorPal assistant "
+        f"in at most {settings.CHAT_SUMMARY_MAX_TOKENS // 2} words. Keep names, numbers, offers, "
+        "decisions and open questions; drop greetings and small talk. Output only the summary.\n\n"
+        f"Summary so far: {previous_summary or '(none)'}\n\n"
+        f"New messages:\n{transcript}"
+    )
+    text, provider = await agenerate_text(prompt, "chat_summary", preferred=["gemini", "cohere"],
+                                          max_tokens=settings.CHAT_SUMMARY_MAX_TOKENS, temperature=0.2)
+    return text
+
+
+def _save_summary(user, conversation_id, summary, through_seq, last_seq):
+    ChatSummary.objects.update_or_create(
+        user=user,
+        conversation_id=conversation_id,
+        defaults={'summary': summary, 'through_seq': through_seq}
+    )
+    cache.set(_summary_cache_key(user.pk, conversation_id), (summary, through_seq),
+              settings.CHAT_SUMMARY_CACHE_SECONDS)
+    # Ring buffer: summarized turns beyond the last CHAT_TRANSCRIPT_MAX_TURNS are no longer needed
+    ChatTurn.objects.filter(
+        user=user,
+        conversation_id=conversation_id,
+        seq__lte=min(through_seq, last_seq - settings.CHAT_TRANSCRIPT_MAX_TURNS)
+    ).delete()
+
+
+def _unsummarized_turns(user, conversation_id):
+    """
+    Running summary, the turns after it, and those of them to fold into it
+
+    Returns:
+        tuple: (summary text, verbatim ChatTurns, ChatTurns to fold), oldest first
+    """
+    summary, through_seq = get_summary(user, conversation_id)
+    turns = list(
+        ChatTurn.objects.filter(user=user, conversation_id=conversation_id, seq__gt=through_seq)
+        .only('seq', 'role', 'content', 'token_count')
+    )
+    total = sum(turn.token_count for turn in turns)
+    folded = []
+    if total <= settings.CHAT_TRANSCRIPT_TOKEN_BUDGET:
+        return summary, turns, folded
+
+    while len(turns) > settings.CHAT_TRANSCRIPT_KEEP_TURNS and total > settings.CHAT_TRANSCRIPT_TOKEN_BUDGET // 2:
+        turn = turns.pop(0)
+        folded.append(turn)
+        total -= turn.token_count
+    return summary, turns, folded
+
+
+async def aload_transcript(user, conversation_id):
+    """
+    Summary and verbatim turns for the next chat prompt
+
+    When the unsummarized turns exceed CHAT_TRANSCRIPT_TOKEN_BUDGET, the oldest
+    are folded into the summary until half the budget is left (so this happens
+    every few turns, not on every message). The latest
+    CHAT_TRANSCRIPT_KEEP_TURNS turns always stay verbatim. If summarizing
+    fails, the folded turns are just left out of this prompt and retried next
+    time.
+
+    The queries run in the request's sync thread; the summary call itself
+    holds no thread.
+
+    Returns:
+        tuple: (summary text, list of ChatTurn oldest first)
+    """
+    summary, turns, folded = await sync_to_async(_unsummarized_turns)(user, conversation_id)
+    if not folded:
+        return summary, turns
+
+    try:
+        summary = await _summarize(summary, folded)
+    except Exception as e:
+        print(f"DEBUG: Chat summary failed, dropping {len(folded)} old turns from this prompt: {e}")
+        metrics.incr("chat_transcript.summary_failed")
+        return summary, turns
+
+    await sync_to_async(_save_summary)(
+        user, conversation_id, summary, folded[-1].seq, turns[-1].seq if turns else folded[-1].seq
+    )
+    metrics.incr("chat_transcript.summarized_turns", len(folded))
+    return summary, turns
+
+
+async def instant_chat_events(reply, **done):
+    """Server-sent events for a reply that is already known (answer cache, intent router)"""
+    yield format_sse('token', {'text': reply})
+    yield format_sse('done', dict(done, reply=reply))
+
+
+async def chat_events(user, conversation_id, user_message, prompt, answer_context=None):
+    """
+    Server-sent events for a streamed chat reply
+
+    Emits a 'token' event per chunk, then 'done' with the full reply or
+    'failed' with an error message. The exchange is added to the transcript
+    only once the reply is complete; if the client disconnects first, the
+    provider stream is closed and nothing is stored. With answer_context the
+    finished reply is also added to the answer cache.
+    """
+    cancelled = threading.Event()
+    chunks = stream_text(prompt, "chat", preferred=["gemini", "cohere"], cancelled=cancelled)
+    parts = []
+    try:
+        async for chunk in iterate_in_thread(chunks):
+            parts.append(chunk)
+            yield format_sse('token', {'text': chunk})
+    except Exception as e:
+        print(f"DEBUG: Chat stream failed: {e}")
+        yield format_sse('failed', {'error': RATE_LIMITED_MESSAGE if is_rate_limit_error(e) else str(e)})
+        return
+    finally:
+        # Runs on disconnect too (the response is cancelled): close the provider stream now,
+        # or, if a worker thread is still waiting on it, at its next chunk
+        cancelled.set()
+        try:
+            chunks.close()
+        except ValueError:
+            pass
+
+    reply = "".join(parts).strip()
+    await sync_to_async(record_exchange)(user, conversation_id, user_message, reply)
+    if answer_context is not None:
+        # The answer cache syncs invalidations from the shared (database) cache
+        await sync_to_async(answer_cache.store)(user_message, answer_context, reply)
+    yield format_sse('done', {'reply': reply})
@@ -1,9 +1,11 @@
 import os
+import re
 import cloudinary
 import cloudinary.uploader
 from cloudinary.utils import cloudinary_url
 from io import BytesIO
 from PIL import Image
+from django.conf import settings
 
 # Configure Cloudinary
 cloudinary.config(
@@ -12,26 +14,36 @@ cloudinary.config(
     api_secret=os.getenv('CLOUDINARY_API_SECRET')
 )
 
-def upload_image_to_cloudinary(image_bytes, folder="posters", public_id=None):
+# https://res.cloudinary.com/<cloud>/image/upload/[<transformations>/]v<version>/<public_id>.<ext>
+CLOUDINARY_UPLOAD_URL_RE = re.compile(
+    r'^https?://res\.cloudinary\.com/[^/]+/image/upload/(?:.+?/)?v\d+/(.+?)(?:\.\w+)?$'
+)
+
+def upload_image_to_cloudinary(image_bytes, folder="posters", public_id=None, filename=None):
     """
     Upload image bytes to Cloudinary and return the URL
     
     Args:
-        image_bytes: Raw image bytes
+        image_bytes: Raw image bytes (bytes or memoryview, sent as-is)
         folder: Cloudinary folder name
         public_id: Optional custom public ID
+        filename: Optional filename sent with the multipart upload
     
     Returns:
         dict: Cloudinary response with URL and other details
     """
     try:
+        options = {}
+        if filename:
+            options['filename'] = filename
         # Upload to Cloudinary
         response = cloudinary.uploader.upload(
             image_bytes,
             folder=folder,
             public_id=public_id,
             resource_type="image",
-            overwrite=True
+            overwrite=True,
+            **options
         )
         
         return {
@@ -48,6 +60,40 @@ def upload_image_to_cloudinary(image_bytes, folder="posters", public_id=None):
             'error': str(e)
         }
 
+def upload_video_to_cloudinary(video_bytes, folder="videos", public_id=None):
+    """
+    Upload video bytes to Cloudinary and return the URL
+    
+    Args:
+        video_bytes: Raw video bytes (e.g. an MP4 from Veo)
+        folder: Cloudinary folder name
+        public_id: Optional custom public ID
+    
+    Returns:
+        dict: Cloudinary response with URL and other details
+    """
+    try:
+        response = cloudinary.uploader.upload(
+            BytesIO(video_bytes),
+            folder=folder,
+            public_id=public_id,
+            resource_type="video",
+            overwrite=True
+        )
+        
+        return {
+            'success': True,
+            'url': response['secure_url'],
+            'public_id': response['public_id'],
+            'duration': response.get('duration'),
+            'format': response.get('format')
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'error': str(e)
+        }
+
 def upload_file_to_cloudinary(file, folder="logos", public_id=None):
     """
     Upload a file object to Cloudinary
@@ -106,23 +152,75 @@ def delete_from_cloudinary(public_id):
             'error': str(e)
         }
 
-def get_cloudinary_url(public_id, transformation=None):
+def get_cloudinary_url(public_id, transformation=None, **options):
     """
     Get Cloudinary URL with optional transformations
     
     Args:
         public_id: Cloudinary public ID
         transformation: Optional transformation parameters
+        **options: Extra cloudinary_url options (e.g. secure=True)
     
     Returns:
         str: Cloudinary URL
     """
     try:
-        url, options = cloudinary_url(public_id, transformation=transformation)
+        url, options = cloudinary_url(public_id, transformation=transformation, **options)
         return url
     except Exception as e:
         return None
 
+def extract_public_id(url):
+    """
+    Recover the public ID from a Cloudinary delivery URL
+    (e.g. .../image/upload/v1712345/posters/poster_x.png -> posters/poster_x)
+    
+    Args:
+        url: Stored Cloudinary secure_url
+    
+    Returns:
+        str: public ID, or None for non-Cloudinary URLs
+    """
+    match = CLOUDINARY_UPLOAD_URL_RE.match(url or "")
+    return match.group(1) if match else None
+
+def get_rendition_url(public_id, width):
+    """
+    URL of a width-limited, format/quality-auto rendition (WebP/AVIF where the browser supports it)
+    
+    Args:
+        public_id: Cloudinary public ID
+        width: Maximum width in pixels (never upscaled)
+    
+    Returns:
+        str: Cloudinary URL, or None if Cloudinary is not configured
+    """
+    return get_cloudinary_url(
+        public_id,
+        transformation=[{'width': width, 'crop': 'limit', 'fetch_format': 'auto', 'quality': 'auto'}],
+        secure=True
+    )
+
+def get_srcset(public_id, widths=None):
+    """
+    Build an <img srcset> value with one rendition per width step
+    
+    Args:
+        public_id: Cloudinary public ID
+        widths: Width steps, defaults to settings.POSTER_RENDITION_WIDTHS
+    
+    Returns:
+        str: srcset value, or empty string if URLs cannot be built
+    """
+    widths = widths or settings.POSTER_RENDITION_WIDTHS
+    candidates = []
+    for width in widths:
+        url = get_rendition_url(public_id, width)
+        if not url:
+            return ""
+        candidates.append(f"{url} {width}w")
+    return ", ".join(candidates)
+
 def optimize_image_for_cloudinary(image_bytes, max_size=(800, 800), quality=85):
     """
     Optimize image before uploading to Cloudinary
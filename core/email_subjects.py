@@ -0,0 +1,108 @@
+"""
+Email subject line suggestions
+
+Providers are asked for JSON that follows EMAIL_SUBJECTS_SCHEMA, so the
+answer is a list of subject lines with no numbering or preamble to strip.
+Results are cached per (profile version, offer, audience, tone) for
+EMAIL_SUBJECTS_CACHE_SECONDS; the cache backend's expiry drops them.
+"""
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .caption_cache import normalize_focus
+from .text_router import agenerate_text
+
+SUBJECT_LINE_COUNT = 5
+
+
+def subject_lines_schema(count):
+    """JSON schema of an answer with exactly `count` subject lines"""
+    return {
+        "type": "object",
+        "properties": {
+            "subject_lines": {
+                "type": "array",
+                "items": {"type": "string"},
+                "minItems": count,
+                "maxItems": count,
+            },
+        },
+        "required": ["subject_lines"],
+    }
+
+
+EMAIL_SUBJECTS_SCHEMA = subject_lines_schema(SUBJECT_LINE_COUNT)
+
+
+def email_subjects_cache_key(business, offer, audience, tone):
+    """Cache key of a request; editing the business profile starts new entries"""
+    payload = "\x1f".join([
+        str(business.user_id),
+        business.profile_version,
+        normalize_focus(offer),
+        normalize_focus(audience),
+        normalize_focus(tone),
+    ])
+    return f"email_subjects:{hashlib.sha256(payload.encode('utf-8')).hexdigest()}"
+
+
+def build_email_subjects_prompt(business, offer, audience, tone):
+    return (
+        f"Suggest {SUBJECT_LINE_COUNT} engaging email subject lines for a business named "
+        f"'{business.get('business_name')}'. "
+        f"Description: {business.get('description')}. "
+        f"Offer: {offer}. "
+        f"Target audience: {audience}. "
+        f"Tone: {tone}. "
+        "Make them catchy, relevant, and suitable for a marketing campaign. "
+        "Each subject line is plain text without numbering or quotes."
+    )
+
+
+def parse_email_subjects(text, count=SUBJECT_LINE_COUNT):
+    """
+    Subject lines from a provider's JSON answer
+
+    Raises:
+        ValueError: if the answer does not follow subject_lines_schema
+    """
+    try:
+        data = json.loads(text)
+    except ValueError:
+        raise ValueError("The subject line answer was not valid JSON")
+    lines = data.get("subject_lines") if isinstance(data, dict) else None
+    if not isinstance(lines, list) or not all(isinstance(line, str) for line in lines):
+        raise ValueError("The subject line answer did not match the expected format")
+    lines = [line.strip() for line in lines if line.strip()]
+    if not lines:
+        raise ValueError("No subject lines were returned")
+    return lines[:count]
+
+
+async def aget_or_generate_email_subjects(business, offer, audience, tone):
+    """
+    Subject lines from the cache, or from the text router as JSON
+
+    Returns:
+        tuple: (list of subject lines, cache_hit)
+    """
+    key = email_subjects_cache_key(business, offer, audience, tone)
+    cached = await cache.aget(key)
+    if cached:
+        metrics.incr("email_subjects.hit")
+        return cached, True
+    metrics.incr("email_subjects.miss")
+
+    text, provider = await agenerate_text(
+        build_email_subjects_prompt(business, offer, audience, tone),
+        "email_subjects",
+        preferred=["gemini", "cohere"],
+        json_schema=EMAIL_SUBJECTS_SCHEMA,
+    )
+    subject_lines = parse_email_subjects(text)
+    await cache.aset(key, subject_lines, settings.EMAIL_SUBJECTS_CACHE_SECONDS)
+    return subject_lines, False
@@ -54,29 +54,40 @@ def send_verification_email(user):
         return False
 
 
-def send_festival_notification_email(user, festival, notification_type='pre'):
+def send_festival_notification_email(user, festival, notification_type='pre', subject_variants=None,
+                                     business_name=None):
     """Send festival notification email to user
     
     Args:
         user: CustomUser instance
         festival: Festival instance
         notification_type: 'pre' for pre-festival, 'festival-day' for on festival day
+        subject_variants: Subject templates from get_festival_subject_variants, fetched once
+                          by callers that send a whole campaign
+        business_name: Recipient's business name from recipient_business_names, likewise
     """
     try:
+        # One of the campaign's generated subject variants, personalized (see core.festival_subjects)
+        from .festival_subjects import festival_subject_for
+        subject = festival_subject_for(user, festival, notification_type, subject_variants, business_name)
         if notification_type == 'pre':
-            subject = f"🎊 {festival.name} is coming! Time to boost your business!"
             countdown_text = f"Only {festival.notification_days} days to go!"
         else:  # festival-day
-            subject = f"🎉 Happy {festival.name}! Special offers for your business!"
             countdown_text = "Today is the day!"
         
+        # Link to the captions and poster prepared off-peak, if any
+        from .festival_drafts import get_ready_draft
+        draft = get_ready_draft(user, festival)
+
         # HTML Email template
         html_message = render_to_string('core/emails/festival_notification.html', {
             'user': user,
             'festival': festival,
             'site_name': 'ParlorPal',
+            'site_url': settings.SITE_URL.rstrip('/'),
             'notification_type': notification_type,
-            'countdown_text': countdown_text
+            'countdown_text': countdown_text,
+            'draft': draft
         })
         
         # Plain text version
@@ -130,9 +141,13 @@ def send_festival_notifications():
         is_active=True
     )
     
+    from .festival_subjects import get_festival_subject_variants, recipient_business_names
+    business_names = recipient_business_names(eligible_users)
     for festival in festivals_to_notify:
+        subject_variants = get_festival_subject_variants(festival, 'pre')
         for user in eligible_users:
-            send_festival_notification(user, festival)
+            send_festival_notification_email(user, festival, 'pre', subject_variants,
+                                             business_names.get(user.pk, ""))
 
 
 def is_token_valid(user, token):
@@ -0,0 +1,113 @@
+"""
+Festival content prepared ahead of the notification email
+
+Every festival email used to send all opted-in businesses to the caption and
+poster pages on the same morning, each click a fresh provider call. The
+pregenerate_festival_drafts command instead runs in the off-peak window
+before a festival's notification date and stores a FestivalDraft per
+business: a small caption set (one batched call) and a queued poster job
+(composited over a background shared by every business of the same type).
+The email and the dashboard then link straight to the finished drafts.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .business_context import get_business_context
+from .caption_utils import generate_bulk_captions
+from .models import CustomUser, Festival, FestivalDraft
+from .poster_utils import queue_poster_job
+
+# Caption focuses of a festival draft; {festival} is replaced by the festival name
+FESTIVAL_DRAFT_FOCUSES = [
+    "{festival} greetings to our customers",
+    "{festival} special offer",
+    "Book your {festival} makeover early",
+]
+
+
+def is_off_peak(now=None):
+    """True inside the FESTIVAL_DRAFT_OFF_PEAK_HOURS window (server time, may wrap past midnight)"""
+    start, end = settings.FESTIVAL_DRAFT_OFF_PEAK_HOURS
+    hour = timezone.localtime(now).hour
+    if start <= end:
+        return start <= hour < end
+    return hour >= start or hour < end
+
+
+def festivals_due_for_drafts(today=None):
+    """Active festivals whose notification date is today or within FESTIVAL_DRAFT_LEAD_DAYS"""
+    today = today or timezone.localdate()
+    horizon = today + timedelta(days=settings.FESTIVAL_DRAFT_LEAD_DAYS)
+    festivals = Festival.objects.filter(is_active=True, date__gte=today)
+    return [festival for festival in festivals if today <= festival.notification_date <= horizon]
+
+
+def draft_recipients():
+    """Users who get festival emails and have a business profile to write for"""
+    return CustomUser.objects.filter(
+        is_active=True,
+        email_verified=True,
+        notifications_enabled=True,
+        businessprofile__isnull=False
+    ).exclude(businessprofile__business_name="")
+
+
+def prepare_festival_draft(festival, user, language=None, regenerate=False):
+    """
+    Generate (or complete) the draft of one user for one festival
+
+    Captions are generated here; the poster is queued for run_poster_worker.
+    A ready draft is left alone unless regenerate=True.
+
+    Returns:
+        tuple: (FestivalDraft, bool whether anything was generated)
+    """
+    language = language or settings.FESTIVAL_DRAFT_LANGUAGE
+    draft, _ = FestivalDraft.objects.get_or_create(festival=festival, user=user, defaults={'language': language})
+    if draft.status == "ready" and not regenerate:
+        return draft, False
+
+    business = get_business_context(user)
+    items = [
+        {'focus': focus.format(festival=festival.name), 'language': language, 'length': 'small'}
+        for focus in FESTIVAL_DRAFT_FOCUSES
+    ]
+    results = generate_bulk_captions(user, business, items, record=False)
+    captions = [
+        {'focus': result['focus'], 'caption': result['caption']}
+        for result in results if result['success']
+    ]
+
+    poster_job = draft.poster_job
+    if poster_job is None or poster_job.status == "failed" or regenerate:
+        poster_job = queue_poster_job(
+            user, business, f"{festival.name} Special", settings.FESTIVAL_DRAFT_OFFER, language,
+            render_mode="composite", defer_render=True
+        )
+
+    draft.language = language
+    draft.captions = captions
+    draft.poster_job = poster_job
+    draft.status = "ready" if captions else "failed"
+    draft.error = "" if captions else next((result['error'] for result in results if result['error']), "")
+    draft.generated_at = timezone.now()
+    draft.save()
+    return draft, True
+
+
+def get_ready_draft(user, festival):
+    """The user's ready draft for a festival, or None"""
+    return (
+        FestivalDraft.objects.filter(user=user, festival=festival, status="ready")
+        .select_related('poster_job').first()
+    )
+
+
+def upcoming_drafts(user):
+    """Ready drafts of festivals that have not passed yet, soonest first"""
+    return (
+        FestivalDraft.objects.filter(user=user, status="ready", festival__date__gte=timezone.localdate())
+        .select_related('festival', 'poster_job')
+    )
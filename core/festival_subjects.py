@@ -0,0 +1,146 @@
+"""
+Subject lines of festival notification emails
+
+A few subject line variants are generated once per (festival, notification
+type) with one JSON-mode provider call and cached. Each recipient gets one of
+them, picked by a hash of the user id so a user always sees the same one, with
+{name} and {business} filled in. A campaign therefore costs one provider call
+however many users are on the list.
+
+The variants are kept in the shared cache: they are generated from short-lived
+cron commands, whose own process cache would be gone by the next run.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+from .email_subjects import parse_email_subjects, subject_lines_schema
+from .models import BusinessProfile
+from .text_router import generate_text
+
+_PLACEHOLDER_RE = re.compile(r"\{(\w*)\}")
+PLACEHOLDERS = ("name", "business")
+shared_cache = caches["shared"]
+MAX_SUBJECT_CHARS = 120
+
+# Used when generation fails; the same templates the emails always had
+FALLBACK_SUBJECTS = {
+    'pre': ["🎊 {festival} is coming! Time to boost your business!"],
+    'festival-day': ["🎉 Happy {festival}! Special offers for your business!"],
+}
+
+
+def _cache_key(festival, notification_type):
+    # Renaming or moving the festival starts a new set of variants
+    version = hashlib.sha256(f"{festival.name}|{festival.date}".encode("utf-8")).hexdigest()[:12]
+    return f"festival_subjects:{festival.pk}:{notification_type}:{version}"
+
+
+def build_festival_subjects_prompt(festival, notification_type, count):
+    if notification_type == 'pre':
+        moment = f"{festival.name} is {festival.notification_days} days away"
+    else:
+        moment = f"today is {festival.name}"
+    return (
+        f"Write {count} different email subject lines for a ParlorPal notification telling a small "
+        f"business owner (e.g. a beauty parlour) that {moment}, and that it is time to prepare their "
+        "festival posters and captions. Each subject line starts with a fitting emoji and is under 70 "
+        "characters. Vary the style: excited, urgent, friendly, curious. A subject line may use the "
+        "placeholders {name} (the owner's first name) and {business} (their business name), written "
+        "exactly like that with the braces, at most once each; use them in about half of the lines."
+    )
+
+
+def _valid_template(template):
+    """Only known placeholders and a sane length once they are filled in"""
+    placeholders = _PLACEHOLDER_RE.findall(template)
+    if any(placeholder not in PLACEHOLDERS for placeholder in placeholders):
+        return False
+    return len(template) <= MAX_SUBJECT_CHARS
+
+
+def get_festival_subject_variants(festival, notification_type):
+    """
+    Subject line templates for a festival campaign, generated at most once per cache period
+
+    A failed generation falls back to FALLBACK_SUBJECTS, which is cached for
+    FESTIVAL_SUBJECTS_RETRY_SECONDS so a large send does not retry per recipient.
+
+    Returns:
+        list: templates that may contain {name} and {business}
+    """
+    key = _cache_key(festival, notification_type)
+    variants = shared_cache.get(key)
+    if variants:
+        metrics.incr("festival_subjects.hit")
+        return variants
+    metrics.incr("festival_subjects.miss")
+
+    count = settings.FESTIVAL_SUBJECT_VARIANTS
+    try:
+        text, provider = generate_text(
+            build_festival_subjects_prompt(festival, notification_type, count),
+            "festival_subjects",
+            preferred=["gemini", "cohere"],
+            temperature=0.9,
+            max_wait=settings.AI_RATE_LIMIT_MAX_WAIT,
+            json_schema=subject_lines_schema(count),
+        )
+        variants = [template for template in parse_email_subjects(text, count) if _valid_template(template)]
+        if not variants:
+            raise ValueError("No usable subject line variants")
+    except Exception as e:
+        print(f"DEBUG: Festival subject generation failed for {festival.name} ({notification_type}): {e}")
+        metrics.incr("festival_subjects.fallback")
+        variants = [template.replace("{festival}", festival.name) for template in FALLBACK_SUBJECTS[notification_type]]
+        shared_cache.set(key, variants, settings.FESTIVAL_SUBJECTS_RETRY_SECONDS)
+        return variants
+
+    print(f"DEBUG: Generated {len(variants)} subject variants for {festival.name} ({notification_type}) with {provider}")
+    metrics.incr("festival_subjects.generated")
+    shared_cache.set(key, variants, settings.FESTIVAL_SUBJECTS_CACHE_SECONDS)
+    return variants
+
+
+def pick_variant(variants, festival, notification_type, user):
+    """The same variant for the same user on every send of a campaign"""
+    digest = hashlib.sha256(f"{festival.pk}:{notification_type}:{user.pk}".encode("utf-8")).digest()
+    return variants[int.from_bytes(digest[:8], "big") % len(variants)]
+
+
+def recipient_business_names(users):
+    """Business name of each recipient by user id, in one query (for personalize_subject)"""
+    return dict(BusinessProfile.objects.filter(user__in=users).values_list('user_id', 'business_name'))
+
+
+def personalize_subject(template, user, business_name=None):
+    """
+    Fill {name} and {business} for one recipient
+
+    Args:
+        business_name: From recipient_business_names when sending a whole list; looked up when None
+    """
+    if business_name is None:
+        business_name = BusinessProfile.objects.filter(user=user).values_list('business_name', flat=True).first()
+    values = {
+        'name': user.first_name or user.username,
+        'business': business_name or "your business",
+    }
+    subject = _PLACEHOLDER_RE.sub(lambda match: values.get(match.group(1), match.group(0)), template)
+    return " ".join(subject.split())
+
+
+def festival_subject_for(user, festival, notification_type, variants=None, business_name=None):
+    """
+    Personalized subject line of one festival email
+
+    Args:
+        variants: Result of get_festival_subject_variants, when the caller sends a whole campaign
+        business_name: The recipient's business name, when the caller prefetched it
+    """
+    if variants is None:
+        variants = get_festival_subject_variants(festival, notification_type)
+    return personalize_subject(pick_variant(variants, festival, notification_type, user), user, business_name)
@@ -0,0 +1,179 @@
+"""
+Process-wide registry of pooled AI provider clients
+
+One client is built per (provider, API key) in each worker process and shared
+by all of its threads, so HTTP keep-alive connections and TLS sessions survive
+between requests. The registry is emptied in a forked child, which then builds
+its own clients instead of sharing the parent's sockets.
+"""
+import contextvars
+import os
+import threading
+import time
+import weakref
+
+import cohere
+import httpx
+from django.conf import settings
+from google import genai as google_genai
+from google.genai import types
+
+from . import metrics
+
+_lock = threading.Lock()
+_clients = {}
+_owner_pid = os.getpid()
+
+# Called with the provider name whenever response headers arrive for a request
+# made in the current context, e.g. to report a poster's first byte
+response_listener = contextvars.ContextVar('response_listener', default=None)
+
+
+def _reset_after_fork():
+    """Drop the parent's clients in a forked child (their sockets belong to the parent)"""
+    global _lock, _clients, _owner_pid
+    _lock = threading.Lock()
+    _clients = {}
+    _owner_pid = os.getpid()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _http_limits():
+    return httpx.Limits(
+        max_connections=settings.AI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.AI_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.AI_HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+class _ConnectionTracker:
+    """
+    httpx event hooks counting new vs reused connections and request latency
+
+    Counters: 'http.<provider>.connection_new' / '.connection_reused';
+    latency (time to response headers) is observed as 'http.<provider>'.
+    """
+
+    def __init__(self, provider):
+        self.provider = provider
+        self._seen = weakref.WeakSet()
+        self._seen_lock = threading.Lock()
+
+    def on_request(self, request):
+        request.extensions['parlorpal_started'] = time.monotonic()
+
+    def on_response(self, response):
+        name = f"http.{self.provider}"
+        stream = response.extensions.get('network_stream')
+        if stream is not None:
+            with self._seen_lock:
+                reused = stream in self._seen
+                self._seen.add(stream)
+            metrics.incr(f"{name}.connection_reused" if reused else f"{name}.connection_new")
+
+        started = response.request.extensions.get('parlorpal_started')
+        if started is not None:
+            metrics.observe(name, time.monotonic() - started, ok=response.status_code < 400)
+
+        listener = response_listener.get()
+        if listener is not None:
+            listener(self.provider)
+
+    async def on_request_async(self, request):
+        self.on_request(request)
+
+    async def on_response_async(self, response):
+        self.on_response(response)
+
+    def client_args(self):
+        return {
+            'limits': _http_limits(),
+            'event_hooks': {'request': [self.on_request], 'response': [self.on_response]},
+        }
+
+    def async_client_args(self):
+        return {
+            'limits': _http_limits(),
+            'event_hooks': {'request': [self.on_request_async], 'response': [self.on_response_async]},
+        }
+
+
+def _build_genai_client(provider, api_key):
+    tracker = _ConnectionTracker(provider)
+    return google_genai.Client(
+        api_key=api_key,
+        http_options=types.HttpOptions(
+            client_args=tracker.client_args(),
+            async_client_args=tracker.async_client_args(),
+        )
+    )
+
+
+def _build_cohere_client(provider, api_key):
+    tracker = _ConnectionTracker(provider)
+    return cohere.Client(api_key, httpx_client=httpx.Client(**tracker.client_args()))
+
+
+def _build_async_cohere_client(provider, api_key):
+    tracker = _ConnectionTracker("cohere")
+    return cohere.AsyncClient(api_key, httpx_client=httpx.AsyncClient(**tracker.async_client_args()))
+
+
+def _get_client(provider, api_key, builder):
+    key = (provider, api_key)
+    if os.getpid() != _owner_pid:
+        # Fork hooks are unavailable on some platforms; the pid check covers them
+        _reset_after_fork()
+
+    client = _clients.get(key)
+    if client is not None:
+        metrics.incr("ai_client.reused")
+        return client
+
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = builder(provider, api_key)
+            _clients[key] = client
+            metrics.incr("ai_client.created")
+            print(f"DEBUG: Created pooled {provider} client in process {os.getpid()}")
+        else:
+            metrics.incr("ai_client.reused")
+    return client
+
+
+def get_genai_client(api_key, provider="gemini"):
+    """
+    Shared google.genai client for this process
+
+    Args:
+        api_key: API key the client authenticates with
+        provider: Label used for the registry key and the http.<provider> metrics
+                  (e.g. "gemini", "gemini-image", "veo")
+
+    Returns:
+        google.genai.Client
+    """
+    return _get_client(provider, api_key, _build_genai_client)
+
+
+def get_cohere_client(api_key=None):
+    """Shared Cohere client for this process (defaults to COHERE_API_KEY)"""
+    if api_key is None:
+        api_key = os.getenv("COHERE_API_KEY")
+    return _get_client("cohere", api_key, _build_cohere_client)
+
+
+def get_async_cohere_client(api_key=None):
+    """
+    Shared async Cohere client for this process (defaults to COHERE_API_KEY)
+
+    Its connections belong to the event loop of the ASGI server; use it from
+    async views, not from code wrapped in async_to_sync.
+    """
+    if api_key is None:
+        api_key = os.getenv("COHERE_API_KEY")
+    return _get_client("cohere-async", api_key, _build_async_cohere_client)
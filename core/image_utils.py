@@ -0,0 +1,126 @@
+import struct
+from io import BytesIO
+
+from PIL import Image
+
+MIME_EXTENSIONS = {
+    'image/png': 'png',
+    'image/jpeg': 'jpg',
+    'image/webp': 'webp',
+    'image/gif': 'gif',
+}
+
+
+def sniff_mime_type(data):
+    """Detect the image MIME type from its magic bytes"""
+    head = bytes(data[:12])
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'image/png'
+    if head.startswith(b'\xff\xd8'):
+        return 'image/jpeg'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'image/webp'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'image/gif'
+    return None
+
+
+def sniff_image_size(data):
+    """
+    Read (width, height) from the image header without decoding pixels
+
+    Args:
+        data: bytes or memoryview of an encoded PNG, JPEG, WebP or GIF image
+
+    Returns:
+        tuple: (width, height), or None if the format is not recognised
+    """
+    view = memoryview(data)
+    mime_type = sniff_mime_type(view)
+
+    if mime_type == 'image/png' and len(view) >= 24:
+        # IHDR is always the first chunk
+        return struct.unpack('>II', view[16:24])
+
+    if mime_type == 'image/gif' and len(view) >= 10:
+        return struct.unpack('<HH', view[6:10])
+
+    if mime_type == 'image/webp' and len(view) >= 30:
+        chunk = bytes(view[12:16])
+        if chunk == b'VP8 ':
+            width, height = struct.unpack('<HH', view[26:30])
+            return width & 0x3fff, height & 0x3fff
+        if chunk == b'VP8L':
+            b0, b1, b2, b3 = view[21:25]
+            width = 1 + (((b1 & 0x3f) << 8) | b0)
+            height = 1 + (((b3 & 0x0f) << 10) | (b2 << 2) | ((b1 & 0xc0) >> 6))
+            return width, height
+        if chunk == b'VP8X':
+            width = 1 + int.from_bytes(view[24:27], 'little')
+            height = 1 + int.from_bytes(view[27:30], 'little')
+            return width, height
+
+    if mime_type == 'image/jpeg':
+        # Walk the marker segments until a start-of-frame marker
+        offset = 2
+        while offset + 9 < len(view):
+            if view[offset] != 0xff:
+                offset += 1
+                continue
+            marker = view[offset + 1]
+            if marker in (0xd8, 0x01) or 0xd0 <= marker <= 0xd7:
+                offset += 2
+                continue
+            segment_length = struct.unpack('>H', view[offset + 2:offset + 4])[0]
+            if 0xc0 <= marker <= 0xcf and marker not in (0xc4, 0xc8, 0xcc):
+                height, width = struct.unpack('>HH', view[offset + 5:offset + 9])
+                return width, height
+            offset += 2 + segment_length
+
+    return None
+
+
+class EncodedImage:
+    """
+    Image kept in the encoding the provider returned
+
+    The bytes are passed through to disk and Cloudinary unchanged; PIL only
+    decodes them when a caller actually asks for pixels via .image.
+    """
+
+    def __init__(self, data, mime_type=None):
+        self.data = data
+        self.mime_type = mime_type or sniff_mime_type(data) or 'image/png'
+        self._size = None
+        self._image = None
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def view(self):
+        """Zero-copy view over the encoded bytes"""
+        return memoryview(self.data)
+
+    @property
+    def extension(self):
+        return MIME_EXTENSIONS.get(self.mime_type, 'png')
+
+    @property
+    def size(self):
+        """(width, height) from the header, falling back to a decode for unknown formats"""
+        if self._size is None:
+            self._size = sniff_image_size(self.data) or self.image.size
+        return self._size
+
+    @property
+    def image(self):
+        """Decoded PIL Image (decoded lazily, once)"""
+        if self._image is None:
+            self._image = Image.open(BytesIO(self.data))
+        return self._image
+
+    def write_to(self, path):
+        """Write the encoded bytes to a file without re-encoding"""
+        with open(path, 'wb') as f:
+            f.write(self.view)
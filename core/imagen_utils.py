@@ -0,0 +1,114 @@
+import os
+import threading
+import traceback
+
+import vertexai
+from vertexai.preview.vision_models import ImageGenerationModel
+
+from .image_utils import EncodedImage
+from .rate_limit import is_rate_limit_error
+
+# A balanced model that offers a good mix of quality and speed for general-purpose image generation.
+# IMAGEN_MODEL_ID = "imagen-4.0-generate-preview-06-06"
+
+# A model optimized for speed and low latency, ideal for real-time applications.
+# IMAGEN_MODEL_ID = "imagen-4.0-fast-generate-preview-06-06"
+
+# The highest quality model in the family, best for complex prompts, high detail, and accurate text rendering.
+# Used as the hedge / fallback provider behind Gemini 3 Pro Image in core.poster_utils
+IMAGEN_MODEL_ID = "imagen-4.0-ultra-generate-preview-06-06"
+
+# Handle Google credentials - support both file and environment variable
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CREDENTIALS_PATH = os.path.join(BASE_DIR, 'secrets', 'image-gen-demo-epsilon-d9e1f100bfc8.json')
+
+# Try to set credentials from environment variable first (for production)
+google_creds_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
+if google_creds_json:
+    # Production: credentials provided as JSON string in environment variable
+    try:
+        credentials_file = '/tmp/google-credentials.json'
+        with open(credentials_file, 'w') as f:
+            f.write(google_creds_json)
+        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_file
+        print("SUCCESS: Using Google credentials from environment variable")
+    except Exception as e:
+        print(f"ERROR: Failed to write credentials from environment: {e}")
+elif os.path.exists(CREDENTIALS_PATH):
+    # Development: use local credentials file
+    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = CREDENTIALS_PATH
+    print(f"SUCCESS: Using local credentials file at {CREDENTIALS_PATH}")
+else:
+    print(f"WARNING: No Google credentials found. Image generation will not work.")
+
+_imagen_lock = threading.Lock()
+_imagen_model = None
+_imagen_init_failed = False
+
+
+def get_imagen_model():
+    """
+    Initialize Vertex AI and load the Imagen model on first use
+
+    Returns:
+        ImageGenerationModel, or None if credentials are missing or loading failed
+    """
+    global _imagen_model, _imagen_init_failed
+    if _imagen_model is not None or _imagen_init_failed:
+        return _imagen_model
+
+    with _imagen_lock:
+        if _imagen_model is not None or _imagen_init_failed:
+            return _imagen_model
+        if not os.getenv('GOOGLE_APPLICATION_CREDENTIALS'):
+            print("WARNING: Skipping Vertex AI initialization - no credentials available")
+            _imagen_init_failed = True
+            return None
+        try:
+            vertexai.init(project=os.getenv('GCP_PROJECT_ID'), location="us-central1")
+            _imagen_model = ImageGenerationModel.from_pretrained(IMAGEN_MODEL_ID)
+            print(f"SUCCESS: Vertex AI initialized, using model: {IMAGEN_MODEL_ID}")
+        except Exception as e:
+            print(f"CRITICAL: Could not initialize Vertex AI. Error: {e}")
+            print(f"DEBUG: Full error traceback: {traceback.format_exc()}")
+            _imagen_init_failed = True
+        return _imagen_model
+
+
+def generate_poster_imagen(user_prompt):
+    """
+    Generates a poster with Imagen on Vertex AI
+
+    Args:
+        user_prompt: The detailed prompt for poster generation
+
+    Returns:
+        EncodedImage with the provider's raw bytes if successful, None otherwise
+    """
+    try:
+        model = get_imagen_model()
+        if model is None:
+            return None
+
+        print(f"DEBUG: Sending prompt to {IMAGEN_MODEL_ID}...")
+        response = model.generate_images(
+            prompt=user_prompt,
+            number_of_images=1,
+            aspect_ratio="3:4"
+        )
+
+        if not response.images:
+            print("WARNING: No image found in Imagen response (blocked by safety filters?)")
+            return None
+
+        image = response.images[0]
+        encoded = EncodedImage(image._image_bytes, getattr(image, '_mime_type', None))
+        print(f"DEBUG: Received {encoded.mime_type} image from Imagen, {len(encoded)} bytes")
+        return encoded
+
+    except Exception as e:
+        if is_rate_limit_error(e):
+            raise
+        print(f"ERROR: Imagen generation failed: {e}")
+        print(f"DEBUG: Full error traceback: {traceback.format_exc()}")
+        return None
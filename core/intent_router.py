@@ -0,0 +1,292 @@
+"""
+Local intent routing for the chatbot
+
+"What is this page?" and "where do I make a poster?" make up a large share of
+chat messages and need no language model. Before a message reaches the
+provider, route_intent matches it against a few compiled patterns and a page
+index built once per process from core.urls: each named page's URL, its view
+docstring and the title and headings of the template it renders. Navigation
+and how-to questions that point clearly at one page are answered here with
+a link; everything else falls through to the provider.
+"""
+import inspect
+import re
+import threading
+import time
+
+from django.template.loader import get_template
+from django.urls import URLPattern, URLResolver, get_resolver
+
+from . import metrics
+
+# Extra words people use for a page, by URL name (the index adds the rest)
+PAGE_KEYWORDS = {
+    'generate_poster': "poster posters flyer banner image design",
+    'ai_suggestions': "caption captions text post marketing copy instagram hashtag",
+    'generate_video': "video videos reel clip",
+    'user_history': "history past previous activity",
+    'profile': "profile business details logo address phone hours timing",
+    'dashboard': "dashboard home overview drafts",
+    'insights': "insights stats statistics analytics trend",
+    'email_subjects': "email subject subjects newsletter",
+    'chatbot': "chat assistant chatbot",
+    'feedback': "feedback complaint",
+    'forgot_password': "password forgot reset",
+    'logout': "logout log out sign out",
+    'two_factor': "2fa two factor authenticator otp security",
+    'manage_festivals': "festival festivals calendar",
+    'email_templates': "email templates preview",
+}
+
+# Pages only staff may open (their views check request.user.is_staff); never suggested to other users
+STAFF_ONLY_PAGES = {
+    'metrics',
+    'answer_cache_invalidate',
+    'manage_festivals',
+    'preview_verification_email',
+    'preview_festival_notification',
+    'email_templates',
+}
+
+# Intent -> pattern; the first match wins
+INTENT_PATTERNS = [
+    ('current_page', re.compile(
+        r"\b(what|which)\b.{0,20}\b(this|current)\s+(page|screen)\b"
+        r"|\bwhere am i\b|\bwhat can i do here\b|\bwhat does this page\b"
+    )),
+    ('navigation', re.compile(
+        r"\b(where|how)\b.{0,30}\b(find|go|open|see|view|get to|access|reach)\b"
+        r"|\b(take|bring|send) me to\b|\blink to\b|\bwhere (is|are)\b|\bnavigate\b"
+    )),
+    ('how_to', re.compile(
+        r"\bhow (do|can|should|would) i\b|\bhow to\b|\bwhere (do|can) i\b|\bi want to\b"
+    )),
+]
+
+# Questions asking for content or advice rather than a place in the app
+OPEN_ENDED_RE = re.compile(
+    r"\b(suggest|give me|tips?|why|should i|best|improve|explain|compare|recommend"
+    r"|write (me|a|an|some)|for my)\b"
+)
+
+# Longer messages are rarely plain navigation
+MAX_WORDS = 12
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_TEMPLATE_NAME_RE = re.compile(r"""['"](core/[\w/-]+\.html)['"]""")
+_HELPER_NAME_RE = re.compile(r"\b(_[a-z]\w*)\b")
+_TITLE_RE = re.compile(r"{%\s*block title\s*%}(.*?){%\s*endblock", re.S)
+_HEADING_RE = re.compile(r"<h[1-3][^>]*>(.*?)</h[1-3]>", re.S | re.I)
+_MARKUP_RE = re.compile(r"<[^>]+>|{[{%#].*?[}%#]}", re.S)
+_STOPWORDS = frozenset(
+    "a an the i me my we our you your is are am do does did can could would should will to in on of for "
+    "it this that there here how what where which page find go open see view get access reach take bring "
+    "send link navigate want make create use with and or parlorpal".split()
+)
+
+
+def _tokens(text):
+    words = _WORD_RE.findall((text or "").lower())
+    # Crude stemming so "posters" finds "poster"
+    return {word[:-1] if len(word) > 3 and word.endswith("s") else word for word in words} - _STOPWORDS
+
+
+def _clean(html):
+    return " ".join(_MARKUP_RE.sub(" ", html).split())
+
+
+class PageEntry:
+    """One navigable page of the index"""
+
+    def __init__(self, name, path, title, description, staff_only):
+        self.name = name
+        self.path = path
+        self.title = title
+        self.description = description
+        self.staff_only = staff_only
+
+    def link(self):
+        return {'title': self.title, 'url': self.path}
+
+
+def _view_source(view):
+    """Source of a view and of the module-level helpers it calls, e.g. _ai_suggestions_page"""
+    view = inspect.unwrap(view)
+    try:
+        source = inspect.getsource(view)
+    except (OSError, TypeError):
+        return ""
+    module = inspect.getmodule(view)
+    for helper in set(_HELPER_NAME_RE.findall(source)):
+        function = getattr(module, helper, None)
+        if inspect.isfunction(function):
+            try:
+                source += inspect.getsource(function)
+            except OSError:
+                pass
+    return source
+
+
+def _template_text(source, name):
+    """(title, headings) of the page template rendered in the source, e.g. core/<name>.html"""
+    template_names = _TEMPLATE_NAME_RE.findall(source)
+    # Views also render side templates (a profile form before the real page): prefer the namesake
+    template_names.sort(key=lambda template_name: template_name != f"core/{name}.html")
+    for template_name in template_names:
+        try:
+            template_source = get_template(template_name).template.source
+        except Exception:
+            continue
+        title = _TITLE_RE.search(template_source)
+        title = _clean(title.group(1)).replace(" - ParlorPal", "") if title else ""
+        # Headings filled in per user ("Welcome back, {{ user }}!") make poor descriptions
+        headings = [_clean(heading) for heading in _HEADING_RE.findall(template_source) if "{{" not in heading]
+        return title, [heading for heading in headings if heading]
+    return None
+
+
+class RouteIndex:
+    """Inverted index of page words -> weighted pages"""
+
+    def __init__(self):
+        self.pages = {}
+        self.by_path = {}
+        self._postings = {}
+
+    def _add_words(self, entry, text, weight):
+        for word in _tokens(text):
+            postings = self._postings.setdefault(word, {})
+            postings[entry.name] = max(postings.get(entry.name, 0), weight)
+
+    def add(self, pattern, view, prefix=""):
+        """Index a URL pattern whose view renders a template; returns the entry or None"""
+        route = prefix + str(pattern.pattern)
+        if "<" in route or not pattern.name:
+            return None
+        source = _view_source(view)
+        template = _template_text(source, pattern.name)
+        if template is None:
+            # JSON / redirect endpoints are not places to send a user
+            return None
+        title, headings = template
+        docstring = (inspect.getdoc(inspect.unwrap(view)) or "").split("\n\n")[0].replace("\n", " ")
+        entry = PageEntry(
+            name=pattern.name,
+            path=f"/{route}",
+            title=title or pattern.name.replace("_", " ").title(),
+            description=headings[0] if headings else "",
+            staff_only=pattern.name in STAFF_ONLY_PAGES,
+        )
+        self.pages[entry.name] = entry
+        self.by_path[entry.path] = entry
+        self._add_words(entry, PAGE_KEYWORDS.get(entry.name, ""), 3)
+        self._add_words(entry, f"{entry.name} {route} {entry.title}", 2)
+        self._add_words(entry, " ".join(headings), 2)
+        self._add_words(entry, docstring, 1)
+        return entry
+
+    def search(self, text, is_staff=False):
+        """
+        Page a question points at
+
+        Returns:
+            PageEntry or None when no page, or no single clear winner, matches
+        """
+        scores = {}
+        for word in _tokens(text):
+            for name, weight in self._postings.get(word, {}).items():
+                if is_staff or not self.pages[name].staff_only:
+                    scores[name] = scores.get(name, 0) + weight
+        if not scores:
+            return None
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        best, score = ranked[0]
+        if score < 3 or (len(ranked) > 1 and ranked[1][1] >= score):
+            return None
+        return self.pages[best]
+
+
+def _walk(patterns, prefix=""):
+    """(URLPattern, route prefix) for every pattern, following include()"""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _walk(pattern.url_patterns, prefix + str(pattern.pattern))
+        elif isinstance(pattern, URLPattern):
+            yield pattern, prefix
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def route_index():
+    """The page index of this process, built from the URLconf on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                url_patterns = get_resolver().url_patterns  # imports the views
+                started = time.monotonic()
+                index = RouteIndex()
+                for pattern, prefix in _walk(url_patterns):
+                    index.add(pattern, pattern.callback, prefix)
+                _index = index
+                print(f"DEBUG: Chatbot route index built with {len(index.pages)} pages "
+                      f"in {(time.monotonic() - started) * 1000:.0f}ms")
+    return _index
+
+
+def classify(message):
+    """Intent name of a message, or None for open-ended questions"""
+    text = " ".join((message or "").lower().split())
+    if not text or len(text.split()) > MAX_WORDS or OPEN_ENDED_RE.search(text):
+        return None
+    for intent, pattern in INTENT_PATTERNS:
+        if pattern.search(text):
+            return intent
+    return None
+
+
+def _answer(intent, message, current_page, is_staff):
+    index = route_index()
+    here = index.by_path.get(current_page or "")
+    if intent == 'current_page':
+        if here is None:
+            return None
+        reply = f"You're on the {here.title} page ({here.path})."
+        if here.description and here.description.lower() != here.title.lower():
+            reply += f" {here.description}"
+        return reply, [here.link()]
+
+    page = index.search(message, is_staff=is_staff)
+    if page is None:
+        return None
+    if page is here:
+        return f"You're already on the {page.title} page ({page.path}).", [page.link()]
+    return f"You can do that on the {page.title} page: {page.path}", [page.link()]
+
+
+def route_intent(message, current_page, is_staff=False):
+    """
+    Answer a chat message locally when it is a navigation or how-to question
+
+    Args:
+        message: The user's chat message
+        current_page: URL path the chat was sent from
+        is_staff: Whether staff-only pages may be suggested
+
+    Returns:
+        tuple: (reply, links, intent) or None when the message should go to the provider
+    """
+    started = time.monotonic()
+    intent = classify(message)
+    answer = _answer(intent, message, current_page, is_staff) if intent else None
+    elapsed = time.monotonic() - started
+    if answer is None:
+        metrics.incr(f"intent_router.{intent}.fallthrough" if intent else "intent_router.open_ended")
+        metrics.observe("intent_router.fallthrough", elapsed)
+        return None
+    reply, links = answer
+    metrics.incr(f"intent_router.{intent}.answered")
+    metrics.observe(f"intent_router.{intent}", elapsed)
+    return reply, links, intent
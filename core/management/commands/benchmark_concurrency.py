@@ -0,0 +1,220 @@
+import asyncio
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand
+from django.test import Client
+from django.test.utils import override_settings
+
+from core import text_router
+
+
+class _SimulatedProviders:
+    """
+    Swap the text providers for ones that just wait `latency` seconds
+
+    Everything else in the text router (ranking, breakers, rate limit buckets,
+    hedging) runs as in production. Tracks the most calls in flight at once.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.in_flight = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _enter(self):
+        with self._lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+
+    def _exit(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def generate(self, prompt, max_tokens=None, temperature=None):
+        self._enter()
+        try:
+            time.sleep(self.latency)
+        finally:
+            self._exit()
+        return "Simulated reply"
+
+    async def agenerate(self, prompt, max_tokens=None, temperature=None):
+        self._enter()
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self._exit()
+        return "Simulated reply"
+
+    def __enter__(self):
+        self._saved = (dict(text_router.TEXT_PROVIDERS), dict(text_router.ASYNC_TEXT_PROVIDERS))
+        for name, (bucket, generate) in self._saved[0].items():
+            text_router.TEXT_PROVIDERS[name] = (bucket, self.generate)
+            text_router.ASYNC_TEXT_PROVIDERS[name] = self.agenerate
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        text_router.TEXT_PROVIDERS.update(self._saved[0])
+        text_router.ASYNC_TEXT_PROVIDERS.update(self._saved[1])
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare how many slow text provider calls one process serves concurrently: '
+        'threaded WSGI (generate_text on N threads) vs ASGI (agenerate_text on the event loop). '
+        'Both modes call the text router directly; --mode asgi-view instead posts chatbot messages '
+        'through the ASGI application, so the view\'s own queries and thread use are measured too '
+        '(it writes chat turns for a temporary user, deleted afterwards)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Simultaneous requests to send (default 200)')
+        parser.add_argument('--latency', type=float, default=3.0, help='Simulated provider latency in seconds (default 3)')
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=2,
+            help='Request threads of the WSGI setup (default 2, as gunicorn --workers 1 --threads 2)',
+        )
+        parser.add_argument('--mode', choices=['both', 'wsgi', 'asgi', 'asgi-view'], default='both')
+
+    def handle(self, *args, **options):
+        count = options['requests']
+        limits = {'per_minute': 1_000_000, 'burst': count}
+        # Own bucket directory and generous limits, so the run neither throttles itself nor uses real quota
+        with tempfile.TemporaryDirectory() as rate_limit_dir, override_settings(
+            AI_RATE_LIMIT_DIR=rate_limit_dir,
+            AI_RATE_LIMITS={'cohere': limits, 'gemini': limits, 'default': limits},
+            AI_RATE_LIMIT_MAX_QUEUE=count,
+            # Every benchmark message must reach the provider, not the answer cache
+            ANSWER_CACHE_MIN_CHARS=1_000_000,
+        ):
+            self.stdout.write(
+                f"🏁 {count} simultaneous requests, simulated provider latency {options['latency']:.1f}s"
+            )
+            if options['mode'] in ('both', 'wsgi'):
+                self._report(f"WSGI, {options['threads']} threads", *self._run_wsgi(count, options))
+            if options['mode'] in ('both', 'asgi'):
+                self._report("ASGI, event loop", *self._run_asgi(count, options))
+            if options['mode'] == 'asgi-view':
+                self._report("ASGI, chatbot view", *self._run_asgi_view(count, options))
+
+    def _run_wsgi(self, count, options):
+        def request(submitted):
+            text_router.generate_text("Benchmark prompt", "benchmark")
+            return time.monotonic() - submitted
+
+        with _SimulatedProviders(options['latency']) as providers:
+            started = time.monotonic()
+            with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+                futures = [pool.submit(request, time.monotonic()) for _ in range(count)]
+                latencies = [future.result() for future in futures]
+            return time.monotonic() - started, latencies, providers.peak
+
+    def _run_asgi(self, count, options):
+        async def request():
+            submitted = time.monotonic()
+            await text_router.agenerate_text("Benchmark prompt", "benchmark")
+            return time.monotonic() - submitted
+
+        async def run_all():
+            return await asyncio.gather(*(request() for _ in range(count)))
+
+        with _SimulatedProviders(options['latency']) as providers:
+            started = time.monotonic()
+            latencies = asyncio.run(run_all())
+            return time.monotonic() - started, latencies, providers.peak
+
+    def _run_asgi_view(self, count, options):
+        application = get_asgi_application()
+        user = get_user_model().objects.create_user(
+            f"benchmark-{uuid.uuid4().hex[:12]}", password=uuid.uuid4().hex
+        )
+        # One session (and so one chat conversation) per request, as from separate users' tabs
+        clients = []
+        for _ in range(count):
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        failures = []
+
+        async def request(index, client):
+            body = urlencode({'message': f"Benchmark question {index}: which offer suits a rainy week?"}).encode()
+            cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'POST',
+                'scheme': 'http',
+                'path': '/chatbot/',
+                'raw_path': b'/chatbot/',
+                'query_string': b'',
+                'root_path': '',
+                'headers': [
+                    (b'host', b'localhost'),
+                    (b'content-type', b'application/x-www-form-urlencoded'),
+                    (b'content-length', str(len(body)).encode()),
+                    (b'x-requested-with', b'XMLHttpRequest'),
+                    (b'cookie', cookie.encode()),
+                ],
+                'client': ('127.0.0.1', 0),
+                'server': ('localhost', 80),
+            }
+            events = [{'type': 'http.request', 'body': body, 'more_body': False}]
+            response = {}
+
+            async def receive():
+                if events:
+                    return events.pop(0)
+                # The client stays connected until the response is sent
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    response['status'] = message['status']
+                elif message['type'] == 'http.response.body':
+                    response['body'] = response.get('body', b'') + message.get('body', b'')
+
+            submitted = time.monotonic()
+            await application(scope, receive, send)
+            if response.get('status') != 200 or b'"success": true' not in response.get('body', b''):
+                failures.append(response.get('body', b'')[:200])
+            return time.monotonic() - submitted
+
+        async def run_all():
+            return await asyncio.gather(*(request(index, client) for index, client in enumerate(clients)))
+
+        try:
+            with _SimulatedProviders(options['latency']) as providers:
+                started = time.monotonic()
+                latencies = asyncio.run(run_all())
+                wall = time.monotonic() - started
+        finally:
+            for client in clients:
+                client.logout()
+            user.delete()
+        if failures:
+            self.stdout.write(self.style.ERROR(f"❌ {len(failures)} chatbot requests failed, e.g. {failures[0]!r}"))
+        return wall, latencies, providers.peak
+
+    def _report(self, label, wall, latencies, peak):
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ {label}: {len(latencies)} requests in {wall:.1f}s "
+            f"({len(latencies) / wall:.1f} req/s), latency p50 {_percentile(latencies, 50):.1f}s "
+            f"p95 {_percentile(latencies, 95):.1f}s, peak {peak} provider calls in flight"
+        ))
@@ -0,0 +1,73 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.business_context import get_business_context
+from core.caption_utils import generate_bulk_captions, parse_bulk_items
+from core.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Generate many captions for one user in a single batched run (e.g. a week of posts)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help='User whose business profile the captions are written for')
+        parser.add_argument(
+            '--file',
+            help='JSON file with a list of {"focus", "language", "length"} items',
+        )
+        parser.add_argument(
+            '--focus',
+            action='append',
+            default=[],
+            help='Caption focus (repeat for several captions); uses --language and --length',
+        )
+        parser.add_argument('--language', default='english', help='Language for --focus items')
+        parser.add_argument('--length', default='small', help='Length for --focus items (small, medium, long)')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        user = CustomUser.objects.filter(username=options['username']).first()
+        if not user:
+            raise CommandError(f"User '{options['username']}' not found")
+
+        raw_items = []
+        if options['file']:
+            try:
+                with open(options['file'], encoding='utf-8') as f:
+                    raw_items = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Could not read {options['file']}: {e}")
+        raw_items += [
+            {'focus': focus, 'language': options['language'], 'length': options['length']}
+            for focus in options['focus']
+        ]
+
+        items, error = parse_bulk_items(raw_items)
+        if error:
+            raise CommandError(error)
+
+        business = get_business_context(user)
+        if not business.exists:
+            raise CommandError(f"User '{user.username}' has no business profile")
+
+        if not options['json']:
+            self.stdout.write(f"✍️ Generating {len(items)} captions for {business.business_name or user.username}")
+        results = generate_bulk_captions(user, business, items)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, ensure_ascii=False, indent=2))
+            return
+
+        for result in results:
+            label = f"[{result['index'] + 1}] {result['focus']} ({result['language']}, {result['length']})"
+            if result['success']:
+                source = " - cached" if result['cache_hit'] else ""
+                self.stdout.write(self.style.SUCCESS(f"✅ {label}{source}"))
+                self.stdout.write(f"   {result['caption']}")
+            else:
+                self.stdout.write(self.style.ERROR(f"❌ {label}: {result['error']}"))
+
+        succeeded = sum(1 for result in results if result['success'])
+        self.stdout.write("-" * 50)
+        self.stdout.write(f"📊 {succeeded}/{len(results)} captions generated")
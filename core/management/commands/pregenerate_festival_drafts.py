@@ -0,0 +1,76 @@
+from django.core.management.base import BaseCommand
+
+from core.festival_drafts import draft_recipients, festivals_due_for_drafts, is_off_peak, prepare_festival_draft
+
+
+class Command(BaseCommand):
+    help = 'Generate festival captions and posters off-peak, before the festival notification emails go out'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Run outside the FESTIVAL_DRAFT_OFF_PEAK_HOURS window',
+        )
+        parser.add_argument(
+            '--regenerate',
+            action='store_true',
+            help='Replace drafts that are already ready',
+        )
+        parser.add_argument(
+            '--test',
+            action='store_true',
+            help='Test mode - show what would be generated without calling the AI providers',
+        )
+
+    def handle(self, *args, **options):
+        test_mode = options['test']
+
+        self.stdout.write("🎊 Festival Draft Pre-generation")
+        self.stdout.write(f"Mode: {'TEST' if test_mode else 'LIVE'}")
+        self.stdout.write("-" * 50)
+
+        if not options['force'] and not is_off_peak():
+            self.stdout.write(self.style.WARNING("Outside the off-peak window, nothing to do (use --force to run anyway)."))
+            return
+
+        festivals = festivals_due_for_drafts()
+        if not festivals:
+            self.stdout.write(self.style.WARNING("No festival notifications coming up."))
+            return
+
+        users = draft_recipients()
+        if not users.exists():
+            self.stdout.write(self.style.WARNING("No opted-in users with a business profile."))
+            return
+
+        generated = failed = skipped = 0
+        for festival in festivals:
+            self.stdout.write(f"\n📅 {festival.name} ({festival.date}), notification on {festival.notification_date}")
+            if test_mode:
+                self.stdout.write(f"  🧪 TEST: Would prepare drafts for {users.count()} users")
+                continue
+
+            for user in users:
+                try:
+                    draft, changed = prepare_festival_draft(festival, user, regenerate=options['regenerate'])
+                except Exception as e:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"  ❌ {user.username}: {e}"))
+                    continue
+
+                if not changed:
+                    skipped += 1
+                elif draft.status == "ready":
+                    generated += 1
+                    self.stdout.write(f"  ✅ {user.username}: {len(draft.captions)} captions, poster job {draft.poster_job_id}")
+                else:
+                    failed += 1
+                    self.stdout.write(self.style.ERROR(f"  ❌ {user.username}: {draft.error or 'no captions generated'}"))
+
+        self.stdout.write("\n" + "=" * 50)
+        self.stdout.write("📊 Summary:")
+        self.stdout.write(f"  Generated: {generated}")
+        self.stdout.write(f"  Already ready: {skipped}")
+        self.stdout.write(f"  Failed: {failed}")
+        self.stdout.write(self.style.SUCCESS("✅ Festival drafts prepared (posters are finished by run_poster_worker)"))
@@ -0,0 +1,98 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core.poster_utils import (
+    claim_next_poster_job, claim_campaign_jobs, process_poster_job,
+    run_poster_campaign, requeue_stale_poster_jobs
+)
+
+
+def _run_job(job, campaign_jobs=None):
+    try:
+        if campaign_jobs:
+            # The whole campaign runs in one slot, fanned out over its own pool
+            run_poster_campaign(campaign_jobs)
+            job.refresh_from_db()
+            return job
+        return process_poster_job(job)
+    finally:
+        # Each pool thread holds its own DB connection
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Process queued poster generation jobs outside the web process'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=settings.POSTER_WORKER_CONCURRENCY,
+            help='Number of posters generated in parallel',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=settings.POSTER_WORKER_POLL_INTERVAL,
+            help='Seconds to wait between queue checks when idle',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Drain the queue and exit instead of running forever',
+        )
+
+    def handle(self, *args, **options):
+        concurrency = max(1, options['concurrency'])
+        poll_interval = options['poll_interval']
+        run_once = options['once']
+
+        requeued = requeue_stale_poster_jobs()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"Re-queued {requeued} stale poster jobs"))
+
+        self.stdout.write(f"🎨 Poster worker started (concurrency={concurrency})")
+
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='poster-worker') as pool:
+            try:
+                while True:
+                    # Fill free slots with queued jobs
+                    while len(in_flight) < concurrency:
+                        job = claim_next_poster_job()
+                        if job is None:
+                            break
+                        campaign_jobs = None
+                        if job.campaign_id:
+                            # Claim the rest of the campaign before another slot picks it up
+                            campaign_jobs = [job] + claim_campaign_jobs(job.campaign_id)
+                            label = f"campaign {job.campaign_id} ({len(campaign_jobs)} posters)"
+                        else:
+                            label = job.promotion_name[:50]
+                        self.stdout.write(f"  ▶️ Job {job.id} for {job.user.username}: {label}")
+                        in_flight.add(pool.submit(_run_job, job, campaign_jobs))
+
+                    if not in_flight:
+                        if run_once:
+                            break
+                        close_old_connections()
+                        time.sleep(poll_interval)
+                        continue
+
+                    done, in_flight = wait(in_flight, timeout=poll_interval, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            job = future.result()
+                            style = self.style.SUCCESS if job.status == 'done' else self.style.ERROR
+                            self.stdout.write(style(f"  ✅ Job {job.id} {job.status}"))
+                        except Exception as e:
+                            self.stdout.write(self.style.ERROR(f"  ❌ Worker error: {e}"))
+            except KeyboardInterrupt:
+                self.stdout.write(self.style.WARNING("Stopping poster worker, waiting for running jobs..."))
+                wait(in_flight)
+
+        self.stdout.write(self.style.SUCCESS("Poster worker stopped"))
@@ -0,0 +1,78 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.models import VideoJob
+from core.video_jobs import (
+    claim_next_video_job, submit_video_job, claim_due_video_jobs, poll_video_job,
+    next_video_poll_at, requeue_stale_video_jobs, get_veo_client
+)
+
+
+class Command(BaseCommand):
+    help = 'Submit queued video jobs to Veo and track their operations outside the web process'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--idle-interval',
+            type=float,
+            default=settings.VIDEO_POLLER_IDLE_INTERVAL,
+            help='Longest sleep between loops, i.e. how soon a new job is submitted',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once no video job is queued or running instead of running forever',
+        )
+
+    def handle(self, *args, **options):
+        idle_interval = options['idle_interval']
+        run_once = options['once']
+
+        requeued = requeue_stale_video_jobs()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f"Re-queued {requeued} stale video jobs"))
+        running = VideoJob.objects.filter(status="running").count()
+        self.stdout.write(f"🎬 Video poller started ({running} operations in progress)")
+
+        try:
+            while True:
+                close_old_connections()
+                client = get_veo_client()
+
+                # Submit queued jobs while the "veo" rate limit bucket has tokens
+                while True:
+                    job = claim_next_video_job()
+                    if job is None:
+                        break
+                    self.stdout.write(f"  ▶️ Video job {job.id} for {job.user.username}: {job.campaign_name[:50]}")
+                    if not submit_video_job(job, client):
+                        self.stdout.write(f"  ⏸️ Video job {job.id} waits for Veo capacity")
+                        break
+                    self._report_finished(job)
+
+                # Check every operation that is due, in one pass
+                for job in claim_due_video_jobs():
+                    job = poll_video_job(job, client)
+                    self._report_finished(job)
+
+                next_poll_at = next_video_poll_at()
+                if run_once and next_poll_at is None and not VideoJob.objects.filter(status="queued").exists():
+                    break
+                sleep = idle_interval
+                if next_poll_at is not None:
+                    sleep = min(sleep, (next_poll_at - timezone.now()).total_seconds())
+                time.sleep(max(0.1, sleep))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Stopping video poller; running operations resume on the next start"))
+
+        self.stdout.write(self.style.SUCCESS("Video poller stopped"))
+
+    def _report_finished(self, job):
+        if job.status == 'done':
+            self.stdout.write(self.style.SUCCESS(f"  ✅ Video job {job.id} done after {job.polls} checks"))
+        elif job.status == 'failed':
+            self.stdout.write(self.style.ERROR(f"  ❌ Video job {job.id} failed: {job.error}"))
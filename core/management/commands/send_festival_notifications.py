@@ -3,6 +3,7 @@ from django.utils import timezone
 from datetime import date, timedelta
 from core.models import Festival, CustomUser
 from core.email_utils import send_festival_notification_email
+from core.festival_subjects import get_festival_subject_variants, recipient_business_names
 
 class Command(BaseCommand):
     help = 'Send festival notifications to verified users'
@@ -51,6 +52,8 @@ class Command(BaseCommand):
         
         self.stdout.write(f"Found {active_festivals.count()} active festivals")
         self.stdout.write(f"Found {users.count()} users to notify")
+        # Subject lines name the business: one query for the whole list instead of one per email
+        business_names = recipient_business_names(users)
         
         notifications_sent = 0
         
@@ -62,10 +65,15 @@ class Command(BaseCommand):
                 pre_notification_date = festival.notification_date
                 if today == pre_notification_date:
                     self.stdout.write(f"  ✅ Pre-festival notification due today!")
+                    # Subject variants: one provider call for the whole list
+                    subject_variants = get_festival_subject_variants(festival, 'pre')
+                    for variant in subject_variants:
+                        self.stdout.write(f"    ✉️ Subject variant: {variant}")
                     if not test_mode:
                         for user in users:
                             try:
-                                if send_festival_notification_email(user, festival, 'pre'):
+                                if send_festival_notification_email(user, festival, 'pre', subject_variants,
+                                                                   business_names.get(user.pk, "")):
                                     notifications_sent += 1
                                     self.stdout.write(f"    📧 Sent to {user.email}")
                                 else:
@@ -86,10 +94,15 @@ class Command(BaseCommand):
             if notification_type in ['festival-day', 'both'] and festival.send_on_festival_day:
                 if today == festival.date:
                     self.stdout.write(f"  🎉 Festival day notification due today!")
+                    # Subject variants: one provider call for the whole list
+                    subject_variants = get_festival_subject_variants(festival, 'festival-day')
+                    for variant in subject_variants:
+                        self.stdout.write(f"    ✉️ Subject variant: {variant}")
                     if not test_mode:
                         for user in users:
                             try:
-                                if send_festival_notification_email(user, festival, 'festival-day'):
+                                if send_festival_notification_email(user, festival, 'festival-day', subject_variants,
+                                                                   business_names.get(user.pk, "")):
                                     notifications_sent += 1
                                     self.stdout.write(f"    📧 Sent to {user.email}")
                                 else:
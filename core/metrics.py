@@ -0,0 +1,92 @@
+"""
+In-process counters and latency samples for the AI features (cache hits, provider calls, ...)
+
+Values live in the memory of the current process, so the web process and
+the worker commands each report their own numbers.
+"""
+import threading
+from collections import defaultdict, deque
+
+# Latency samples kept per name (rolling window)
+LATENCY_WINDOW = 200
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_latencies = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+_outcomes = defaultdict(lambda: deque(maxlen=LATENCY_WINDOW))
+
+
+def incr(name, amount=1):
+    """Increase a named counter"""
+    with _lock:
+        _counters[name] += amount
+
+
+def get_counter(name):
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def hit_rate(prefix):
+    """Hit ratio for a '<prefix>.hit' / '<prefix>.miss' counter pair"""
+    with _lock:
+        hits = _counters.get(f"{prefix}.hit", 0)
+        misses = _counters.get(f"{prefix}.miss", 0)
+    total = hits + misses
+    return round(hits / total, 4) if total else 0.0
+
+
+def observe(name, seconds, ok=True):
+    """
+    Record one call of a provider / operation
+
+    Only successful calls feed the latency window, so percentiles describe
+    how long a *usable* answer takes; failures count towards the success rate.
+    """
+    with _lock:
+        if ok:
+            _latencies[name].append(seconds)
+        _outcomes[name].append(bool(ok))
+        _counters[f"{name}.{'ok' if ok else 'error'}"] += 1
+
+
+def sample_count(name):
+    with _lock:
+        return len(_latencies.get(name, ()))
+
+
+def percentile(name, pct):
+    """Latency percentile (0-100) of the rolling window, None without samples"""
+    with _lock:
+        samples = sorted(_latencies.get(name, ()))
+    if not samples:
+        return None
+    index = min(len(samples) - 1, max(0, int(round(pct / 100 * len(samples))) - 1))
+    return samples[index]
+
+
+def success_rate(name):
+    """Share of successful calls in the rolling window (1.0 without samples)"""
+    with _lock:
+        outcomes = list(_outcomes.get(name, ()))
+    if not outcomes:
+        return 1.0
+    return sum(outcomes) / len(outcomes)
+
+
+def snapshot():
+    """Return a JSON-serialisable copy of all counters and latency summaries"""
+    with _lock:
+        names = set(_latencies) | set(_outcomes)
+        counters = dict(sorted(_counters.items()))
+    latencies = {}
+    for name in sorted(names):
+        p50 = percentile(name, 50)
+        p95 = percentile(name, 95)
+        latencies[name] = {
+            'samples': sample_count(name),
+            'p50': round(p50, 3) if p50 is not None else None,
+            'p95': round(p95, 3) if p95 is not None else None,
+            'success_rate': round(success_rate(name), 4),
+        }
+    return {'counters': counters, 'latency': latencies}
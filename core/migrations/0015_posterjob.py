@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:52
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_alter_postergeneration_promotion_name'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosterJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('promotion_name', models.TextField()),
+                ('offer_type', models.CharField(max_length=100)),
+                ('language', models.CharField(blank=True, max_length=50)),
+                ('input_data', models.JSONField(default=dict, help_text='Business details captured when the job was queued')),
+                ('prompt_text', models.TextField(help_text='Final prompt sent to AI')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=10)),
+                ('poster_url', models.CharField(blank=True, max_length=500)),
+                ('error', models.TextField(blank=True, help_text='User-facing message when the job did not produce a poster')),
+                ('attempts', models.IntegerField(default=0, help_text='Number of times a worker picked up this job')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='poster_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Poster Job',
+                'verbose_name_plural': 'Poster Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_posterjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosterCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(help_text='SHA-256 of normalized prompt, model id and language', max_length=64, unique=True)),
+                ('model_id', models.CharField(max_length=100)),
+                ('language', models.CharField(blank=True, max_length=50)),
+                ('poster_url', models.CharField(max_length=500)),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Poster Cache Entry',
+                'verbose_name_plural': 'Poster Cache Entries',
+                'ordering': ['-last_used_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='posterjob',
+            name='cache_key',
+            field=models.CharField(blank=True, help_text='PosterCacheEntry key for this prompt', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='posterjob',
+            name='regenerate',
+            field=models.BooleanField(default=False, help_text='Skip the poster cache and always call the model'),
+        ),
+    ]
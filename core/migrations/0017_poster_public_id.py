@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_poster_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postercacheentry',
+            name='public_id',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='postergeneration',
+            name='public_id',
+            field=models.CharField(blank=True, help_text='Cloudinary public ID used to build renditions', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='userhistory',
+            name='public_id',
+            field=models.CharField(blank=True, help_text='Cloudinary public ID for image actions', max_length=255),
+        ),
+    ]
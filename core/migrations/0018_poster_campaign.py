@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 01:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_poster_public_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postergeneration',
+            name='campaign_id',
+            field=models.UUIDField(blank=True, db_index=True, help_text='Groups posters generated as one campaign', null=True),
+        ),
+        migrations.AddField(
+            model_name='posterjob',
+            name='campaign_id',
+            field=models.UUIDField(blank=True, db_index=True, help_text='Shared by all jobs of a multi-variant campaign', null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_poster_campaign'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PosterBackground',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('background_key', models.CharField(help_text='SHA-256 of business type, theme and model id', max_length=64, unique=True)),
+                ('business_type', models.CharField(max_length=200)),
+                ('theme', models.CharField(max_length=200)),
+                ('model_id', models.CharField(max_length=100)),
+                ('image_url', models.CharField(blank=True, help_text='Cloudinary URL of the background', max_length=500)),
+                ('public_id', models.CharField(blank=True, max_length=255)),
+                ('local_path', models.CharField(blank=True, help_text='Copy under MEDIA_ROOT used for compositing', max_length=500)),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Poster Background',
+                'verbose_name_plural': 'Poster Backgrounds',
+                'ordering': ['-last_used_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='posterjob',
+            name='render_mode',
+            field=models.CharField(choices=[('ai_text', 'AI-designed text'), ('composite', 'Exact text over a cached background')], default='ai_text', max_length=10),
+        ),
+    ]
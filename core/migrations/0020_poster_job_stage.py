@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_poster_background'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='posterjob',
+            name='stage',
+            field=models.CharField(choices=[('prompt_built', 'Prompt built'), ('queued', 'Queued'), ('started', 'Picked up by a worker'), ('provider_started', 'Asking the image model'), ('first_byte', 'Image model responding'), ('image_received', 'Image received'), ('compositing', 'Adding your text'), ('uploaded', 'Uploaded'), ('recorded', 'Saved to your history')], default='queued', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='posterjob',
+            name='stage_log',
+            field=models.JSONField(blank=True, default=list, help_text='Stages reached so far: [{stage, at, detail}]'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_poster_job_stage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CaptionCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cache_key', models.CharField(help_text='SHA-256 of profile version, normalized focus, language and length', max_length=64, unique=True)),
+                ('context_version', models.CharField(help_text='BusinessContext.profile_version the captions were written for', max_length=16)),
+                ('user_input', models.TextField(blank=True, help_text='Normalized focus text')),
+                ('language', models.CharField(blank=True, max_length=50)),
+                ('length', models.CharField(blank=True, max_length=10)),
+                ('captions', models.JSONField(default=list)),
+                ('next_index', models.IntegerField(default=0, help_text='Position of the next caption served from the pool')),
+                ('hit_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='caption_cache_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Caption Cache Entry',
+                'verbose_name_plural': 'Caption Cache Entries',
+                'ordering': ['-last_used_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_caption_cache_entry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FestivalDraft',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10)),
+                ('language', models.CharField(blank=True, max_length=50)),
+                ('captions', models.JSONField(blank=True, default=list, help_text='Ready-to-use captions: [{focus, caption}]')),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('generated_at', models.DateTimeField(blank=True, null=True)),
+                ('festival', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='drafts', to='core.festival')),
+                ('poster_job', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='festival_drafts', to='core.posterjob')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='festival_drafts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Festival Draft',
+                'verbose_name_plural': 'Festival Drafts',
+                'ordering': ['festival__date'],
+                'unique_together': {('festival', 'user')},
+            },
+        ),
+    ]
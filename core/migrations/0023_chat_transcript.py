@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_festival_draft'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChatSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conversation_id', models.CharField(max_length=32)),
+                ('summary', models.TextField(blank=True)),
+                ('through_seq', models.IntegerField(default=0, help_text='Last ChatTurn.seq folded into the summary')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_summaries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chat Summary',
+                'verbose_name_plural': 'Chat Summaries',
+                'unique_together': {('user', 'conversation_id')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ChatTurn',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('conversation_id', models.CharField(help_text='Chat started on the chatbot page (kept in the session)', max_length=32)),
+                ('seq', models.IntegerField(help_text='Position of the turn in its conversation')),
+                ('role', models.CharField(choices=[('user', 'User'), ('bot', 'Bot')], max_length=4)),
+                ('content', models.TextField()),
+                ('token_count', models.IntegerField(default=0, help_text='Estimated prompt tokens of this turn')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chat_turns', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Chat Turn',
+                'verbose_name_plural': 'Chat Turns',
+                'ordering': ['seq'],
+                'unique_together': {('user', 'conversation_id', 'seq')},
+            },
+        ),
+    ]
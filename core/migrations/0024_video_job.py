@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-17 02:54
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0023_chat_transcript'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='userhistory',
+            name='action_type',
+            field=models.CharField(choices=[('poster_generation', 'Poster Generation'), ('text_generation', 'Text Generation'), ('logo_upload', 'Logo Upload'), ('video_generation', 'Video Generation')], max_length=20),
+        ),
+        migrations.CreateModel(
+            name='VideoJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campaign_name', models.CharField(blank=True, max_length=200)),
+                ('theme', models.CharField(blank=True, max_length=200)),
+                ('aspect_ratio', models.CharField(default='16:9', max_length=10)),
+                ('input_data', models.JSONField(default=dict, help_text='Form and business details captured when the job was queued')),
+                ('prompt_text', models.TextField(help_text='Final prompt sent to AI')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('submitting', 'Submitting'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], db_index=True, default='queued', max_length=10)),
+                ('operation_name', models.CharField(blank=True, help_text='Veo long-running operation, checkpointed once submitted', max_length=255)),
+                ('next_poll_at', models.DateTimeField(blank=True, db_index=True, help_text='When the poller next checks the operation', null=True)),
+                ('polls', models.IntegerField(default=0, help_text='Number of times the operation was checked')),
+                ('attempts', models.IntegerField(default=0, help_text='Number of times the job was submitted to Veo')),
+                ('video_url', models.CharField(blank=True, max_length=500)),
+                ('public_id', models.CharField(blank=True, max_length=255)),
+                ('error', models.TextField(blank=True, help_text='User-facing message when the job did not produce a video')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('submitted_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='video_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Video Job',
+                'verbose_name_plural': 'Video Jobs',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -212,7 +212,7 @@ import sys
 from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.core.exceptions import ValidationError
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
 
@@ -346,6 +346,8 @@ class PosterGeneration(models.Model):
 
     offer_type = models.CharField(max_length=100)
     poster_url = models.CharField(max_length=500)
+    public_id = models.CharField(max_length=255, blank=True, help_text="Cloudinary public ID used to build renditions")
+    campaign_id = models.UUIDField(null=True, blank=True, db_index=True, help_text="Groups posters generated as one campaign")
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -387,12 +389,14 @@ class UserHistory(models.Model):
         ("poster_generation", "Poster Generation"),
         ("text_generation", "Text Generation"),
         ("logo_upload", "Logo Upload"),
+        ("video_generation", "Video Generation"),
     ]
 
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="user_history")
     action_type = models.CharField(max_length=20, choices=ACTION_TYPES)
     input_data = models.JSONField(help_text="Original input data from user")
     output_data = models.TextField(help_text="Generated content or Cloudinary URL")
+    public_id = models.CharField(max_length=255, blank=True, help_text="Cloudinary public ID for image actions")
     prompt_used = models.TextField(blank=True, help_text="Final prompt sent to AI")
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -412,6 +416,23 @@ class UserHistory(models.Model):
     def is_text_action(self):
         return self.action_type == "text_generation"
 
+    @property
+    def is_video_action(self):
+        return self.action_type == "video_generation"
+
+
+# ✅ Signal to drop the cached AI prompt context when the profile or activity changes
+@receiver(post_save, sender=BusinessProfile)
+@receiver(post_save, sender=PosterGeneration)
+@receiver(post_save, sender=UserHistory)
+@receiver(post_delete, sender=BusinessProfile)
+@receiver(post_delete, sender=PosterGeneration)
+@receiver(post_delete, sender=UserHistory)
+def invalidate_business_context_on_change(sender, instance, **kwargs):
+    """Invalidate the cached BusinessContext of the affected user (see core.business_context)"""
+    from .business_context import invalidate_business_context
+    invalidate_business_context(instance.user_id)
+
 
 class TwoFactorAuth(models.Model):
     user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, related_name="twofactor")
@@ -450,3 +471,244 @@ class PasswordResetOTP(models.Model):
         """Check if OTP is still valid (not expired and not used)"""
         from django.utils import timezone
         return (not self.is_used) and (self.expires_at > timezone.now())
+
+
+class PosterJob(models.Model):
+    """Poster generation request queued by the web process and run by the run_poster_worker command"""
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+    RENDER_MODE_CHOICES = [
+        ("ai_text", "AI-designed text"),
+        ("composite", "Exact text over a cached background"),
+    ]
+    # Pipeline stages streamed to the poster page, in the order they normally happen
+    STAGE_CHOICES = [
+        ("prompt_built", "Prompt built"),
+        ("queued", "Queued"),
+        ("started", "Picked up by a worker"),
+        ("provider_started", "Asking the image model"),
+        ("first_byte", "Image model responding"),
+        ("image_received", "Image received"),
+        ("compositing", "Adding your text"),
+        ("uploaded", "Uploaded"),
+        ("recorded", "Saved to your history"),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="poster_jobs")
+    promotion_name = models.TextField()
+    offer_type = models.CharField(max_length=100)
+    language = models.CharField(max_length=50, blank=True)
+    input_data = models.JSONField(default=dict, help_text="Business details captured when the job was queued")
+    prompt_text = models.TextField(help_text="Final prompt sent to AI")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued", db_index=True)
+    poster_url = models.CharField(max_length=500, blank=True)
+    error = models.TextField(blank=True, help_text="User-facing message when the job did not produce a poster")
+    cache_key = models.CharField(max_length=64, blank=True, help_text="PosterCacheEntry key for this prompt")
+    regenerate = models.BooleanField(default=False, help_text="Skip the poster cache and always call the model")
+    render_mode = models.CharField(max_length=10, choices=RENDER_MODE_CHOICES, default="ai_text")
+    stage = models.CharField(max_length=20, choices=STAGE_CHOICES, default="queued")
+    stage_log = models.JSONField(default=list, blank=True, help_text="Stages reached so far: [{stage, at, detail}]")
+    campaign_id = models.UUIDField(null=True, blank=True, db_index=True, help_text="Shared by all jobs of a multi-variant campaign")
+    attempts = models.IntegerField(default=0, help_text="Number of times a worker picked up this job")
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Poster Job"
+        verbose_name_plural = "Poster Jobs"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.promotion_name[:50]} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ["done", "failed"]
+
+
+class VideoJob(models.Model):
+    """Veo video request queued by the web process and tracked by the run_video_poller command"""
+    STATUS_CHOICES = [
+        ("queued", "Queued"),
+        ("submitting", "Submitting"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="video_jobs")
+    campaign_name = models.CharField(max_length=200, blank=True)
+    theme = models.CharField(max_length=200, blank=True)
+    aspect_ratio = models.CharField(max_length=10, default="16:9")
+    input_data = models.JSONField(default=dict, help_text="Form and business details captured when the job was queued")
+    prompt_text = models.TextField(help_text="Final prompt sent to AI")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="queued", db_index=True)
+    operation_name = models.CharField(max_length=255, blank=True, help_text="Veo long-running operation, checkpointed once submitted")
+    next_poll_at = models.DateTimeField(null=True, blank=True, db_index=True, help_text="When the poller next checks the operation")
+    polls = models.IntegerField(default=0, help_text="Number of times the operation was checked")
+    attempts = models.IntegerField(default=0, help_text="Number of times the job was submitted to Veo")
+    video_url = models.CharField(max_length=500, blank=True)
+    public_id = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True, help_text="User-facing message when the job did not produce a video")
+    created_at = models.DateTimeField(auto_now_add=True)
+    submitted_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        verbose_name = "Video Job"
+        verbose_name_plural = "Video Jobs"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.campaign_name[:50]} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in ["done", "failed"]
+
+
+class PosterCacheEntry(models.Model):
+    """Generated poster reused for identical (prompt, model, language) submissions"""
+    cache_key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of normalized prompt, model id and language")
+    model_id = models.CharField(max_length=100)
+    language = models.CharField(max_length=50, blank=True)
+    poster_url = models.CharField(max_length=500)
+    public_id = models.CharField(max_length=255, blank=True)
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-last_used_at"]
+        verbose_name = "Poster Cache Entry"
+        verbose_name_plural = "Poster Cache Entries"
+
+    def __str__(self):
+        return f"{self.cache_key[:12]} ({self.model_id}, {self.hit_count} hits)"
+
+
+class PosterBackground(models.Model):
+    """Text-free AI background reused for every poster of a (business type, theme)"""
+    background_key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of business type, theme and model id")
+    business_type = models.CharField(max_length=200)
+    theme = models.CharField(max_length=200)
+    model_id = models.CharField(max_length=100)
+    image_url = models.CharField(max_length=500, blank=True, help_text="Cloudinary URL of the background")
+    public_id = models.CharField(max_length=255, blank=True)
+    local_path = models.CharField(max_length=500, blank=True, help_text="Copy under MEDIA_ROOT used for compositing")
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-last_used_at"]
+        verbose_name = "Poster Background"
+        verbose_name_plural = "Poster Backgrounds"
+
+    def __str__(self):
+        return f"{self.business_type} / {self.theme} ({self.hit_count} hits)"
+
+
+class CaptionCacheEntry(models.Model):
+    """Small rotating pool of AI captions for a repeated (business, focus, language, length) request"""
+    cache_key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of profile version, normalized focus, language and length")
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="caption_cache_entries")
+    context_version = models.CharField(max_length=16, help_text="BusinessContext.profile_version the captions were written for")
+    user_input = models.TextField(blank=True, help_text="Normalized focus text")
+    language = models.CharField(max_length=50, blank=True)
+    length = models.CharField(max_length=10, blank=True)
+    captions = models.JSONField(default=list)
+    next_index = models.IntegerField(default=0, help_text="Position of the next caption served from the pool")
+    hit_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["-last_used_at"]
+        verbose_name = "Caption Cache Entry"
+        verbose_name_plural = "Caption Cache Entries"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.user_input[:50]} ({len(self.captions)} captions)"
+
+
+class FestivalDraft(models.Model):
+    """Festival captions and poster generated off-peak, ahead of the festival notification email"""
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("ready", "Ready"),
+        ("failed", "Failed"),
+    ]
+
+    festival = models.ForeignKey(Festival, on_delete=models.CASCADE, related_name="drafts")
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="festival_drafts")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default="pending", db_index=True)
+    language = models.CharField(max_length=50, blank=True)
+    captions = models.JSONField(default=list, blank=True, help_text="Ready-to-use captions: [{focus, caption}]")
+    poster_job = models.ForeignKey(PosterJob, on_delete=models.SET_NULL, null=True, blank=True, related_name="festival_drafts")
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    generated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["festival__date"]
+        unique_together = ["festival", "user"]
+        verbose_name = "Festival Draft"
+        verbose_name_plural = "Festival Drafts"
+
+    def __str__(self):
+        return f"{self.user.username}: {self.festival.name} ({self.status})"
+
+    @property
+    def poster_url(self):
+        """URL of the draft poster once the worker has finished it"""
+        if self.poster_job and self.poster_job.status == "done":
+            return self.poster_job.poster_url
+        return ""
+
+
+class ChatTurn(models.Model):
+    """One chatbot message, appended per turn; each conversation keeps at most CHAT_TRANSCRIPT_MAX_TURNS rows"""
+    ROLE_CHOICES = [
+        ("user", "User"),
+        ("bot", "Bot"),
+    ]
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="chat_turns")
+    conversation_id = models.CharField(max_length=32, help_text="Chat started on the chatbot page (kept in the session)")
+    seq = models.IntegerField(help_text="Position of the turn in its conversation")
+    role = models.CharField(max_length=4, choices=ROLE_CHOICES)
+    content = models.TextField()
+    token_count = models.IntegerField(default=0, help_text="Estimated prompt tokens of this turn")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["seq"]
+        unique_together = ["user", "conversation_id", "seq"]
+        verbose_name = "Chat Turn"
+        verbose_name_plural = "Chat Turns"
+
+    def __str__(self):
+        return f"{self.user.username} #{self.seq} {self.role}: {self.content[:50]}"
+
+
+class ChatSummary(models.Model):
+    """Running summary of the chat turns that no longer fit the prompt token budget"""
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="chat_summaries")
+    conversation_id = models.CharField(max_length=32)
+    summary = models.TextField(blank=True)
+    through_seq = models.IntegerField(default=0, help_text="Last ChatTurn.seq folded into the summary")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ["user", "conversation_id"]
+        verbose_name = "Chat Summary"
+        verbose_name_plural = "Chat Summaries"
+
+    def __str__(self):
+        return f"{self.user.username} {self.conversation_id[:8]} (through #{self.through_seq})"
@@ -0,0 +1,107 @@
+"""
+Page context of chatbot messages, addressed by content hash
+
+The chat widget describes the page the user is on (form fields, options,
+buttons). Instead of uploading that description with every message it sends
+its SHA-256; the full text is only sent the first time, or when the server
+answers page_context_missing. Descriptions are stored compacted, per page
+URL and hash, in the "shared" cache (see CACHES), so every user of the same
+page reuses them whichever worker serves the request.
+"""
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import caches
+
+from . import metrics
+
+# Another worker may get the next message of the same page, so no per-process cache
+shared_cache = caches["shared"]
+
+_OPTIONS_RE = re.compile(r"\(options: (.*)\)$")
+
+
+def page_content_hash(page_content):
+    """Hex SHA-256 of the page description, as computed by the widget (crypto.subtle)"""
+    return hashlib.sha256(page_content.encode("utf-8")).hexdigest()
+
+
+def _cache_key(current_page, content_hash):
+    page = hashlib.sha256((current_page or "").encode("utf-8")).hexdigest()[:16]
+    return f"page_context:{page}:{content_hash}"
+
+
+def _shorten_options(line):
+    match = _OPTIONS_RE.search(line)
+    if not match:
+        return line
+    options = match.group(1).split(", ")
+    limit = settings.PAGE_CONTEXT_MAX_OPTIONS
+    if len(options) <= limit:
+        return line
+    return f"{line[:match.start()]}(options: {', '.join(options[:limit])}, ... {len(options) - limit} more)"
+
+
+def compact_page_content(page_content):
+    """
+    Shorter form of a page description for the prompt
+
+    Whitespace and repeated lines are dropped, buttons are merged into one
+    line, long option lists are cut to PAGE_CONTEXT_MAX_OPTIONS, and the
+    result is capped at PAGE_CONTEXT_MAX_CHARS.
+    """
+    titles, fields, buttons = [], [], []
+    seen = set()
+    for line in page_content.splitlines():
+        line = " ".join(line.split())
+        if not line or line in seen:
+            continue
+        seen.add(line)
+        if line.startswith("- Button: "):
+            buttons.append(line[len("- Button: "):].strip('"'))
+        elif line.startswith("Page Title:"):
+            titles.append(line)
+        else:
+            fields.append(_shorten_options(line))
+
+    lines = titles + fields
+    if buttons:
+        lines.append("Buttons: " + ", ".join(buttons))
+    return "\n".join(lines)[:settings.PAGE_CONTEXT_MAX_CHARS]
+
+
+def resolve_page_context(current_page, page_hash, page_content):
+    """
+    Compacted page description for a chat message
+
+    Args:
+        current_page: URL path the widget is on
+        page_hash: SHA-256 the widget sent (may be empty on old clients / insecure origins)
+        page_content: Full description, only sent when the widget thinks the server lacks it
+
+    Returns:
+        tuple: (compacted description or "", True if the widget must resend with page_content)
+    """
+    if page_content:
+        content_hash = page_content_hash(page_content)
+        if page_hash and page_hash != content_hash:
+            print(f"DEBUG: Page context hash mismatch for {current_page}, using the server hash")
+        key = _cache_key(current_page, content_hash)
+        compact = shared_cache.get(key)
+        if compact is None:
+            compact = compact_page_content(page_content)
+            shared_cache.set(key, compact, settings.PAGE_CONTEXT_CACHE_SECONDS)
+        metrics.incr("page_context.uploaded")
+        metrics.incr("page_context.uploaded_chars", len(page_content))
+        return compact, False
+
+    if not page_hash:
+        return "", False
+
+    compact = shared_cache.get(_cache_key(current_page, page_hash))
+    if compact is None:
+        metrics.incr("page_context.miss")
+        return "", True
+    metrics.incr("page_context.hit")
+    return compact, False
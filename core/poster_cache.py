@@ -0,0 +1,154 @@
+import hashlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import metrics
+from .models import PosterCacheEntry, PosterBackground
+
+
+def normalize_prompt(prompt_text):
+    """Strip each line and collapse runs of whitespace so cosmetic differences share a key"""
+    lines = [" ".join(line.split()) for line in prompt_text.strip().splitlines()]
+    return "\n".join(line for line in lines if line)
+
+
+def poster_cache_key(prompt_text, model_id, language):
+    """
+    Content address of a poster request
+
+    Args:
+        prompt_text: Full prompt sent to the image model
+        model_id: Image model identifier
+        language: Poster language
+
+    Returns:
+        str: hex SHA-256 digest
+    """
+    payload = "\x1f".join([model_id, (language or "").strip().lower(), normalize_prompt(prompt_text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached_poster(cache_key):
+    """
+    Look up a stored poster, counting hits/misses and refreshing LRU order
+
+    Returns:
+        PosterCacheEntry or None if no fresh entry exists
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.POSTER_CACHE_TTL_SECONDS)
+    entry = PosterCacheEntry.objects.filter(cache_key=cache_key, created_at__gte=cutoff).first()
+    if not entry:
+        metrics.incr("poster_cache.miss")
+        return None
+
+    PosterCacheEntry.objects.filter(pk=entry.pk).update(
+        hit_count=F("hit_count") + 1,
+        last_used_at=timezone.now()
+    )
+    metrics.incr("poster_cache.hit")
+    return entry
+
+
+def store_cached_poster(cache_key, model_id, language, poster_url, public_id=""):
+    """Remember a generated poster and evict expired / least recently used entries"""
+    now = timezone.now()
+    PosterCacheEntry.objects.update_or_create(
+        cache_key=cache_key,
+        defaults={
+            'model_id': model_id,
+            'language': language or "",
+            'poster_url': poster_url,
+            'public_id': public_id or "",
+            'created_at': now,
+            'last_used_at': now,
+        }
+    )
+    metrics.incr("poster_cache.store")
+    evict_poster_cache()
+
+
+def evict_poster_cache():
+    """Apply TTL expiry and the POSTER_CACHE_MAX_ENTRIES LRU bound"""
+    cutoff = timezone.now() - timedelta(seconds=settings.POSTER_CACHE_TTL_SECONDS)
+    expired, _ = PosterCacheEntry.objects.filter(created_at__lt=cutoff).delete()
+
+    overflow_ids = list(
+        PosterCacheEntry.objects.order_by("-last_used_at")
+        .values_list("id", flat=True)[settings.POSTER_CACHE_MAX_ENTRIES:]
+    )
+    evicted = 0
+    if overflow_ids:
+        evicted, _ = PosterCacheEntry.objects.filter(id__in=overflow_ids).delete()
+
+    if expired or evicted:
+        metrics.incr("poster_cache.evicted", expired + evicted)
+    return expired + evicted
+
+
+def poster_cache_stats():
+    """Counters of this process plus totals stored in the database"""
+    return {
+        'hits': metrics.get_counter("poster_cache.hit"),
+        'misses': metrics.get_counter("poster_cache.miss"),
+        'hit_rate': metrics.hit_rate("poster_cache"),
+        'entries': PosterCacheEntry.objects.count(),
+        'lifetime_hits': PosterCacheEntry.objects.aggregate(total=Sum("hit_count"))['total'] or 0,
+        'background_hits': metrics.get_counter("poster_background.hit"),
+        'background_misses': metrics.get_counter("poster_background.miss"),
+        'backgrounds': PosterBackground.objects.count(),
+    }
+
+
+def normalize_theme(text):
+    """Lower-case and collapse whitespace so "Diwali  Sale" and "diwali sale" share a background"""
+    return " ".join((text or "").lower().split())
+
+
+def background_cache_key(business_type, theme, model_id):
+    """Content address of a text-free background (hex SHA-256)"""
+    payload = "\x1f".join([model_id, normalize_theme(business_type), normalize_theme(theme)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def get_cached_background(background_key):
+    """
+    Look up a stored background, counting hits/misses
+
+    Returns:
+        PosterBackground or None if no fresh entry exists
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.POSTER_BACKGROUND_TTL_SECONDS)
+    entry = PosterBackground.objects.filter(background_key=background_key, created_at__gte=cutoff).first()
+    if not entry:
+        metrics.incr("poster_background.miss")
+        return None
+
+    PosterBackground.objects.filter(pk=entry.pk).update(
+        hit_count=F("hit_count") + 1,
+        last_used_at=timezone.now()
+    )
+    metrics.incr("poster_background.hit")
+    return entry
+
+
+def store_cached_background(background_key, business_type, theme, model_id, local_path, image_url="", public_id=""):
+    """Remember a generated background for later compositing"""
+    now = timezone.now()
+    entry, _ = PosterBackground.objects.update_or_create(
+        background_key=background_key,
+        defaults={
+            'business_type': business_type[:200],
+            'theme': normalize_theme(theme)[:200],
+            'model_id': model_id,
+            'local_path': local_path,
+            'image_url': image_url or "",
+            'public_id': public_id or "",
+            'created_at': now,
+            'last_used_at': now,
+        }
+    )
+    metrics.incr("poster_background.store")
+    return entry
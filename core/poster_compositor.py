@@ -0,0 +1,308 @@
+"""
+Local text and branding layer for posters
+
+The image model only paints a text-free themed background (cached per business
+type and theme in PosterBackground); the exact business details, promotion and
+offer are drawn here with Pillow. A new offer on a known theme therefore costs
+one local render instead of a provider call.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from io import BytesIO
+
+import requests
+from django.conf import settings
+from PIL import Image, ImageDraw, ImageFont, features
+
+from . import metrics
+from .image_utils import EncodedImage
+
+# Unicode blocks of the Indic scripts we can be asked to render
+SCRIPT_RANGES = [
+    ('Devanagari', 0x0900, 0x097F),
+    ('Bengali', 0x0980, 0x09FF),
+    ('Gurmukhi', 0x0A00, 0x0A7F),
+    ('Gujarati', 0x0A80, 0x0AFF),
+    ('Oriya', 0x0B00, 0x0B7F),
+    ('Tamil', 0x0B80, 0x0BFF),
+    ('Telugu', 0x0C00, 0x0C7F),
+    ('Kannada', 0x0C80, 0x0CFF),
+    ('Malayalam', 0x0D00, 0x0D7F),
+]
+
+# Font files looked up in POSTER_FONT_DIRS, first match wins (bundled in core/fonts, or fonts-noto-core).
+# A script without a bold face is drawn with its regular one.
+SCRIPT_FONTS = {
+    'Latin': {
+        'regular': ['NotoSans-Regular.ttf', 'DejaVuSans.ttf'],
+        'bold': ['NotoSans-Bold.ttf', 'DejaVuSans-Bold.ttf'],
+    },
+}
+for _script, _start, _end in SCRIPT_RANGES:
+    SCRIPT_FONTS[_script] = {
+        'regular': [f'NotoSans{_script}-Regular.ttf', f'NotoSerif{_script}-Regular.ttf', f'NotoSerif{_script}-Regular.otf'],
+        'bold': [f'NotoSans{_script}-Bold.ttf', f'NotoSerif{_script}-Bold.ttf'],
+    }
+
+# Poster languages whose texts are drawn as the user typed them. Other languages
+# need the promotion and offer translated, which only the image model does (ai_text).
+COMPOSITE_LANGUAGES = {'english'}
+
+# "Call Now" in the poster languages offered by the form
+CALL_TO_ACTION = {
+    'english': "Call Now",
+    'hindi': "अभी कॉल करें",
+    'kannada': "ಈಗಲೇ ಕರೆ ಮಾಡಿ",
+}
+
+# Layout templates: boxes are fractions of the canvas (left, top, right, bottom),
+# size is the largest font size as a fraction of the canvas width
+LAYOUT_TEMPLATES = {
+    'classic': [
+        {'field': 'business_name', 'box': (0.05, 0.03, 0.95, 0.12), 'weight': 'bold', 'size': 0.075, 'style': 'panel'},
+        {'field': 'tagline', 'box': (0.10, 0.125, 0.90, 0.17), 'weight': 'regular', 'size': 0.035, 'style': 'shadow'},
+        {'field': 'promotion_name', 'box': (0.07, 0.34, 0.93, 0.52), 'weight': 'bold', 'size': 0.10, 'style': 'shadow'},
+        {'field': 'offer', 'box': (0.14, 0.54, 0.86, 0.66), 'weight': 'bold', 'size': 0.075, 'style': 'badge'},
+        {'field': 'call_to_action', 'box': (0.30, 0.69, 0.70, 0.75), 'weight': 'bold', 'size': 0.045, 'style': 'badge'},
+        {'field': 'contact', 'box': (0.04, 0.81, 0.96, 0.97), 'weight': 'regular', 'size': 0.036, 'style': 'panel'},
+    ],
+    'banner': [
+        {'field': 'business_name', 'box': (0.05, 0.04, 0.95, 0.13), 'weight': 'bold', 'size': 0.07, 'style': 'shadow'},
+        {'field': 'tagline', 'box': (0.10, 0.13, 0.90, 0.17), 'weight': 'regular', 'size': 0.033, 'style': 'shadow'},
+        {'field': 'promotion_name', 'box': (0.05, 0.58, 0.95, 0.70), 'weight': 'bold', 'size': 0.085, 'style': 'panel'},
+        {'field': 'offer', 'box': (0.05, 0.70, 0.95, 0.80), 'weight': 'bold', 'size': 0.07, 'style': 'panel'},
+        {'field': 'contact', 'box': (0.05, 0.80, 0.95, 0.91), 'weight': 'regular', 'size': 0.034, 'style': 'panel'},
+        {'field': 'call_to_action', 'box': (0.32, 0.92, 0.68, 0.97), 'weight': 'bold', 'size': 0.04, 'style': 'badge'},
+    ],
+}
+
+_background_lock = threading.Lock()
+_backgrounds = OrderedDict()
+
+
+def text_script(text):
+    """Script of the first Indic character in text, 'Latin' otherwise"""
+    for char in text or "":
+        code = ord(char)
+        for script, start, end in SCRIPT_RANGES:
+            if start <= code <= end:
+                return script
+    return 'Latin'
+
+
+@lru_cache(maxsize=None)
+def find_font_file(script, weight):
+    """Path of the first installed font for a script and weight, or None"""
+    for name in SCRIPT_FONTS.get(script, SCRIPT_FONTS['Latin'])[weight]:
+        for font_dir in settings.POSTER_FONT_DIRS:
+            path = os.path.join(font_dir, name)
+            if os.path.exists(path):
+                return path
+    if weight == 'bold':
+        return find_font_file(script, 'regular')
+    return None
+
+
+@lru_cache(maxsize=256)
+def get_font(script, weight, size):
+    path = find_font_file(script, weight)
+    if path is None:
+        return ImageFont.load_default(size)
+    # Indic scripts need Raqm for conjuncts and vowel signs; Latin is fine without it
+    layout_engine = ImageFont.Layout.RAQM if features.check('raqm') else ImageFont.Layout.BASIC
+    return ImageFont.truetype(path, size, layout_engine=layout_engine)
+
+
+def can_composite(texts, language=None):
+    """
+    Check that every text can be drawn correctly on this machine, in the poster language
+
+    Returns:
+        tuple: (bool, reason string when False)
+    """
+    language = (language or 'English').strip().lower()
+    if language not in COMPOSITE_LANGUAGES:
+        return False, f"{language.title()} posters need the promotion and offer translated"
+    for text in texts:
+        script = text_script(text)
+        if find_font_file(script, 'regular') is None:
+            return False, f"no {script} font installed"
+        if script != 'Latin' and not features.check('raqm'):
+            return False, f"{script} needs Pillow with libraqm for correct shaping"
+    return True, ""
+
+
+def build_poster_fields(business, promotion_name, final_offer, language):
+    """
+    Texts drawn on the poster; only details the business actually entered are shown
+
+    Args:
+        business: BusinessContext of the user
+        promotion_name: Name of the promotion
+        final_offer: Offer text
+        language: Poster language (picks the call-to-action label)
+
+    Returns:
+        dict: field name -> text, as used by LAYOUT_TEMPLATES
+    """
+    language = (language or 'English').strip().lower()
+    contact_lines = [
+        " • ".join(part for part in [business.phone, business.timing] if part),
+        business.location(default=""),
+    ]
+    return {
+        'business_name': business.business_name,
+        'tagline': business.business_type if business.description else "",
+        'promotion_name': promotion_name or "",
+        'offer': final_offer or "",
+        'call_to_action': CALL_TO_ACTION.get(language, CALL_TO_ACTION['english']),
+        'contact': "\n".join(line for line in contact_lines if line),
+    }
+
+
+def _wrap(draw, text, font, max_width):
+    """Greedy word wrap; explicit newlines are kept"""
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}".strip()
+            if not line or draw.textlength(candidate, font=font) <= max_width:
+                line = candidate
+            else:
+                lines.append(line)
+                line = word
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _fit_text(draw, text, script, weight, box, max_size):
+    """Largest font (down to 40% of max_size) whose wrapped text fits in the box"""
+    width, height = box[2] - box[0], box[3] - box[1]
+    size = max_size
+    min_size = max(10, int(max_size * 0.4))
+    while True:
+        font = get_font(script, weight, size)
+        wrapped = _wrap(draw, text, font, width)
+        left, top, right, bottom = draw.multiline_textbbox((0, 0), wrapped, font=font, align='center')
+        if (right - left <= width and bottom - top <= height) or size <= min_size:
+            return font, wrapped, (left, top, right, bottom)
+        size = max(min_size, int(size * 0.9))
+
+
+def _accent_color(image):
+    """Dominant colour of the background, saturated and darkened so white badge text stands out"""
+    r, g, b = image.resize((1, 1), Image.BILINEAR).getpixel((0, 0))[:3]
+    top = max(r, g, b) or 1
+    return tuple(min(255, int(channel * 130 / top)) for channel in (r, g, b))
+
+
+def _load_background_bytes(background):
+    """Encoded background from the local copy, downloading the Cloudinary copy if needed"""
+    if background.local_path and os.path.exists(background.local_path):
+        with open(background.local_path, 'rb') as f:
+            return f.read()
+    if not background.image_url:
+        return None
+    try:
+        response = requests.get(background.image_url, timeout=20)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        print(f"ERROR: Could not download poster background {background.image_url}: {e}")
+        return None
+    if background.local_path:
+        os.makedirs(os.path.dirname(background.local_path), exist_ok=True)
+        with open(background.local_path, 'wb') as f:
+            f.write(response.content)
+    return response.content
+
+
+def get_background_image(background):
+    """
+    Decoded background scaled to POSTER_COMPOSITE_WIDTH, kept in a small per-process LRU
+
+    Args:
+        background: PosterBackground
+
+    Returns:
+        PIL Image (shared, do not draw on it) or None if the image is unavailable
+    """
+    cache_id = (background.background_key, background.created_at)
+    with _background_lock:
+        image = _backgrounds.get(cache_id)
+        if image is not None:
+            _backgrounds.move_to_end(cache_id)
+            return image
+
+    data = _load_background_bytes(background)
+    if data is None:
+        return None
+    image = Image.open(BytesIO(data)).convert('RGB')
+    width = settings.POSTER_COMPOSITE_WIDTH
+    if image.width != width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+
+    with _background_lock:
+        _backgrounds[cache_id] = image
+        while len(_backgrounds) > settings.POSTER_BACKGROUND_MEMORY_CACHE:
+            _backgrounds.popitem(last=False)
+    return image
+
+
+def composite_poster(background_image, fields, layout='classic'):
+    """
+    Draw the poster texts over a background
+
+    Args:
+        background_image: PIL Image from get_background_image
+        fields: dict from build_poster_fields
+        layout: key of LAYOUT_TEMPLATES
+
+    Returns:
+        EncodedImage (JPEG)
+    """
+    started = time.monotonic()
+    canvas = background_image.convert('RGBA')
+    width, height = canvas.size
+    accent = _accent_color(background_image)
+    overlay = Image.new('RGBA', canvas.size, (0, 0, 0, 0))
+    overlay_draw = ImageDraw.Draw(overlay)
+    placements = []
+
+    for block in LAYOUT_TEMPLATES.get(layout, LAYOUT_TEMPLATES['classic']):
+        text = (fields.get(block['field']) or "").strip()
+        if not text:
+            continue
+        box = tuple(int(value * (width if i % 2 == 0 else height)) for i, value in enumerate(block['box']))
+        font, wrapped, bbox = _fit_text(
+            overlay_draw, text, text_script(text), block['weight'], box, int(block['size'] * width)
+        )
+        text_width, text_height = bbox[2] - bbox[0], bbox[3] - bbox[1]
+        x = box[0] + (box[2] - box[0] - text_width) // 2 - bbox[0]
+        y = box[1] + (box[3] - box[1] - text_height) // 2 - bbox[1]
+
+        padding = max(6, font.size // 3)
+        background_box = (x + bbox[0] - padding, y + bbox[1] - padding,
+                          x + bbox[2] + padding, y + bbox[3] + padding)
+        if block['style'] == 'panel':
+            overlay_draw.rounded_rectangle(background_box, radius=padding, fill=(0, 0, 0, 150))
+        elif block['style'] == 'badge':
+            overlay_draw.rounded_rectangle(background_box, radius=padding * 2, fill=accent + (235,))
+        placements.append((x, y, wrapped, font, block['style']))
+
+    canvas = Image.alpha_composite(canvas, overlay)
+    draw = ImageDraw.Draw(canvas)
+    for x, y, wrapped, font, style in placements:
+        stroke = 0 if style == 'panel' else max(1, font.size // 18)
+        draw.multiline_text(
+            (x, y), wrapped, font=font, fill=(255, 255, 255), align='center',
+            stroke_width=stroke, stroke_fill=(0, 0, 0)
+        )
+
+    buffer = BytesIO()
+    canvas.convert('RGB').save(buffer, format='JPEG', quality=90, optimize=False)
+    metrics.observe("poster_composite.render", time.monotonic() - started)
+    return EncodedImage(buffer.getvalue(), 'image/jpeg')
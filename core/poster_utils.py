@@ -0,0 +1,888 @@
+import asyncio
+import os
+import time
+import uuid
+import traceback
+from datetime import timedelta
+from functools import partial
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection
+from django.db.models import F, Q
+from django.utils import timezone
+# Gemini 3 Pro Image (Nano Banana) for better text rendering
+from google.genai import types
+
+from . import metrics
+from .models import PosterJob, PosterGeneration, UserHistory
+from .cloudinary_utils import upload_image_to_cloudinary
+from .genai_clients import get_genai_client, response_listener
+from .image_utils import EncodedImage
+from .imagen_utils import IMAGEN_MODEL_ID, generate_poster_imagen
+from .poster_cache import (
+    poster_cache_key, get_cached_poster, store_cached_poster,
+    background_cache_key, get_cached_background, store_cached_background
+)
+from .poster_compositor import build_poster_fields, can_composite, get_background_image, composite_poster
+from .rate_limit import is_rate_limit_error, acquire, penalize, backoff_delay
+from .sse_utils import format_sse
+
+# Gemini 3 Pro Image (Nano Banana Pro)
+POSTER_MODEL_ID = "gemini-3-pro-image-preview"
+
+
+def generate_poster_gemini_3(user_prompt):
+    """
+    Generates a poster using Gemini 3 Pro Image (Nano Banana).
+    This model handles TEXT and EMOTIONS much better than Imagen.
+
+    Args:
+        user_prompt: The detailed prompt for poster generation
+
+    Returns:
+        EncodedImage with the provider's raw bytes if successful, None otherwise
+    """
+    try:
+        # 1. Get the shared pooled client (different from Vertex AI)
+        if not settings.GOOGLE_API_KEY:
+            print("ERROR: GOOGLE_API_KEY not configured in settings.py")
+            return None
+
+        client = get_genai_client(settings.GOOGLE_API_KEY, provider="gemini-image")
+
+        # 2. Define the Model ID (This is Nano Banana Pro)
+        model_id = POSTER_MODEL_ID
+
+        # 3. Create a config to ensure high quality (simplified config)
+        config = types.GenerateContentConfig(
+            response_modalities=['IMAGE']  # Request an image back
+        )
+
+        print(f"DEBUG: Sending prompt to {model_id} (Nano Banana)...")
+
+        # 4. Generate content
+        response = client.models.generate_content(
+            model=model_id,
+            contents=[user_prompt],
+            config=config
+        )
+
+        print(f"DEBUG: Received response from Gemini 3 Pro Image")
+
+        # 5. Extract the Image - EXACT same logic as working test script
+        if hasattr(response, 'candidates') and response.candidates:
+            for candidate in response.candidates:
+                if hasattr(candidate, 'content') and candidate.content:
+                    content = candidate.content
+                    if hasattr(content, 'parts') and content.parts:
+                        for part in content.parts:
+                            if hasattr(part, 'inline_data') and part.inline_data:
+                                if hasattr(part.inline_data, 'data'):
+                                    # Data is already raw binary (not base64); keep it encoded
+                                    encoded = EncodedImage(
+                                        part.inline_data.data,
+                                        getattr(part.inline_data, 'mime_type', None)
+                                    )
+                                    print(f"DEBUG: Received {encoded.mime_type} image, {len(encoded)} bytes")
+                                    print(f"DEBUG: Image size: {encoded.size}")
+                                    return encoded
+
+        print("WARNING: No image found in Gemini 3 Pro response")
+        return None
+
+    except Exception as e:
+        if is_rate_limit_error(e):
+            # Let the caller back off / report the quota error instead of a generic failure
+            raise
+        print(f"ERROR: Gemini 3 Pro Image generation failed: {e}")
+        print(f"DEBUG: Full error traceback: {traceback.format_exc()}")
+        return None
+
+
+def build_poster_prompt(business, promotion_name, final_offer, language):
+    """
+    Build the poster prompt from the user's business details
+
+    Args:
+        business: BusinessContext of the user
+        promotion_name: Name of the promotion
+        final_offer: Offer text (already resolved from the "Other" option)
+        language: Poster language
+
+    Returns:
+        tuple: (prompt_text, input_data dict stored with the job and in UserHistory)
+    """
+    # Extract key business details for marketing
+    business_name = business.business_name
+    business_type = business.business_type
+
+    # Build location string from detailed fields
+    location = business.location()
+
+    # Add detailed address if available
+    if business.address:
+        location = f"{business.address}, {location}"
+
+    phone = business.get('phone', "Your Phone")
+    timing = business.get('timing', "9:00 AM - 8:00 PM")
+
+    prompt_text = f"""
+You are a creative director. Include emotional, atmospheric, and cultural details relevant to the promotion theme (e.g., festivals, seasons, etc). Keep the business details exact, but describe the visuals vividly.
+Create a professional and eye-catching marketing poster for the business "{business_name}" to boost customer engagement and promote its latest offer.
+
+BUSINESS INFO:
+- Business Name: {business_name}
+- Business Type: {business_type}
+- Location: {location}
+- Phone: {phone}
+- Timing: {timing}
+
+PROMOTION:
+- Promotion Name: {promotion_name}
+- Main Offer: {final_offer}
+- Language: {language}
+
+DESIGN GUIDELINES:
+- Format optimized for Instagram and WhatsApp sharing
+- Display the business name clearly at the top
+- **MANDATORY: Include 2-3 keywords or service names related to {business_type} (e.g., "Hair • Makeup • Spa" or "Bridal Services • Facials • Styling") prominently on the poster**
+- Highlight the promotion name and main offer with bold and attractive fonts
+- Use colors and typography that match the business theme
+- **CRITICAL: Use ONLY cartoon/animated/illustrated style visuals. DO NOT generate realistic human photographs or images.**
+- Include relevant cartoon/animated visuals or illustrations:
+  - If {business_type} is "salon" or "beauty parlour", use cartoon/animated illustrations of beauty tools, cosmetics, or stylized beauty elements (combs, scissors, lipstick, mirrors, etc.)
+  - Otherwise, use cartoon/animated icons/illustrations that match the business type (e.g., cartoon tools, tech icons, food illustrations)
+  - **Absolutely NO realistic human faces or photographs - only cartoon/animated style**
+- Keep the layout clean and easy to read on mobile
+- Add marketing elements like badges, stickers, or call-to-action text (e.g., "Call Now", "Limited Offer", "Visit Today")
+- Ensure the design remains professional, family-friendly, and suitable for public social media marketing.
+
+POSTER GOAL:
+- Should look modern, polished, and shareable
+- Designed to attract attention and drive real engagement on social media
+- Must clearly communicate what services the business provides through keywords
+"""
+    input_data = {
+        'promotion_name': promotion_name,
+        'offer_type': final_offer,
+        'language': language,
+        'business_name': business_name,
+        'business_type': business_type,
+        'location': location,
+        'phone': phone,
+        'timing': timing
+    }
+    return prompt_text, input_data
+
+
+def build_background_prompt(business_type, theme):
+    """
+    Prompt for a text-free poster background, shared by every offer of a theme
+
+    The business details, promotion and offer are drawn over it locally
+    (see core.poster_compositor), so the model must not render any text.
+    """
+    return f"""
+You are a creative director. Paint the BACKGROUND ARTWORK for a marketing poster; all text will be added later by a designer.
+
+THEME: {theme}
+BUSINESS TYPE: {business_type}
+
+DESIGN GUIDELINES:
+- Portrait format (3:4) optimized for Instagram and WhatsApp sharing
+- Include emotional, atmospheric, and cultural details relevant to the theme (e.g., festivals, seasons, etc)
+- **CRITICAL: Do NOT include any text, letters, numbers, logos, signatures or watermarks anywhere in the image.**
+- **CRITICAL: Use ONLY cartoon/animated/illustrated style visuals. DO NOT generate realistic human photographs or images.**
+- Use cartoon/animated illustrations that match the business type (e.g., beauty tools and cosmetics for a salon or beauty parlour)
+- Keep the top 18% and the bottom 22% of the image calm and uncluttered, and leave a clear area in the middle, so text stays readable
+- Colors should be rich and festive, but not so busy that white text becomes hard to read
+- Family-friendly and suitable for public social media marketing
+"""
+
+
+def queue_poster_job(user, business, promotion_name, final_offer, language, regenerate=False, campaign_id=None,
+                     render_mode=None, defer_render=False):
+    """
+    Create a PosterJob for the run_poster_worker command
+
+    An identical earlier request (same prompt, model and language) is served
+    from the poster cache and the job is returned already 'done', unless
+    regenerate=True. In "composite" render mode the texts are drawn locally
+    over a cached background, so a known theme is rendered right away too,
+    unless defer_render=True leaves that to the worker (callers without
+    Cloudinary credentials, e.g. the festival drafts cron).
+    """
+    if render_mode is None:
+        render_mode = settings.POSTER_DEFAULT_RENDER_MODE
+    prompt_text, input_data = build_poster_prompt(business, promotion_name, final_offer, language)
+    prompt_built = _stage_entry("prompt_built")
+
+    if render_mode == "composite":
+        fields = build_poster_fields(business, promotion_name, final_offer, language)
+        can_render, reason = can_composite(fields.values(), language)
+        if can_render:
+            input_data['poster_fields'] = fields
+            return _queue_composite_job(user, promotion_name, final_offer, language, input_data, prompt_built,
+                                        regenerate=regenerate, campaign_id=campaign_id,
+                                        defer_render=defer_render)
+        print(f"DEBUG: Falling back to AI-rendered text: {reason}")
+
+    cache_key = poster_cache_key(prompt_text, POSTER_MODEL_ID, language)
+    job = PosterJob.objects.create(
+        user=user,
+        promotion_name=promotion_name,
+        offer_type=final_offer,
+        language=language or "",
+        input_data=input_data,
+        prompt_text=prompt_text,
+        cache_key=cache_key,
+        regenerate=regenerate,
+        campaign_id=campaign_id,
+        stage_log=[prompt_built, _stage_entry("queued")]
+    )
+
+    if not regenerate:
+        cached = get_cached_poster(cache_key)
+        if cached:
+            print(f"DEBUG: Poster cache hit for job {job.id}")
+            record_poster_result(job, cached.poster_url, cached.public_id, cache_hit=True)
+            _finish_job(job, "done", poster_url=cached.poster_url)
+    return job
+
+
+def _queue_composite_job(user, promotion_name, final_offer, language, input_data, prompt_built,
+                         regenerate=False, campaign_id=None, defer_render=False):
+    """Queue a composite job, rendering it immediately when its background is already cached"""
+    job = PosterJob.objects.create(
+        user=user,
+        promotion_name=promotion_name,
+        offer_type=final_offer,
+        language=language or "",
+        input_data=input_data,
+        prompt_text=build_background_prompt(input_data['business_type'], promotion_name),
+        render_mode="composite",
+        regenerate=regenerate,
+        campaign_id=campaign_id,
+        stage_log=[prompt_built, _stage_entry("queued")]
+    )
+
+    # Campaign variants are composited in parallel by the worker instead
+    if not regenerate and campaign_id is None and not defer_render:
+        background = get_cached_background(_background_key(job))
+        if background:
+            print(f"DEBUG: Background cache hit for job {job.id}, rendering locally")
+            _render_composite(job, background)
+    return job
+
+
+def queue_poster_campaign(user, business, promotion_name, languages, offers, regenerate=False, render_mode=None):
+    """
+    Queue one job per (language, offer) combination under a shared campaign ID
+
+    The worker claims the whole campaign at once and fans the model calls
+    out with POSTER_CAMPAIGN_CONCURRENCY parallel slots (see run_poster_campaign).
+
+    Returns:
+        tuple: (campaign_id, list of PosterJob)
+    """
+    campaign_id = uuid.uuid4()
+    jobs = [
+        queue_poster_job(user, business, promotion_name, offer, language,
+                         regenerate=regenerate, campaign_id=campaign_id, render_mode=render_mode)
+        for language in languages
+        for offer in offers
+    ]
+    return campaign_id, jobs
+
+
+def claim_next_poster_job():
+    """
+    Atomically move the oldest queued job to 'running'
+
+    The conditional UPDATE only succeeds for one worker, so several worker
+    processes can share the queue without SELECT ... FOR UPDATE support
+    (which SQLite lacks).
+
+    Returns:
+        PosterJob or None if the queue is empty
+    """
+    candidate_ids = PosterJob.objects.filter(status="queued").order_by("created_at").values_list("id", flat=True)[:10]
+    for job_id in candidate_ids:
+        claimed = PosterJob.objects.filter(pk=job_id, status="queued").update(
+            status="running",
+            started_at=timezone.now(),
+            attempts=F("attempts") + 1
+        )
+        if claimed:
+            return PosterJob.objects.select_related("user").get(pk=job_id)
+    return None
+
+
+def claim_campaign_jobs(campaign_id):
+    """
+    Claim every still-queued job of a campaign (see claim_next_poster_job)
+
+    started_at stays empty until a campaign pool slot actually starts the job
+    (process_poster_job), so time spent waiting for a slot neither counts as
+    generation time nor makes the job look stale.
+    """
+    job_ids = list(PosterJob.objects.filter(campaign_id=campaign_id, status="queued").values_list("id", flat=True))
+    claimed_ids = [
+        job_id for job_id in job_ids
+        if PosterJob.objects.filter(pk=job_id, status="queued").update(
+            status="running",
+            attempts=F("attempts") + 1
+        )
+    ]
+    return list(PosterJob.objects.select_related("user").filter(id__in=claimed_ids))
+
+
+def requeue_stale_poster_jobs(max_age_seconds=None):
+    """
+    Put 'running' jobs left behind by a crashed worker back on the queue
+
+    Claimed campaign jobs that never started only count as stale once no job
+    of their campaign started or finished within the cutoff, i.e. once the
+    campaign pool that claimed them is gone.
+    """
+    if max_age_seconds is None:
+        max_age_seconds = settings.POSTER_JOB_STALE_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    requeued = PosterJob.objects.filter(status="running", started_at__lt=cutoff).update(status="queued")
+    active_campaigns = PosterJob.objects.filter(
+        Q(started_at__gte=cutoff) | Q(finished_at__gte=cutoff),
+        campaign_id__isnull=False
+    ).values("campaign_id")
+    requeued += PosterJob.objects.filter(
+        status="running", started_at__isnull=True, campaign_id__isnull=False
+    ).exclude(campaign_id__in=active_campaigns).update(status="queued")
+    return requeued
+
+
+def _finish_job(job, status, poster_url="", error=""):
+    job.status = status
+    job.poster_url = poster_url
+    job.error = error
+    job.finished_at = timezone.now()
+    if job.started_at is None:
+        # Served from the cache without ever being claimed
+        job.started_at = job.finished_at
+    job.save(update_fields=["status", "poster_url", "error", "started_at", "finished_at"])
+
+
+def _stage_entry(stage, detail=""):
+    return {'stage': stage, 'at': time.time(), 'detail': detail}
+
+
+_stage_lock = threading.Lock()
+
+
+def set_job_stage(job, stage, detail=""):
+    """
+    Record that a job reached a pipeline stage (streamed by poster_job_events)
+
+    Safe to call from provider threads; a failed write is logged and ignored
+    so progress reporting can never fail the poster itself.
+    """
+    with _stage_lock:
+        job.stage = stage
+        job.stage_log = list(job.stage_log) + [_stage_entry(stage, detail)]
+        try:
+            PosterJob.objects.filter(pk=job.pk).update(stage=stage, stage_log=job.stage_log)
+        except DatabaseError as e:
+            print(f"ERROR: Could not record stage {stage} for poster job {job.pk}: {e}")
+
+
+# Provider chain, in order of preference: (metrics name, model id, rate limit bucket, generate function)
+POSTER_PROVIDERS = [
+    ("poster_provider.gemini", POSTER_MODEL_ID, "gemini-image", generate_poster_gemini_3),
+    ("poster_provider.imagen", IMAGEN_MODEL_ID, "imagen", generate_poster_imagen),
+]
+
+_provider_pool = None
+_provider_pool_lock = threading.Lock()
+
+
+def _get_provider_pool():
+    """Shared pool for provider calls, so a hedged request never waits for a free thread"""
+    global _provider_pool
+    with _provider_pool_lock:
+        if _provider_pool is None:
+            _provider_pool = ThreadPoolExecutor(
+                max_workers=settings.POSTER_PROVIDER_POOL_SIZE,
+                thread_name_prefix='poster-provider'
+            )
+        return _provider_pool
+
+
+def _call_provider(name, bucket, generate, prompt_text, on_response=None):
+    """
+    Run one provider under its rate limit bucket and record its latency and outcome
+
+    on_response, if given, is called with the provider label when the first
+    HTTP response of the call arrives (google.genai providers only).
+    """
+    acquire(bucket)
+    started = time.monotonic()
+    ok = False
+    listener_token = None
+    if on_response is not None:
+        # Provider threads are long-lived: drop a database connection that went stale meanwhile
+        close_old_connections()
+        listener_token = response_listener.set(on_response)
+    try:
+        encoded = generate(prompt_text)
+        ok = encoded is not None
+        return encoded
+    except Exception as e:
+        if is_rate_limit_error(e):
+            # Make every process on this node back off, not only this call
+            penalize(bucket, settings.POSTER_RETRY_BASE_DELAY)
+        raise
+    finally:
+        if listener_token is not None:
+            response_listener.reset(listener_token)
+        metrics.observe(name, time.monotonic() - started, ok=ok)
+
+
+def hedge_delay(name):
+    """
+    Seconds to wait for a provider before hedging with the next one
+
+    Uses the observed POSTER_HEDGE_PERCENTILE latency once enough successful
+    samples exist, POSTER_HEDGE_DEFAULT_DELAY before that.
+    """
+    delay = None
+    if metrics.sample_count(name) >= settings.POSTER_HEDGE_MIN_SAMPLES:
+        delay = metrics.percentile(name, settings.POSTER_HEDGE_PERCENTILE)
+    if delay is None:
+        delay = settings.POSTER_HEDGE_DEFAULT_DELAY
+    return min(max(delay, settings.POSTER_HEDGE_MIN_DELAY), settings.POSTER_HEDGE_MAX_DELAY)
+
+
+def generate_poster_image(prompt_text, on_stage=None):
+    """
+    Generate a poster through the provider chain with a hedged request
+
+    Gemini 3 Pro Image is asked first. If it has not answered within its
+    observed p95 latency (see hedge_delay), Imagen is asked as well and the
+    first usable image wins; the other request is cancelled if it has not
+    started yet, otherwise its result is discarded. If Gemini fails or returns
+    no image, Imagen is used as a plain fallback.
+
+    Args:
+        prompt_text: Full poster prompt
+        on_stage: Optional callback(stage, detail) for the provider_started,
+                  first_byte and image_received stages
+
+    Returns:
+        tuple: (EncodedImage or None, model id of the provider that produced it)
+
+    Raises:
+        The quota error, if every provider was rate limited
+    """
+    pool = _get_provider_pool()
+    pending = {}
+    rate_limit_error = None
+    providers = list(POSTER_PROVIDERS)
+    hedged = False
+    first_byte = threading.Event()
+
+    def report(stage, detail):
+        if on_stage is not None:
+            on_stage(stage, detail)
+
+    def on_response(provider):
+        # Only the first response of the first provider to answer counts
+        if not first_byte.is_set():
+            first_byte.set()
+            report("first_byte", provider)
+
+    def launch_next():
+        name, model_id, bucket, generate = providers.pop(0)
+        print(f"DEBUG: Requesting poster from {model_id}")
+        report("provider_started", model_id)
+        future = pool.submit(_call_provider, name, bucket, generate, prompt_text,
+                             on_response if on_stage is not None else None)
+        pending[future] = (name, model_id)
+
+    launch_next()
+    while pending:
+        timeout = None
+        if providers:
+            primary_name = next(iter(pending.values()))[0]
+            timeout = hedge_delay(primary_name)
+
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            # Primary is slower than usual: hedge with the next provider
+            print(f"DEBUG: No poster after {timeout:.1f}s, sending hedged request")
+            metrics.incr("poster_provider.hedged")
+            hedged = True
+            launch_next()
+            continue
+
+        for future in done:
+            name, model_id = pending.pop(future)
+            try:
+                encoded = future.result()
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                rate_limit_error = e
+                encoded = None
+
+            if encoded is not None:
+                for loser in pending:
+                    loser.cancel()
+                if hedged:
+                    metrics.incr(f"{name}.hedge_won")
+                report("image_received", model_id)
+                return encoded, model_id
+
+        if not pending and providers:
+            # Every request so far failed: fall back to the next provider
+            metrics.incr("poster_provider.fallback")
+            launch_next()
+
+    if rate_limit_error is not None:
+        raise rate_limit_error
+    return None, None
+
+
+def generate_with_backoff(prompt_text, max_retries=None, base_delay=None, on_stage=None):
+    """
+    Call generate_poster_image, backing off exponentially on quota errors
+
+    Only the calling slot sleeps, so one throttled poster does not fail the
+    rest of a campaign. Re-raises the quota error once retries are exhausted.
+    """
+    if max_retries is None:
+        max_retries = settings.POSTER_MAX_RETRIES
+    if base_delay is None:
+        base_delay = settings.POSTER_RETRY_BASE_DELAY
+
+    attempt = 0
+    while True:
+        try:
+            return generate_poster_image(prompt_text, on_stage=on_stage)
+        except Exception as e:
+            if not is_rate_limit_error(e) or attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt, base_delay)
+            print(f"DEBUG: Rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+            attempt += 1
+
+
+def record_poster_result(job, poster_url, public_id="", cache_hit=False):
+    """Create the PosterGeneration and UserHistory rows for a finished poster"""
+    PosterGeneration.objects.create(
+        user=job.user,
+        promotion_name=job.promotion_name,
+        offer_type=job.offer_type,
+        poster_url=poster_url,
+        public_id=public_id,
+        campaign_id=job.campaign_id
+    )
+    input_data = dict(job.input_data)
+    if cache_hit:
+        input_data['cache_hit'] = True
+    UserHistory.objects.create(
+        user=job.user,
+        action_type='poster_generation',
+        input_data=input_data,
+        output_data=poster_url,
+        public_id=public_id,
+        prompt_used=job.prompt_text
+    )
+    set_job_stage(job, "recorded", "cache hit" if cache_hit else "")
+
+
+def _store_and_record(job, encoded, model_id=None):
+    """
+    Save a finished poster locally, upload it to Cloudinary and record it
+
+    Args:
+        job: PosterJob being processed
+        encoded: EncodedImage of the final poster
+        model_id: Model that produced the image; stored in the poster cache when given
+    """
+    user = job.user
+    # Save the bytes locally as-is (no decode / PNG re-encode)
+    filename = f"{uuid.uuid4()}.{encoded.extension}"
+    save_path = os.path.join(settings.MEDIA_ROOT, filename)
+    encoded.write_to(save_path)
+    print(f"DEBUG: Image saved to {save_path}")
+
+    # Upload the same buffer to Cloudinary
+    cloudinary_result = upload_image_to_cloudinary(
+        encoded.view,
+        folder="posters",
+        public_id=f"poster_{user.username}_{uuid.uuid4().hex[:8]}",
+        filename=filename
+    )
+
+    if cloudinary_result['success']:
+        poster_url = cloudinary_result['url']
+        print(f"DEBUG: Cloudinary URL = {poster_url}")
+        set_job_stage(job, "uploaded")
+        public_id = cloudinary_result['public_id']
+        record_poster_result(job, poster_url, public_id)
+        if job.cache_key and model_id:
+            store_cached_poster(job.cache_key, model_id, job.language, poster_url, public_id)
+        _finish_job(job, "done", poster_url=poster_url)
+    else:
+        print(f"DEBUG: Cloudinary upload failed: {cloudinary_result['error']}")
+        # Fallback to local storage (not cached: the file only exists on this machine)
+        poster_url = settings.MEDIA_URL + filename
+        PosterGeneration.objects.create(
+            user=user,
+            promotion_name=job.promotion_name,
+            offer_type=job.offer_type,
+            poster_url=poster_url
+        )
+        set_job_stage(job, "recorded", "local storage")
+        _finish_job(job, "done", poster_url=poster_url,
+                    error="Poster generated but Cloudinary upload failed. Using local storage.")
+
+
+def _background_key(job):
+    return background_cache_key(job.input_data.get('business_type', ""), job.promotion_name, POSTER_MODEL_ID)
+
+
+_background_locks = {}
+_background_locks_guard = threading.Lock()
+
+
+def _background_lock(key):
+    """Per-background lock so parallel campaign jobs generate a shared background only once"""
+    with _background_locks_guard:
+        return _background_locks.setdefault(key, threading.Lock())
+
+
+def _render_composite(job, background):
+    """
+    Draw the job's texts over a cached background and store the result
+
+    Returns:
+        bool: False if the background image could not be loaded
+    """
+    image = get_background_image(background)
+    if image is None:
+        return False
+    set_job_stage(job, "compositing")
+    encoded = composite_poster(image, job.input_data['poster_fields'], layout=settings.POSTER_COMPOSITE_LAYOUT)
+    _store_and_record(job, encoded)
+    return True
+
+
+def _generate_background(job, key):
+    """Generate, store and cache a text-free background for a composite job"""
+    encoded, model_id = generate_with_backoff(job.prompt_text, on_stage=partial(set_job_stage, job))
+    if not encoded:
+        return None
+
+    background_dir = os.path.join(settings.MEDIA_ROOT, "poster_backgrounds")
+    os.makedirs(background_dir, exist_ok=True)
+    local_path = os.path.join(background_dir, f"{key}.{encoded.extension}")
+    encoded.write_to(local_path)
+
+    # Cloudinary copy so other machines can composite over the same background
+    upload = upload_image_to_cloudinary(
+        encoded.view,
+        folder="poster_backgrounds",
+        public_id=f"background_{key[:16]}",
+        filename=os.path.basename(local_path)
+    )
+    return store_cached_background(
+        key, job.input_data.get('business_type', ""), job.promotion_name, model_id, local_path,
+        image_url=upload.get('url', "") if upload['success'] else "",
+        public_id=upload.get('public_id', "") if upload['success'] else ""
+    )
+
+
+def _process_composite_job(job):
+    key = _background_key(job)
+    with _background_lock(key):
+        background = get_cached_background(key)
+        if background and job.regenerate and background.created_at < job.created_at:
+            # Fresh design requested (another variant of the same campaign may already have made it)
+            background = None
+        if background is None or get_background_image(background) is None:
+            print(f"DEBUG: Poster job {job.id} - generating background for theme '{job.promotion_name}'")
+            background = _generate_background(job, key)
+
+    if background is None or not _render_composite(job, background):
+        print(f"DEBUG: No provider generated a background for job {job.id}")
+        _finish_job(job, "failed", error="Image could not be generated (it may have been blocked by safety filters).")
+
+
+def process_poster_job(job):
+    """
+    Run the full poster pipeline for a claimed job: generate, store, upload, record
+
+    Args:
+        job: PosterJob in 'running' state
+
+    Returns:
+        PosterJob: the same job, now 'done' or 'failed'
+    """
+    # Campaign jobs wait for a pool slot after being claimed; time the job from here
+    job.started_at = timezone.now()
+    PosterJob.objects.filter(pk=job.pk).update(started_at=job.started_at)
+    try:
+        set_job_stage(job, "started")
+        if job.render_mode == "composite":
+            _process_composite_job(job)
+            return job
+
+        # An identical job may have finished while this one was queued
+        if job.cache_key and not job.regenerate:
+            cached = get_cached_poster(job.cache_key)
+            if cached:
+                print(f"DEBUG: Poster cache hit for job {job.id}")
+                record_poster_result(job, cached.poster_url, cached.public_id, cache_hit=True)
+                _finish_job(job, "done", poster_url=cached.poster_url)
+                return job
+
+        print(f"DEBUG: Poster job {job.id} - generating image (Gemini 3 Pro Image, Imagen hedge)")
+        encoded, model_id = generate_with_backoff(job.prompt_text, on_stage=partial(set_job_stage, job))
+
+        if not encoded:
+            print(f"DEBUG: No provider generated an image for job {job.id}")
+            _finish_job(job, "failed", error="Image could not be generated (it may have been blocked by safety filters).")
+            return job
+
+        _store_and_record(job, encoded, model_id)
+
+    except Exception as e:
+        if is_rate_limit_error(e):
+            print(f"Quota Error: {e}")
+            _finish_job(job, "failed", error="🚦 Too many requests! Please wait a minute and try again.")
+            return job
+        print(f"General Error: {e}")
+        print(f"DEBUG: Full traceback: {traceback.format_exc()}")
+        _finish_job(job, "failed", error=f"An unexpected error occurred: {e}")
+    return job
+
+
+def run_poster_campaign(jobs, concurrency=None):
+    """
+    Generate all claimed jobs of a campaign in parallel
+
+    Args:
+        jobs: PosterJob list in 'running' state
+        concurrency: Max parallel model calls, defaults to POSTER_CAMPAIGN_CONCURRENCY
+
+    Returns:
+        list: the finished jobs
+    """
+    if concurrency is None:
+        concurrency = settings.POSTER_CAMPAIGN_CONCURRENCY
+
+    def run_slot(job):
+        try:
+            return process_poster_job(job)
+        finally:
+            # The pool is discarded after the campaign, so close this thread's connection
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix='poster-campaign') as pool:
+        return list(pool.map(run_slot, jobs))
+
+
+def campaign_summary(campaign_id, user):
+    """
+    Status of every job in a campaign plus wall-clock vs serial timing
+
+    Returns:
+        dict or None if the campaign does not belong to the user
+    """
+    jobs = list(PosterJob.objects.filter(campaign_id=campaign_id, user=user).order_by("id"))
+    if not jobs:
+        return None
+
+    finished = [job for job in jobs if job.finished_at and job.started_at]
+    serial_seconds = sum((job.finished_at - job.started_at).total_seconds() for job in finished)
+    wall_clock_seconds = 0.0
+    if finished:
+        wall_clock_seconds = (
+            max(job.finished_at for job in finished) - min(job.started_at for job in finished)
+        ).total_seconds()
+
+    return {
+        'campaign_id': str(campaign_id),
+        'status': 'done' if all(job.is_finished for job in jobs) else 'running',
+        'total': len(jobs),
+        'completed': sum(1 for job in jobs if job.status == 'done'),
+        'failed': sum(1 for job in jobs if job.status == 'failed'),
+        'wall_clock_seconds': round(wall_clock_seconds, 2),
+        'serial_seconds': round(serial_seconds, 2),
+        'speedup': round(serial_seconds / wall_clock_seconds, 2) if wall_clock_seconds else None,
+        'jobs': [
+            {
+                'job_id': job.id,
+                'language': job.language,
+                'offer_type': job.offer_type,
+                'status': job.status,
+                'poster_url': job.poster_url,
+                'error': job.error,
+            }
+            for job in jobs
+        ],
+    }
+
+
+async def poster_job_events(job_id, user, last_event_id=0):
+    """
+    Server-sent events for one poster job, until it is done or failed
+
+    Emits a 'stage' event (id = position in PosterJob.stage_log) for every
+    stage after last_event_id, then a final 'done' or 'failed' event. The job
+    row is re-read every POSTER_EVENTS_POLL_INTERVAL seconds with the async
+    ORM, so a waiting stream does not hold a thread. After
+    POSTER_EVENTS_MAX_SECONDS the stream ends and the browser's EventSource
+    reconnects with Last-Event-ID.
+
+    Args:
+        job_id: PosterJob id
+        user: Owner of the job
+        last_event_id: Stages the client has already seen
+
+    Yields:
+        str: formatted events
+    """
+    labels = dict(PosterJob.STAGE_CHOICES)
+    loop = asyncio.get_running_loop()
+    started = last_sent = loop.time()
+    sent = last_event_id
+    yield "retry: 2000\n\n"
+
+    while True:
+        job = await PosterJob.objects.filter(id=job_id, user=user).values(
+            'status', 'stage_log', 'poster_url', 'error'
+        ).afirst()
+        if job is None:
+            yield format_sse('failed', {'error': 'Poster job not found.'})
+            return
+
+        for index, entry in enumerate(job['stage_log'][sent:], start=sent + 1):
+            yield format_sse('stage', dict(entry, label=labels.get(entry['stage'], entry['stage'])), event_id=index)
+            last_sent = loop.time()
+        sent = max(sent, len(job['stage_log']))
+
+        if job['status'] in ('done', 'failed'):
+            yield format_sse(job['status'], {'poster_url': job['poster_url'], 'error': job['error']})
+            return
+
+        now = loop.time()
+        if now - started >= settings.POSTER_EVENTS_MAX_SECONDS:
+            return
+        if now - last_sent >= settings.POSTER_EVENTS_KEEPALIVE_SECONDS:
+            # Comment line, keeps proxies from closing an idle connection
+            yield ": keepalive\n\n"
+            last_sent = now
+        await asyncio.sleep(settings.POSTER_EVENTS_POLL_INTERVAL)
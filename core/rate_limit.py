@@ -0,0 +1,249 @@
+"""
+Token-bucket rate limiting for the AI providers, shared by all processes on a node
+
+Each bucket (provider / model) keeps its state in a small JSON file under
+AI_RATE_LIMIT_DIR, updated under an exclusive fcntl lock, so the gunicorn
+workers and the poster worker draw from the same budget. Where fcntl is not
+available (Windows) the state is kept per process behind a thread lock.
+"""
+import json
+import os
+import random
+import threading
+import time
+
+import google.api_core.exceptions
+from django.conf import settings
+
+from . import metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+_local_lock = threading.Lock()
+_local_state = {}
+
+
+class RateLimitExceeded(Exception):
+    """No capacity within the allowed wait, or too many callers already queued"""
+    code = 429
+
+
+def is_rate_limit_error(error):
+    """True for quota errors from google.api_core or google.genai (HTTP 429), and our own limiter"""
+    if isinstance(error, google.api_core.exceptions.ResourceExhausted):
+        return True
+    return getattr(error, 'code', None) == 429 or getattr(error, 'status_code', None) == 429
+
+
+def bucket_config(bucket):
+    """(tokens per second, burst size) of a bucket from AI_RATE_LIMITS"""
+    config = settings.AI_RATE_LIMITS.get(bucket, settings.AI_RATE_LIMITS['default'])
+    return max(config['per_minute'], 1) / 60.0, max(config['burst'], 1)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class _BucketState:
+    """Read-modify-write access to one bucket's state, locked across processes"""
+
+    def __init__(self, bucket):
+        self.bucket = bucket
+        self.path = os.path.join(settings.AI_RATE_LIMIT_DIR, f"{bucket}.json")
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is None:
+            _local_lock.acquire()
+            self.state = _local_state.setdefault(self.bucket, {})
+            return self
+
+        os.makedirs(settings.AI_RATE_LIMIT_DIR, exist_ok=True)
+        self._file = open(self.path, 'a+')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        self._file.seek(0)
+        try:
+            self.state = json.loads(self._file.read() or '{}')
+        except ValueError:
+            self.state = {}
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl is None:
+            _local_lock.release()
+            return False
+        try:
+            self._file.seek(0)
+            self._file.truncate()
+            self._file.write(json.dumps(self.state))
+            self._file.flush()
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+        return False
+
+    def refill(self, now):
+        """Add the tokens earned since the last update; returns seconds until the next token"""
+        rate, burst = bucket_config(self.bucket)
+        tokens = self.state.get('tokens', burst)
+        updated = self.state.get('updated', now)
+        if updated > now:
+            # Penalized after a provider 429: nothing refills until then
+            self.state['tokens'] = tokens
+            return (updated - now) + (1 - tokens) / rate
+        self.state['tokens'] = min(burst, tokens + (now - updated) * rate)
+        self.state['updated'] = now
+        return max(0.0, 1 - self.state['tokens']) / rate
+
+    def waiters(self):
+        """Callers queued on this bucket, per pid (entries of dead processes are dropped)"""
+        waiting = {
+            pid: count for pid, count in self.state.get('waiting', {}).items()
+            if count > 0 and _pid_alive(int(pid))
+        }
+        self.state['waiting'] = waiting
+        return waiting
+
+    def add_waiter(self, delta):
+        waiting = self.waiters()
+        pid = str(os.getpid())
+        waiting[pid] = waiting.get(pid, 0) + delta
+        if waiting[pid] <= 0:
+            del waiting[pid]
+
+
+def acquire(bucket, max_wait=None):
+    """
+    Take one token from a bucket, waiting for capacity if needed
+
+    Args:
+        bucket: Bucket name, e.g. "gemini-image" (see AI_RATE_LIMITS)
+        max_wait: Longest time to wait in seconds (default AI_RATE_LIMIT_MAX_WAIT)
+
+    Returns:
+        float: seconds spent waiting
+
+    Raises:
+        RateLimitExceeded: if AI_RATE_LIMIT_MAX_QUEUE callers are already waiting,
+                           or no token became available within max_wait
+    """
+    if max_wait is None:
+        max_wait = settings.AI_RATE_LIMIT_MAX_WAIT
+    started = time.time()
+    queued = False
+    try:
+        while True:
+            with _BucketState(bucket) as bucket_state:
+                now = time.time()
+                needed = bucket_state.refill(now)
+                if needed == 0:
+                    bucket_state.state['tokens'] -= 1
+                    if queued:
+                        bucket_state.add_waiter(-1)
+                        queued = False
+                    waited = now - started
+                    metrics.observe(f"rate_limit.{bucket}.wait", waited)
+                    return waited
+
+                if not queued:
+                    depth = sum(bucket_state.waiters().values())
+                    if depth >= settings.AI_RATE_LIMIT_MAX_QUEUE:
+                        metrics.incr(f"rate_limit.{bucket}.rejected")
+                        raise RateLimitExceeded(f"Too many requests queued for {bucket}")
+                    bucket_state.add_waiter(1)
+                    queued = True
+                    metrics.incr(f"rate_limit.{bucket}.queued")
+
+            elapsed = time.time() - started
+            if elapsed + needed > max_wait:
+                metrics.incr(f"rate_limit.{bucket}.timeout")
+                raise RateLimitExceeded(f"No {bucket} capacity within {max_wait:.0f}s")
+            # Jitter so queued callers do not all wake up for the same token
+            time.sleep(needed * random.uniform(1.0, 1.3))
+    finally:
+        if queued:
+            with _BucketState(bucket) as bucket_state:
+                bucket_state.add_waiter(-1)
+
+
+def penalize(bucket, seconds):
+    """
+    Empty a bucket after the provider itself returned a quota error
+
+    Pushes the refill point into the future so every process backs off,
+    not only the caller that saw the 429.
+    """
+    with _BucketState(bucket) as bucket_state:
+        now = time.time()
+        bucket_state.refill(now)
+        bucket_state.state['tokens'] = 0
+        bucket_state.state['updated'] = max(bucket_state.state['updated'], now + seconds)
+    metrics.incr(f"rate_limit.{bucket}.throttled")
+
+
+def backoff_delay(attempt, base_delay):
+    """Jittered exponential backoff: base_delay * 2^attempt, +/- 50%"""
+    return base_delay * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+def call_with_rate_limit(bucket, func, *args, max_retries=None, base_delay=None, max_wait=None, **kwargs):
+    """
+    Call a provider function under its bucket, retrying quota errors with backoff
+
+    Args:
+        bucket: Bucket name (see AI_RATE_LIMITS)
+        func: Provider call, invoked as func(*args, **kwargs)
+        max_retries: Retries after a quota error (default AI_RATE_LIMIT_MAX_RETRIES)
+        base_delay: First backoff delay in seconds (default AI_RATE_LIMIT_BASE_DELAY)
+        max_wait: Longest wait for a token per attempt (default AI_RATE_LIMIT_MAX_WAIT)
+
+    Returns:
+        Whatever func returns
+
+    Raises:
+        The quota error (or RateLimitExceeded) once retries are exhausted
+    """
+    if max_retries is None:
+        max_retries = settings.AI_RATE_LIMIT_MAX_RETRIES
+    if base_delay is None:
+        base_delay = settings.AI_RATE_LIMIT_BASE_DELAY
+
+    attempt = 0
+    while True:
+        acquire(bucket, max_wait=max_wait)
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            if isinstance(e, RateLimitExceeded) or not is_rate_limit_error(e):
+                raise
+            delay = backoff_delay(attempt, base_delay)
+            penalize(bucket, delay)
+            if attempt >= max_retries:
+                raise
+            print(f"DEBUG: {bucket} rate limited, retrying in {delay:.1f}s (attempt {attempt + 1}/{max_retries})")
+            attempt += 1
+
+
+def bucket_stats():
+    """Tokens and queue depth of every configured bucket (for the metrics view)"""
+    stats = {}
+    for bucket in settings.AI_RATE_LIMITS:
+        if bucket == 'default':
+            continue
+        with _BucketState(bucket) as bucket_state:
+            bucket_state.refill(time.time())
+            stats[bucket] = {
+                'tokens': round(bucket_state.state['tokens'], 2),
+                'queue_depth': sum(bucket_state.waiters().values()),
+            }
+    return stats
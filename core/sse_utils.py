@@ -0,0 +1,38 @@
+"""
+Helpers for server-sent event (SSE) responses
+
+Streams are served by the ASGI app. Django buffers a synchronous iterator
+there before sending it, so streaming views hand it async generators; blocking
+provider iterators are stepped in a thread with iterate_in_thread.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+
+
+def format_sse(event, data, event_id=None):
+    """One server-sent event; data is sent as JSON"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def iterate_in_thread(iterator):
+    """Async iteration over a blocking iterator, each next() running in a worker thread"""
+    done = object()
+    while True:
+        item = await sync_to_async(next, thread_sensitive=False)(iterator, done)
+        if item is done:
+            return
+        yield item
+
+
+def sse_response_headers(response):
+    """Mark a StreamingHttpResponse as an uncached, unbuffered event stream"""
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx-style proxies from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
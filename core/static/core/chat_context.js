@@ -0,0 +1,105 @@
+// ParlorPal chatbot - page-context protocol
+// The page description is sent as a SHA-256 hash; the full text is only uploaded the first
+// time this tab sends it, or when the server answers page_context_missing (see core.page_context).
+
+const CHAT_PAGE_HASHES_KEY = 'chatPageContextHashes';
+
+async function hashPageContent(text) {
+    // crypto.subtle only exists on HTTPS / localhost; without it the full text is sent
+    if (!text || !(window.crypto && window.crypto.subtle)) return '';
+    const digest = await window.crypto.subtle.digest('SHA-256', new TextEncoder().encode(text));
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+function knownPageHashes() {
+    try {
+        return JSON.parse(sessionStorage.getItem(CHAT_PAGE_HASHES_KEY)) || [];
+    } catch (e) {
+        return [];
+    }
+}
+
+function rememberPageHash(hash) {
+    const hashes = knownPageHashes().filter(h => h !== hash);
+    hashes.push(hash);
+    sessionStorage.setItem(CHAT_PAGE_HASHES_KEY, JSON.stringify(hashes.slice(-20)));
+}
+
+// Read a server-sent event stream of chat tokens; resolves like the JSON answer
+async function readChatStream(response, onToken) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    let reply = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+            const block = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = 'message';
+            let data = '';
+            block.split('\n').forEach(line => {
+                if (line.startsWith('event: ')) event = line.slice(7);
+                else if (line.startsWith('data: ')) data += line.slice(6);
+            });
+            if (!data) continue;
+            const payload = JSON.parse(data);
+            if (event === 'token') {
+                reply += payload.text;
+                onToken(reply);
+            } else if (event === 'done') {
+                return { success: true, reply: payload.reply, links: payload.links };
+            } else if (event === 'failed') {
+                return { success: false, error: payload.error };
+            }
+        }
+    }
+    return { success: false, error: 'The reply was interrupted. Please try again.' };
+}
+
+// Links that come with a reply (intent router answers), added below its text
+function appendChatLinks(bubble, links) {
+    (links || []).forEach(link => {
+        const anchor = document.createElement('a');
+        anchor.href = link.url;
+        anchor.textContent = link.title + ' →';
+        anchor.style.display = 'block';
+        bubble.appendChild(anchor);
+    });
+}
+
+// POST a chat message and resolve with {success, reply} or {success: false, error}.
+// With onToken the reply is streamed and onToken(textSoFar) is called as it grows.
+async function postChatMessage(url, message, currentPage, pageContent, onToken) {
+    const pageHash = await hashPageContent(pageContent);
+
+    async function send(includeContent) {
+        const params = { message: message, current_page: currentPage, page_hash: pageHash };
+        if (includeContent || !pageHash) params.page_content = pageContent;
+        if (onToken) params.stream = '1';
+        const response = await fetch(url, {
+            method: 'POST',
+            headers: {
+                'X-Requested-With': 'XMLHttpRequest',
+                'Content-Type': 'application/x-www-form-urlencoded',
+                'X-CSRFToken': document.querySelector('[name=csrfmiddlewaretoken]').value
+            },
+            body: new URLSearchParams(params)
+        });
+        // Errors and page_context_missing come back as plain JSON even when streaming
+        if (onToken && (response.headers.get('Content-Type') || '').startsWith('text/event-stream')) {
+            return readChatStream(response, onToken);
+        }
+        return response.json();
+    }
+
+    let data = await send(pageContent && !knownPageHashes().includes(pageHash));
+    if (data.page_context_missing) {
+        data = await send(true);
+    }
+    if (pageHash && data.success) rememberPageHash(pageHash);
+    return data;
+}
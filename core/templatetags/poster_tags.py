@@ -0,0 +1,41 @@
+from django import template
+from django.conf import settings
+from django.utils.html import format_html
+
+from core.cloudinary_utils import extract_public_id, get_rendition_url, get_srcset
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(url, public_id="", sizes="100vw", alt="", css_class=""):
+    """
+    Lazy-loaded <img> that lets the browser pick a Cloudinary rendition
+
+    Usage: {% responsive_image poster.poster_url poster.public_id sizes="60px" alt=poster.promotion_name %}
+
+    Falls back to the stored URL for local /media/ files, or when Cloudinary
+    is not configured. The original stays available through the plain URL
+    (download / "View Full Size" links).
+    """
+    public_id = public_id or extract_public_id(url)
+    srcset = get_srcset(public_id) if public_id else ""
+    if not srcset:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="lazy" decoding="async">',
+            url, alt, css_class
+        )
+
+    widths = settings.POSTER_RENDITION_WIDTHS
+    src = get_rendition_url(public_id, widths[len(widths) // 2])
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" loading="lazy" decoding="async">',
+        src, srcset, sizes, alt, css_class
+    )
+
+
+@register.simple_tag
+def rendition_url(url, public_id="", width=480):
+    """Single width-limited rendition URL (the stored URL if no rendition can be built)"""
+    public_id = public_id or extract_public_id(url)
+    return (get_rendition_url(public_id, width) if public_id else None) or url
@@ -0,0 +1,639 @@
+"""
+Routing of text generation between the AI providers
+
+Captions, chat replies and email subjects all call generate_text. Every
+provider call is timed into a rolling window (core.metrics), and each request
+goes to the fastest healthy provider. If that provider has not answered by its
+observed p95 latency, the next one is asked as well (hedged) and the first
+answer wins. A per-process circuit breaker takes a provider out of rotation
+after TEXT_BREAKER_FAILURES consecutive failures, so requests fail over at
+once instead of waiting on a provider that keeps timing out.
+
+Async views use agenerate_text, the same routing on the providers' async
+clients, so a request waiting on a provider holds no thread.
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from google.genai import types
+
+from . import metrics
+from .genai_clients import get_async_cohere_client, get_cohere_client, get_genai_client
+from .rate_limit import RateLimitExceeded, acquire, is_rate_limit_error, penalize
+
+COHERE_TEXT_MODEL = "command"
+COHERE_CHAT_MODEL = "command-r"  # for JSON output (json_schema), which generate does not support
+GEMINI_TEXT_MODEL = "gemini-2.5-flash"
+
+
+def _cohere_options(max_tokens, temperature):
+    options = {}
+    if max_tokens is not None:
+        options['max_tokens'] = max_tokens
+    if temperature is not None:
+        options['temperature'] = temperature
+    return options
+
+
+def _gemini_config(max_tokens, temperature, json_schema=None):
+    options = {}
+    if json_schema is not None:
+        options.update(response_mime_type="application/json", response_json_schema=json_schema)
+    return types.GenerateContentConfig(
+        thinking_config=types.ThinkingConfig(thinking_budget=0),
+        max_output_tokens=max_tokens,
+        temperature=temperature,
+        **options
+    )
+
+
+def _generate_cohere(prompt, max_tokens=None, temperature=None, json_schema=None):
+    options = _cohere_options(max_tokens, temperature)
+    if json_schema is not None:
+        # JSON mode is only offered by the chat endpoint
+        response = get_cohere_client().chat(
+            model=COHERE_CHAT_MODEL, message=prompt,
+            response_format={'type': 'json_object', 'schema': json_schema}, **options
+        )
+        return response.text
+    response = get_cohere_client().generate(model=COHERE_TEXT_MODEL, prompt=prompt, **options)
+    return response.generations[0].text
+
+
+def _generate_gemini(prompt, max_tokens=None, temperature=None, json_schema=None):
+    client = get_genai_client(os.getenv('GEMINI_API_KEY'))
+    response = client.models.generate_content(
+        model=GEMINI_TEXT_MODEL,
+        contents=prompt,
+        config=_gemini_config(max_tokens, temperature, json_schema)
+    )
+    return response.text
+
+
+async def _agenerate_cohere(prompt, max_tokens=None, temperature=None, json_schema=None):
+    options = _cohere_options(max_tokens, temperature)
+    if json_schema is not None:
+        response = await get_async_cohere_client().chat(
+            model=COHERE_CHAT_MODEL, message=prompt,
+            response_format={'type': 'json_object', 'schema': json_schema}, **options
+        )
+        return response.text
+    response = await get_async_cohere_client().generate(model=COHERE_TEXT_MODEL, prompt=prompt, **options)
+    return response.generations[0].text
+
+
+async def _agenerate_gemini(prompt, max_tokens=None, temperature=None, json_schema=None):
+    client = get_genai_client(os.getenv('GEMINI_API_KEY'))
+    response = await client.aio.models.generate_content(
+        model=GEMINI_TEXT_MODEL,
+        contents=prompt,
+        config=_gemini_config(max_tokens, temperature, json_schema)
+    )
+    return response.text
+
+
+def _stream_cohere(prompt, max_tokens=None, temperature=None):
+    options = _cohere_options(max_tokens, temperature)
+    events = get_cohere_client().generate_stream(model=COHERE_TEXT_MODEL, prompt=prompt, **options)
+    for event in events:
+        if event.event_type == "text-generation" and event.text:
+            yield event.text
+        elif event.event_type == "stream-error":
+            raise RuntimeError(event.err)
+
+
+def _stream_gemini(prompt, max_tokens=None, temperature=None):
+    client = get_genai_client(os.getenv('GEMINI_API_KEY'))
+    chunks = client.models.generate_content_stream(
+        model=GEMINI_TEXT_MODEL,
+        contents=prompt,
+        config=_gemini_config(max_tokens, temperature)
+    )
+    for chunk in chunks:
+        if chunk.text:
+            yield chunk.text
+
+
+# Text providers: name -> (rate limit bucket, generate function)
+TEXT_PROVIDERS = {
+    "cohere": ("cohere", _generate_cohere),
+    "gemini": ("gemini", _generate_gemini),
+}
+
+# Streaming variants: name -> generator of text chunks
+TEXT_STREAMERS = {
+    "cohere": _stream_cohere,
+    "gemini": _stream_gemini,
+}
+
+
+# Async variants for agenerate_text: name -> coroutine function
+ASYNC_TEXT_PROVIDERS = {
+    "cohere": _agenerate_cohere,
+    "gemini": _agenerate_gemini,
+}
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker for one provider
+
+    closed: calls go through. open: calls are refused until the cooldown has
+    passed. half-open: a single trial call is let through; its outcome closes
+    or re-opens the breaker.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= settings.TEXT_BREAKER_COOLDOWN:
+            return "half-open"
+        return "open"
+
+    def allow(self):
+        """True if a call may be made now (claims the trial call when half-open)"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half-open" and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+
+    def available(self):
+        """Like allow(), without claiming anything (for ranking)"""
+        state = self.state
+        return state == "closed" or (state == "half-open" and not self.trial_running)
+
+    def release(self):
+        """Give back a claimed call that never ran"""
+        with self._lock:
+            self.trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.trial_running = False
+            if self.opened_at is not None or self.failures >= settings.TEXT_BREAKER_FAILURES:
+                if self.opened_at is None:
+                    print(f"DEBUG: Circuit breaker opened for {self.name} after {self.failures} failures")
+                self.opened_at = time.monotonic()
+                metrics.incr(f"text_provider.{self.name}.breaker_opened")
+
+
+_breakers = {name: CircuitBreaker(name) for name in TEXT_PROVIDERS}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.TEXT_ROUTER_POOL_SIZE, thread_name_prefix='text-provider')
+        return _pool
+
+
+def _metric(name):
+    return f"text_provider.{name}"
+
+
+def ranked_providers(preferred=None):
+    """
+    Available providers, fastest first
+
+    Providers with fewer than TEXT_HEDGE_MIN_SAMPLES timed calls keep the
+    order of `preferred` ahead of measured ones; measured providers are
+    ordered by p50 latency divided by their success rate.
+    """
+    order = list(preferred or TEXT_PROVIDERS)
+    order += [name for name in TEXT_PROVIDERS if name not in order]
+
+    def score(name):
+        if metrics.sample_count(_metric(name)) < settings.TEXT_HEDGE_MIN_SAMPLES:
+            return (0, order.index(name))
+        p50 = metrics.percentile(_metric(name), 50)
+        return (1, p50 / max(metrics.success_rate(_metric(name)), 0.1))
+
+    return sorted((name for name in order if _breakers[name].available()), key=score)
+
+
+def hedge_delay(name):
+    """Seconds to wait for a provider before hedging: its observed TEXT_HEDGE_PERCENTILE latency"""
+    delay = None
+    if metrics.sample_count(_metric(name)) >= settings.TEXT_HEDGE_MIN_SAMPLES:
+        delay = metrics.percentile(_metric(name), settings.TEXT_HEDGE_PERCENTILE)
+    if delay is None:
+        delay = settings.TEXT_HEDGE_DEFAULT_DELAY
+    return min(max(delay, settings.TEXT_HEDGE_MIN_DELAY), settings.TEXT_HEDGE_MAX_DELAY)
+
+
+def record_result(name, seconds, ok, stream=False):
+    """
+    Feed one call's outcome into the latency window and the provider's breaker
+
+    Streams are timed to their first chunk in a window of their own: how long
+    a stream runs depends on the reader and the answer length, and would skew
+    the ranking and hedge delays of generate_text.
+    """
+    metrics.observe(f"{_metric(name)}.stream" if stream else _metric(name), seconds, ok=ok)
+    if ok:
+        _breakers[name].record_success()
+    else:
+        _breakers[name].record_failure()
+
+
+def claim_provider(name):
+    """Ask the breaker for permission to call a provider directly (e.g. for streaming)"""
+    allowed = _breakers[name].allow()
+    if not allowed:
+        metrics.incr(f"{_metric(name)}.short_circuited")
+    return allowed
+
+
+def release_provider(name):
+    """Give back a claim_provider permission that was not used"""
+    _breakers[name].release()
+
+
+class _Attempt:
+    """
+    One provider call of generate_text, whose outcome is recorded exactly once
+
+    When generate_text gives up on a hung call it records the failure itself;
+    the abandoned thread may still finish later and must not count again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._settled = False
+
+    def settle(self):
+        """True for the first caller only (the thread that finished, or the timeout)"""
+        with self._lock:
+            if self._settled:
+                return False
+            self._settled = True
+            return True
+
+
+def _call_text_provider(name, prompt, max_tokens, temperature, max_wait, options, attempt):
+    bucket, generate = TEXT_PROVIDERS[name]
+    try:
+        acquire(bucket, max_wait=max_wait)
+    except RateLimitExceeded:
+        # Our own limiter, not the provider: the breaker is not involved
+        if attempt.settle():
+            _breakers[name].release()
+        raise
+    started = time.monotonic()
+    ok = False
+    try:
+        text = (generate(prompt, max_tokens=max_tokens, temperature=temperature, **options) or "").strip()
+        ok = bool(text)
+        if not ok:
+            raise ValueError(f"{name} returned an empty response")
+        return text
+    except Exception as e:
+        if is_rate_limit_error(e):
+            penalize(bucket, settings.AI_RATE_LIMIT_BASE_DELAY)
+        raise
+    finally:
+        if attempt.settle():
+            record_result(name, time.monotonic() - started, ok)
+        else:
+            metrics.incr(f"{_metric(name)}.late")
+
+
+def _cancel(future, name):
+    """Cancel a call that has not started yet and give back its breaker claim"""
+    if future.cancel():
+        _breakers[name].release()
+
+
+def generate_text(prompt, feature, preferred=None, max_tokens=None, temperature=None, max_wait=None,
+                  json_schema=None):
+    """
+    Generate text with the fastest healthy provider, hedging slow calls
+
+    Args:
+        prompt: Full prompt
+        feature: Label for the per-feature counters ("caption", "chat", "email_subjects")
+        preferred: Provider order to use until enough latency samples exist
+        max_tokens: Output token limit (None for the provider default)
+        temperature: Sampling temperature (None for the provider default)
+        max_wait: Longest wait for a rate limit token (default AI_RATE_LIMIT_WEB_MAX_WAIT)
+        json_schema: JSON schema the answer must follow; the text is then a JSON document
+
+    Returns:
+        tuple: (text, provider name)
+
+    Raises:
+        The last provider error (a quota error if any provider was rate limited),
+        RateLimitExceeded if every breaker is open, or TimeoutError after
+        TEXT_ROUTER_TIMEOUT seconds without an answer
+    """
+    if max_wait is None:
+        max_wait = settings.AI_RATE_LIMIT_WEB_MAX_WAIT
+    providers = ranked_providers(preferred)
+    metrics.incr(f"text_router.{feature}.requests")
+    if not providers:
+        metrics.incr(f"text_router.{feature}.unavailable")
+        raise RateLimitExceeded("All text providers are temporarily unavailable")
+
+    options = {'json_schema': json_schema} if json_schema is not None else {}
+    pool = _get_pool()
+    pending = {}
+    attempts = {}
+    last_error = None
+    rate_limit_error = None
+    deadline = time.monotonic() + settings.TEXT_ROUTER_TIMEOUT
+
+    def launch_next():
+        while providers:
+            name = providers.pop(0)
+            if claim_provider(name):
+                attempt = _Attempt()
+                future = pool.submit(_call_text_provider, name, prompt, max_tokens, temperature, max_wait, options,
+                                     attempt)
+                pending[future] = name
+                attempts[future] = attempt
+                return True
+        return False
+
+    launch_next()
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            for future, name in pending.items():
+                if future.cancel():
+                    _breakers[name].release()
+                elif attempts[future].settle():
+                    # A hung call counts as a failure now; its thread's late result is ignored
+                    _breakers[name].record_failure()
+            metrics.incr(f"text_router.{feature}.timeout")
+            raise TimeoutError(f"No text provider answered within {settings.TEXT_ROUTER_TIMEOUT:.0f}s")
+
+        timeout = remaining
+        if providers:
+            timeout = min(timeout, hedge_delay(next(iter(pending.values()))))
+
+        done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done:
+            if providers and launch_next():
+                print(f"DEBUG: No {feature} text after {timeout:.1f}s, sending hedged request")
+                metrics.incr(f"text_router.{feature}.hedged")
+            continue
+
+        for future in done:
+            name = pending.pop(future)
+            try:
+                text = future.result()
+            except Exception as e:
+                print(f"DEBUG: Text provider {name} failed for {feature}: {e}")
+                last_error = e
+                if is_rate_limit_error(e):
+                    rate_limit_error = e
+                continue
+            for loser, loser_name in pending.items():
+                _cancel(loser, loser_name)
+            metrics.incr(f"text_router.{feature}.{name}")
+            return text, name
+
+        if not pending and providers:
+            metrics.incr(f"text_router.{feature}.fallback")
+            launch_next()
+
+    raise rate_limit_error or last_error or RateLimitExceeded("All text providers are temporarily unavailable")
+
+
+async def _acall_text_provider(name, prompt, max_tokens, temperature, max_wait, options):
+    bucket = TEXT_PROVIDERS[name][0]
+    try:
+        # The bucket is a locked file and may sleep for capacity: wait in a worker thread
+        await sync_to_async(acquire, thread_sensitive=False)(bucket, max_wait=max_wait)
+    except (RateLimitExceeded, asyncio.CancelledError):
+        _breakers[name].release()
+        raise
+    started = time.monotonic()
+    try:
+        generate = ASYNC_TEXT_PROVIDERS[name]
+        text = (await generate(prompt, max_tokens=max_tokens, temperature=temperature, **options) or "").strip()
+    except asyncio.CancelledError:
+        # Lost the hedge race or the client went away: not the provider's fault
+        _breakers[name].release()
+        raise
+    except Exception as e:
+        if is_rate_limit_error(e):
+            # Same locked bucket file as acquire: keep the write off the event loop
+            await sync_to_async(penalize, thread_sensitive=False)(bucket, settings.AI_RATE_LIMIT_BASE_DELAY)
+        record_result(name, time.monotonic() - started, False)
+        raise
+    if not text:
+        record_result(name, time.monotonic() - started, False)
+        raise ValueError(f"{name} returned an empty response")
+    record_result(name, time.monotonic() - started, True)
+    return text
+
+
+async def agenerate_text(prompt, feature, preferred=None, max_tokens=None, temperature=None, max_wait=None,
+                         json_schema=None):
+    """
+    Async generate_text: same ranking, hedging, breakers and errors
+
+    Calls are tasks on the running event loop instead of pool threads, and a
+    hedged call that loses the race is cancelled rather than left to finish.
+
+    Returns:
+        tuple: (text, provider name)
+    """
+    if max_wait is None:
+        max_wait = settings.AI_RATE_LIMIT_WEB_MAX_WAIT
+    providers = ranked_providers(preferred)
+    metrics.incr(f"text_router.{feature}.requests")
+    if not providers:
+        metrics.incr(f"text_router.{feature}.unavailable")
+        raise RateLimitExceeded("All text providers are temporarily unavailable")
+
+    options = {'json_schema': json_schema} if json_schema is not None else {}
+    pending = {}
+    last_error = None
+    rate_limit_error = None
+    deadline = time.monotonic() + settings.TEXT_ROUTER_TIMEOUT
+
+    def launch_next():
+        while providers:
+            name = providers.pop(0)
+            if claim_provider(name):
+                task = asyncio.ensure_future(
+                    _acall_text_provider(name, prompt, max_tokens, temperature, max_wait, options)
+                )
+                pending[task] = name
+                return True
+        return False
+
+    launch_next()
+    try:
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                for task, name in pending.items():
+                    task.cancel()
+                    # A hung call counts as a failure
+                    _breakers[name].record_failure()
+                pending.clear()
+                metrics.incr(f"text_router.{feature}.timeout")
+                raise TimeoutError(f"No text provider answered within {settings.TEXT_ROUTER_TIMEOUT:.0f}s")
+
+            timeout = remaining
+            if providers:
+                timeout = min(timeout, hedge_delay(next(iter(pending.values()))))
+
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if providers and launch_next():
+                    print(f"DEBUG: No {feature} text after {timeout:.1f}s, sending hedged request")
+                    metrics.incr(f"text_router.{feature}.hedged")
+                continue
+
+            for task in done:
+                name = pending.pop(task)
+                try:
+                    text = task.result()
+                except Exception as e:
+                    print(f"DEBUG: Text provider {name} failed for {feature}: {e}")
+                    last_error = e
+                    if is_rate_limit_error(e):
+                        rate_limit_error = e
+                    continue
+                metrics.incr(f"text_router.{feature}.{name}")
+                return text, name
+
+            if not pending and providers:
+                metrics.incr(f"text_router.{feature}.fallback")
+                launch_next()
+    finally:
+        # Hedging losers, or every call when the request itself was cancelled
+        for task in pending:
+            task.cancel()
+
+    raise rate_limit_error or last_error or RateLimitExceeded("All text providers are temporarily unavailable")
+
+
+def stream_text(prompt, feature, preferred=None, max_tokens=None, temperature=None, max_wait=None, cancelled=None):
+    """
+    Text chunks from the fastest healthy provider, as they are generated
+
+    Streams are not hedged. A provider that fails before its first chunk is
+    skipped for the next one; a failure after text was sent is raised, since
+    the reader has already seen part of the answer.
+
+    Args:
+        prompt, feature, preferred, max_tokens, temperature, max_wait: as for generate_text
+        cancelled: threading.Event set when the reader has gone away; the
+                   upstream stream is closed at the next chunk
+
+    Yields:
+        str: text chunks
+    """
+    if max_wait is None:
+        max_wait = settings.AI_RATE_LIMIT_WEB_MAX_WAIT
+    metrics.incr(f"text_router.{feature}.requests")
+    last_error = None
+    started = time.monotonic()
+
+    for name in ranked_providers(preferred):
+        if not claim_provider(name):
+            continue
+        bucket = TEXT_PROVIDERS[name][0]
+        try:
+            acquire(bucket, max_wait=max_wait)
+        except RateLimitExceeded as e:
+            _breakers[name].release()
+            last_error = e
+            continue
+
+        provider_started = time.monotonic()
+        stream = TEXT_STREAMERS[name](prompt, max_tokens=max_tokens, temperature=temperature)
+        sent = False
+        first_chunk_seconds = None
+        try:
+            for chunk in stream:
+                if cancelled is not None and cancelled.is_set():
+                    break
+                if not sent:
+                    first_chunk_seconds = time.monotonic() - provider_started
+                    metrics.observe(f"text_stream.{feature}.ttft", time.monotonic() - started)
+                    sent = True
+                yield chunk
+        except GeneratorExit:
+            # Closed by the reader: not the provider's fault
+            _breakers[name].release()
+            raise
+        except Exception as e:
+            if is_rate_limit_error(e):
+                penalize(bucket, settings.AI_RATE_LIMIT_BASE_DELAY)
+            record_result(name, time.monotonic() - provider_started, False, stream=True)
+            if sent:
+                raise
+            print(f"DEBUG: Text provider {name} failed before streaming {feature}: {e}")
+            last_error = e
+            continue
+        finally:
+            stream.close()
+
+        if cancelled is not None and cancelled.is_set():
+            _breakers[name].release()
+            metrics.incr(f"text_router.{feature}.cancelled")
+            return
+        if not sent:
+            record_result(name, time.monotonic() - provider_started, False, stream=True)
+            last_error = ValueError(f"{name} returned an empty response")
+            continue
+        record_result(name, first_chunk_seconds, True, stream=True)
+        metrics.incr(f"text_router.{feature}.{name}")
+        metrics.observe(f"text_stream.{feature}.total", time.monotonic() - started)
+        return
+
+    metrics.incr(f"text_router.{feature}.unavailable")
+    raise last_error or RateLimitExceeded("All text providers are temporarily unavailable")
+
+
+def text_router_stats():
+    """Breaker state and rolling latency of every text provider (for the metrics view)"""
+    stats = {}
+    for name, breaker in _breakers.items():
+        p50 = metrics.percentile(_metric(name), 50)
+        p95 = metrics.percentile(_metric(name), 95)
+        stream_p50 = metrics.percentile(f"{_metric(name)}.stream", 50)
+        stats[name] = {
+            'breaker': breaker.state,
+            'consecutive_failures': breaker.failures,
+            'p50': round(p50, 3) if p50 is not None else None,
+            'p95': round(p95, 3) if p95 is not None else None,
+            'success_rate': round(metrics.success_rate(_metric(name)), 4),
+            'hedge_delay': round(hedge_delay(name), 2),
+            'stream_first_chunk_p50': round(stream_p50, 3) if stream_p50 is not None else None,
+        }
+    return stats
@@ -8,14 +8,20 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('ai/', views.ai_suggestions_view, name='ai_suggestions'),
+    path('ai/bulk/', views.bulk_captions_view, name='bulk_captions'),
     path('feedback/', views.feedback_view, name='feedback'),
     path('profile/', views.profile_view, name='profile'),
     path('logout/', views.logout_view, name='logout'),
     path('2fa/', views.two_factor_view, name='two_factor'),
     # path('ai-suggestions/', views.ai_suggestions_view, name='ai_suggestions'),
     path('generate_poster/', views.poster_generator_view, name='generate_poster'),
+    path('generate_poster/jobs/<int:job_id>/', views.poster_job_status_view, name='poster_job_status'),
+    path('generate_poster/jobs/<int:job_id>/events/', views.poster_job_events_view, name='poster_job_events'),
+    path('generate_poster/campaigns/<uuid:campaign_id>/', views.poster_campaign_status_view, name='poster_campaign_status'),
     path('chatbot/', views.chatbot_view, name='chatbot'),
+    path('chatbot/answer-cache/invalidate/', views.answer_cache_invalidate_view, name='answer_cache_invalidate'),
     path('generate-video/', views.generate_video_view, name='generate_video'),
+    path('generate-video/jobs/<int:job_id>/', views.video_job_status_view, name='video_job_status'),
     
     # Email Verification & Festival Notifications
     path('verify-email/<str:token>/', views.verify_email_view, name='verify_email'),
@@ -29,6 +35,7 @@ urlpatterns = [
     path('email-subjects/', views.email_subjects_view, name='email_subjects'),
     path('history/', views.user_history_view, name='user_history'),
     path('insights/', views.insights_view, name='insights'),
+    path('metrics/', views.metrics_view, name='metrics'),
     
     # Password Reset (Forgot Password)
     path('forgot-password/', views.forgot_password_view, name='forgot_password'),
@@ -0,0 +1,302 @@
+"""
+Background Veo video generation
+
+The video page only queues a VideoJob. The run_video_poller command submits
+queued jobs to Veo, checkpoints the returned operation name on the job and
+then checks all running operations from a single loop, each when its
+next_poll_at comes due. A restarted poller therefore picks up where the last
+one stopped, and no web or worker thread ever sleeps on a video.
+"""
+import os
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from google.genai import types
+
+from . import metrics
+from .cloudinary_utils import upload_video_to_cloudinary
+from .genai_clients import get_genai_client
+from .models import UserHistory, VideoJob
+from .rate_limit import RateLimitExceeded, call_with_rate_limit, is_rate_limit_error
+
+VIDEO_MODEL_ID = "veo-3.0-generate-preview"
+
+# Seconds of the submit -> done latency window; feeds the adaptive poll schedule
+OPERATION_METRIC = "veo.operation"
+MIN_TIMING_SAMPLES = 5
+
+GENERIC_ERROR = "Video generation failed. Please try again."
+
+
+def get_veo_client():
+    """Shared google.genai client for Veo (GOOGLE_VERTEX_API_KEY)"""
+    return get_genai_client(os.getenv('GOOGLE_VERTEX_API_KEY'), provider="veo")
+
+
+def build_video_prompt(business, campaign_name, theme, script):
+    return (
+        f"Generate a marketing video using the following details.\n"
+        f"Script: {script}\n"
+        f"Theme: {theme}\n"
+        f"Campaign Name: {campaign_name}\n"
+        f"\nUse the details below as reference only (do not include verbatim):\n"
+        f"Business Name: {business.business_name}\n"
+        f"Description: {business.description}"
+    )
+
+
+def queue_video_job(user, business, campaign_name, theme, aspect_ratio, script):
+    """Create a VideoJob for the run_video_poller command"""
+    return VideoJob.objects.create(
+        user=user,
+        campaign_name=campaign_name,
+        theme=theme,
+        aspect_ratio=aspect_ratio,
+        input_data={
+            'campaign_name': campaign_name,
+            'theme': theme,
+            'aspect_ratio': aspect_ratio,
+            'script': script,
+            'business_name': business.business_name,
+        },
+        prompt_text=build_video_prompt(business, campaign_name, theme, script),
+    )
+
+
+def expected_operation_seconds():
+    """Typical submit -> done time: the observed median once enough videos were timed"""
+    if metrics.sample_count(OPERATION_METRIC) >= MIN_TIMING_SAMPLES:
+        return metrics.percentile(OPERATION_METRIC, 50)
+    return settings.VIDEO_POLL_EXPECTED_SECONDS
+
+
+def next_poll_delay(age):
+    """
+    Seconds until an operation submitted `age` seconds ago is checked again
+
+    Nothing is checked before a typical video could be ready. After that the
+    interval starts at VIDEO_POLL_MIN_INTERVAL and grows with the overrun, so a
+    late video is noticed quickly and a stuck one costs few calls.
+    """
+    expected = expected_operation_seconds()
+    delay = expected - age if age < expected else (age - expected) / 2
+    return min(settings.VIDEO_POLL_MAX_INTERVAL, max(settings.VIDEO_POLL_MIN_INTERVAL, delay))
+
+
+def _age(job):
+    return (timezone.now() - job.submitted_at).total_seconds() if job.submitted_at else 0.0
+
+
+def claim_next_video_job():
+    """
+    Atomically move the oldest queued job to 'submitting' (see claim_next_poster_job)
+
+    Returns:
+        VideoJob or None if the queue is empty
+    """
+    candidate_ids = VideoJob.objects.filter(status="queued").order_by("created_at").values_list("id", flat=True)[:10]
+    for job_id in candidate_ids:
+        claimed = VideoJob.objects.filter(pk=job_id, status="queued").update(
+            status="submitting",
+            submitted_at=timezone.now(),
+            attempts=F("attempts") + 1
+        )
+        if claimed:
+            return VideoJob.objects.select_related("user").get(pk=job_id)
+    return None
+
+
+def requeue_stale_video_jobs(max_age_seconds=None):
+    """Put jobs a crashed poller claimed but never submitted back on the queue"""
+    if max_age_seconds is None:
+        max_age_seconds = settings.VIDEO_JOB_STALE_SECONDS
+    cutoff = timezone.now() - timedelta(seconds=max_age_seconds)
+    return VideoJob.objects.filter(status="submitting", submitted_at__lt=cutoff).update(status="queued")
+
+
+def submit_video_job(job, client=None):
+    """
+    Start the Veo operation of a claimed job and checkpoint its name
+
+    Never waits for rate limit capacity: without a free "veo" token the job
+    goes back on the queue and the poller tries again on its next loop.
+
+    Returns:
+        bool: False when the job was re-queued for lack of capacity
+    """
+    client = client or get_veo_client()
+    try:
+        operation = call_with_rate_limit(
+            "veo",
+            client.models.generate_videos,
+            max_retries=0,
+            max_wait=0,
+            model=VIDEO_MODEL_ID,
+            prompt=job.prompt_text,
+            config=types.GenerateVideosConfig(
+                person_generation="allow_all",
+                aspect_ratio=job.aspect_ratio,
+            ),
+        )
+    except Exception as e:
+        if isinstance(e, RateLimitExceeded) or is_rate_limit_error(e):
+            VideoJob.objects.filter(pk=job.pk).update(status="queued", attempts=F("attempts") - 1)
+            metrics.incr("video_job.deferred")
+            return False
+        print(f"ERROR: Veo submission failed for video job {job.id}: {e}")
+        _fail(job, GENERIC_ERROR)
+        return True
+
+    job.operation_name = operation.name
+    job.status = "running"
+    job.next_poll_at = timezone.now() + timedelta(seconds=next_poll_delay(0))
+    job.save(update_fields=["operation_name", "status", "next_poll_at"])
+    metrics.incr("video_job.submitted")
+    print(f"DEBUG: Video job {job.id} submitted as {operation.name}")
+    if operation.done:
+        _complete(job, operation, client)
+    return True
+
+
+def claim_due_video_jobs(limit=None):
+    """
+    Running jobs whose next check is due, leased to this poller
+
+    The lease moves next_poll_at forward with a conditional UPDATE, so two
+    pollers never check (and finish) the same operation at the same time.
+    """
+    if limit is None:
+        limit = settings.VIDEO_POLL_BATCH_SIZE
+    now = timezone.now()
+    lease_until = now + timedelta(seconds=settings.VIDEO_POLL_MAX_INTERVAL)
+    due = (VideoJob.objects.filter(status="running", next_poll_at__lte=now)
+           .order_by("next_poll_at").values_list("id", "next_poll_at")[:limit])
+    claimed_ids = [
+        job_id for job_id, next_poll_at in due
+        if VideoJob.objects.filter(pk=job_id, status="running", next_poll_at=next_poll_at).update(next_poll_at=lease_until)
+    ]
+    return list(VideoJob.objects.select_related("user").filter(id__in=claimed_ids).order_by("next_poll_at"))
+
+
+def next_video_poll_at():
+    """Earliest next_poll_at of the running jobs, None when nothing is running"""
+    job = VideoJob.objects.filter(status="running").order_by("next_poll_at").only("next_poll_at").first()
+    return job.next_poll_at if job else None
+
+
+def poll_video_job(job, client=None):
+    """
+    Check one running operation, finishing the job or scheduling its next check
+
+    Returns:
+        VideoJob: the same job, still 'running' or now 'done' / 'failed'
+    """
+    client = client or get_veo_client()
+    age = _age(job)
+    started = time.monotonic()
+    try:
+        operation = client.operations.get(types.GenerateVideosOperation(name=job.operation_name))
+    except Exception as e:
+        # Transient API errors are retried on the normal schedule until the job times out
+        print(f"ERROR: Could not check video job {job.id} ({job.operation_name}): {e}")
+        metrics.observe("veo.poll", time.monotonic() - started, ok=False)
+        operation = None
+    else:
+        metrics.observe("veo.poll", time.monotonic() - started)
+
+    job.polls += 1
+    if operation is not None and operation.done:
+        job.save(update_fields=["polls"])
+        return _complete(job, operation, client)
+    if age > settings.VIDEO_JOB_TIMEOUT_SECONDS:
+        print(f"DEBUG: Video job {job.id} timed out after {age:.0f}s")
+        metrics.incr("video_job.timeout")
+        job.save(update_fields=["polls"])
+        return _fail(job, "Video generation is taking too long. Please try again.")
+
+    job.next_poll_at = timezone.now() + timedelta(seconds=next_poll_delay(age))
+    job.save(update_fields=["polls", "next_poll_at"])
+    return job
+
+
+def _complete(job, operation, client):
+    """Store the video of a finished operation, or fail the job with the reason"""
+    if operation.error:
+        print(f"ERROR: Veo operation failed for video job {job.id}: {operation.error}")
+        return _fail(job, GENERIC_ERROR)
+    generated = operation.response.generated_videos if operation.response else None
+    if not generated:
+        # e.g. every sample was removed by the safety filters
+        reasons = getattr(operation.response, 'rai_media_filtered_reasons', None)
+        print(f"DEBUG: Video job {job.id} finished without a video: {reasons}")
+        return _fail(job, "No video was generated for this script. Please try rephrasing it.")
+
+    metrics.observe(OPERATION_METRIC, _age(job))
+    try:
+        video = generated[0].video
+        video_bytes = video.video_bytes or client.files.download(file=video)
+        video_url, public_id = _store_video(job, video_bytes)
+    except Exception as e:
+        print(f"ERROR: Could not store video of job {job.id}: {e}")
+        return _fail(job, "The video was generated but could not be saved. Please try again.")
+
+    if not _finish(job, "done", video_url=video_url, public_id=public_id):
+        return job
+    UserHistory.objects.create(
+        user=job.user,
+        action_type='video_generation',
+        input_data=job.input_data,
+        output_data=video_url,
+        public_id=public_id,
+        prompt_used=job.prompt_text
+    )
+    metrics.incr("video_job.done")
+    print(f"DEBUG: Video job {job.id} done after {job.polls} polls: {video_url}")
+    return job
+
+
+def _store_video(job, video_bytes):
+    """
+    Save a video under MEDIA_ROOT/videos and upload it to Cloudinary
+
+    Returns:
+        tuple: (URL, Cloudinary public ID); the local media URL when the upload fails
+    """
+    media_videos_path = os.path.join(settings.MEDIA_ROOT, 'videos')
+    os.makedirs(media_videos_path, exist_ok=True)
+    filename = f"video_{job.id}_{uuid.uuid4().hex[:8]}.mp4"
+    with open(os.path.join(media_videos_path, filename), 'wb') as f:
+        f.write(video_bytes)
+
+    # The poller may run on another machine than the web service, so serve the Cloudinary copy
+    upload = upload_video_to_cloudinary(video_bytes, folder="videos")
+    if upload['success']:
+        return upload['url'], upload['public_id']
+    print(f"ERROR: Cloudinary video upload failed for job {job.id}: {upload['error']}")
+    return settings.MEDIA_URL + f"videos/{filename}", ""
+
+
+def _finish(job, status, video_url="", public_id="", error=""):
+    """Move an unfinished job to done / failed; False if another poller already did"""
+    finished_at = timezone.now()
+    updated = VideoJob.objects.filter(pk=job.pk, status__in=["submitting", "running"]).update(
+        status=status,
+        video_url=video_url,
+        public_id=public_id,
+        error=error,
+        next_poll_at=None,
+        finished_at=finished_at,
+    )
+    job.status, job.video_url, job.public_id, job.error = status, video_url, public_id, error
+    job.next_poll_at, job.finished_at = None, finished_at
+    return bool(updated)
+
+
+def _fail(job, error):
+    _finish(job, "failed", error=error)
+    metrics.incr("video_job.failed")
+    return job
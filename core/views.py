@@ -7,17 +7,15 @@
 # Standard Library
 import os
 import uuid
-from io import BytesIO
 from datetime import datetime
 import json
 from urllib.parse import quote
 
 # Third-Party Imports
 import cohere
-import vertexai
 import google.api_core.exceptions
 import cloudinary.uploader
-from PIL import Image, ImageDraw, ImageFont
+from asgiref.sync import sync_to_async
 from dotenv import load_dotenv
 
 # Django Imports
@@ -26,7 +24,8 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
-from django.http import HttpResponse, JsonResponse
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
 from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
@@ -34,16 +33,27 @@ from django.views.decorators.http import require_POST
 
 # Local Application Imports
 from .forms import RegisterForm, LoginForm, BusinessProfileForm
-from .models import CustomUser, BusinessProfile, SearchHistory, Festival, PosterGeneration, UserHistory
+from .models import CustomUser, BusinessProfile, SearchHistory, Festival, PosterGeneration, UserHistory, PosterJob, VideoJob
 from .email_utils import send_verification_email, send_festival_notifications, is_token_valid
-from .cloudinary_utils import upload_image_to_cloudinary, optimize_image_for_cloudinary
-# --- MODIFICATION: Using the old 'preview' library as requested ---
-from vertexai.preview.vision_models import ImageGenerationModel
+from .cloudinary_utils import optimize_image_for_cloudinary
+from .poster_utils import queue_poster_job, queue_poster_campaign, poster_job_events
+from .video_jobs import queue_video_job
+from .rate_limit import is_rate_limit_error, bucket_stats
+from .business_context import get_business_context
+from .sse_utils import sse_response_headers
+from .caption_utils import (
+    CAPTION_TOKENS, aget_or_generate_caption, build_caption_prompt, caption_error_message, caption_events,
+    generate_bulk_captions, get_or_generate_caption, parse_bulk_items, record_caption
+)
+from .caption_cache import caption_cache_key, caption_cache_stats
+from .text_router import agenerate_text, text_router_stats
+from .answer_cache import answer_cache, answer_context
+from .chat_transcript import aload_transcript, chat_events, instant_chat_events, format_turn, get_conversation_id, record_exchange
+from .email_subjects import aget_or_generate_email_subjects
+from .intent_router import route_intent
+from .page_context import resolve_page_context
 import google.generativeai as genai
 from vertexai.language_models import TextGenerationModel
-# --- NEW: Gemini 3 Pro Image (Nano Banana) for better text rendering ---
-from google import genai as google_genai
-from google.genai import types
 
 
 # -----------------
@@ -52,147 +62,10 @@ from google.genai import types
 # Load environment variables from .env file
 load_dotenv()
 
-# Initialize Cohere Client once
-try:
-    cohere_client = cohere.Client(os.getenv("COHERE_API_KEY"))
-except Exception as e:
-    print(f"CRITICAL: Could not initialize Cohere client. Error: {e}")
+# Cohere and Gemini clients are shared per process, see core.genai_clients
 
-# Initialize Vertex AI once
-import os
-import json
-import vertexai
-from vertexai.preview.vision_models import ImageGenerationModel
-from google.api_core.exceptions import GoogleAPIError
-import traceback
-
-# Handle Google credentials - support both file and environment variable
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-CREDENTIALS_PATH = os.path.join(BASE_DIR, 'secrets', 'image-gen-demo-epsilon-d9e1f100bfc8.json')
-
-# Try to set credentials from environment variable first (for production)
-google_creds_json = os.getenv('GOOGLE_CREDENTIALS_JSON')
-if google_creds_json:
-    # Production: credentials provided as JSON string in environment variable
-    try:
-        credentials_file = '/tmp/google-credentials.json'
-        with open(credentials_file, 'w') as f:
-            f.write(google_creds_json)
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_file
-        print("SUCCESS: Using Google credentials from environment variable")
-    except Exception as e:
-        print(f"ERROR: Failed to write credentials from environment: {e}")
-elif os.path.exists(CREDENTIALS_PATH):
-    # Development: use local credentials file
-    os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = CREDENTIALS_PATH
-    print(f"SUCCESS: Using local credentials file at {CREDENTIALS_PATH}")
-else:
-    print(f"WARNING: No Google credentials found. Image generation will not work.")
-
-# Initialize Vertex AI
-imagen_model_preview = None
-try:
-    if os.getenv('GOOGLE_APPLICATION_CREDENTIALS'):
-        vertexai.init(project=os.getenv('GCP_PROJECT_ID'), location="us-central1")
-
-        # A balanced model that offers a good mix of quality and speed for general-purpose image generation.
-        # Imagen_Model = "imagen-4.0-generate-preview-06-06"
-
-        # A model optimized for speed and low latency, ideal for real-time applications.
-        # Imagen_Model = "imagen-4.0-fast-generate-preview-06-06"
-
-        # The highest quality model in the family, best for complex prompts, high detail, and accurate text rendering.
-        # Imagen_Model = "imagen-4.0-ultra-generate-preview-06-06"
-
-
-        # NOTE: We are now using Gemini 3 Pro Image (Nano Banana) via the generate_poster_gemini_3() function
-        # This old Vertex AI initialization is kept for backwards compatibility but not actively used
-        # Gemini 3 Pro Image is NOT available via ImageGenerationModel - it requires the google.genai library
-        Imagen_Model = "imagen-4.0-ultra-generate-preview-06-06"  # Keep using Imagen as fallback
-
-
-        imagen_model_preview = ImageGenerationModel.from_pretrained(Imagen_Model)
-        
-        if imagen_model_preview:
-            print(f"imagen_model_preview initialized successfully: {imagen_model_preview}")
-            print(f"Using model: {Imagen_Model}")
-        else:
-            print(f"imagen_model_preview failed to initialize")
-            print(f"Model failed: {Imagen_Model}")
-        print("SUCCESS: Vertex AI initialized successfully")
-    else:
-        print("WARNING: Skipping Vertex AI initialization - no credentials available")
-except Exception as e:
-    error_details = traceback.format_exc()
-    print(f"CRITICAL: Could not initialize Vertex AI. Error: {e}")
-    print(f"DEBUG: Full error traceback: {error_details}")
-    imagen_model_preview = None
-
-
-# -----------------
-# 2B. GEMINI 3 PRO IMAGE INITIALIZATION (NANO BANANA)
-# -----------------
-def generate_poster_gemini_3(user_prompt):
-    """
-    Generates a poster using Gemini 3 Pro Image (Nano Banana).
-    This model handles TEXT and EMOTIONS much better than Imagen.
-    
-    Args:
-        user_prompt: The detailed prompt for poster generation
-        
-    Returns:
-        PIL Image object if successful, None otherwise
-    """
-    try:
-        # 1. Initialize the Client (different from Vertex AI)
-        if not settings.GOOGLE_API_KEY:
-            print("ERROR: GOOGLE_API_KEY not configured in settings.py")
-            return None
-            
-        client = google_genai.Client(api_key=settings.GOOGLE_API_KEY)
-        
-        # 2. Define the Model ID (This is Nano Banana Pro)
-        model_id = "gemini-3-pro-image-preview"
-        
-        # 3. Create a config to ensure high quality (simplified config)
-        config = types.GenerateContentConfig(
-            response_modalities=['IMAGE']  # Request an image back
-        )
-        
-        print(f"DEBUG: Sending prompt to {model_id} (Nano Banana)...")
-        
-        # 4. Generate content
-        response = client.models.generate_content(
-            model=model_id,
-            contents=[user_prompt],
-            config=config
-        )
-        
-        print(f"DEBUG: Received response from Gemini 3 Pro Image")
-        
-        # 5. Extract the Image - EXACT same logic as working test script
-        if hasattr(response, 'candidates') and response.candidates:
-            for candidate in response.candidates:
-                if hasattr(candidate, 'content') and candidate.content:
-                    content = candidate.content
-                    if hasattr(content, 'parts') and content.parts:
-                        for part in content.parts:
-                            if hasattr(part, 'inline_data') and part.inline_data:
-                                if hasattr(part.inline_data, 'data'):
-                                    # Data is already raw binary (not base64)
-                                    image_data = part.inline_data.data
-                                    pil_image = Image.open(BytesIO(image_data))
-                                    print(f"DEBUG: Successfully extracted PIL Image")
-                                    print(f"DEBUG: Image size: {pil_image.size}")
-                                    return pil_image
-        
-        print("WARNING: No image found in Gemini 3 Pro response")
-        return None
-        
-    except Exception as e:
-        print(f"ERROR: Gemini 3 Pro Image generation failed: {e}")
-        print(f"DEBUG: Full error traceback: {traceback.format_exc()}")
-        return None
+# Google credentials are set up by core.imagen_utils (imported via core.poster_utils);
+# the Imagen model itself is loaded lazily as the poster fallback provider
 
 
 # -----------------
@@ -328,6 +201,7 @@ def two_factor_view(request):
 
 @login_required
 def dashboard_view(request):
+    """Home page after login: progress, a suggestion and upcoming festival drafts"""
     from datetime import datetime, timedelta
     from django.utils import timezone
     profile = BusinessProfile.objects.filter(user=request.user).first()
@@ -350,18 +224,80 @@ def dashboard_view(request):
         suggestion = "We miss you! It's been a while—generate new content to re-engage your audience."
     else:
         suggestion = "Keep up the great work! Explore more AI tools to supercharge your marketing."
+    from .festival_drafts import upcoming_drafts
     return render(request, 'core/dashboard.html', {
         'user': request.user, 
         'profile': profile,
         'current_date': now,
-        'suggestion': suggestion
+        'suggestion': suggestion,
+        'festival_drafts': upcoming_drafts(request.user)
     })
 
 @login_required
-def ai_suggestions_view(request):
+async def ai_suggestions_view(request):
+    """
+    Caption page
+
+    Async so that AJAX caption requests hold no thread while the provider
+    works; the page itself and plain form posts are handled synchronously.
+    """
+    if request.method == "POST" and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return await _ai_suggestions_ajax(request)
+    return await sync_to_async(_ai_suggestions_page)(request)
+
+
+async def _ai_suggestions_ajax(request):
+    user = await request.auser()
+    business = await sync_to_async(get_business_context)(user)
+    if not business.exists:
+        return JsonResponse({'success': False, 'error': 'Please complete your business profile first.'}, status=400)
+
+    user_input = request.POST.get("user_input", "").strip()
+    language = request.POST.get("language", "english")
+    length = request.POST.get("length", "small")
+    max_tokens = CAPTION_TOKENS.get(length, 100)
+    prompt = build_caption_prompt(business, user_input, language)
+    input_data = {
+        'user_input': user_input,
+        'language': language,
+        'length': length
+    }
+    # Repeated requests are answered from a rotating pool of earlier captions
+    cache_key = caption_cache_key(business, user_input, language, length)
+
+    if request.POST.get("stream") == "1":
+        # Tokens are sent as server-sent events; history is written when the stream completes
+        return sse_response_headers(StreamingHttpResponse(
+            caption_events(cache_key, user, business, prompt, max_tokens, input_data),
+            content_type='text/event-stream'
+        ))
+
+    if user_input:  # Only save if there's actual input
+        await SearchHistory.objects.aget_or_create(user=user, search_query=user_input)
+
     try:
-        profile = BusinessProfile.objects.get(user=request.user)
-    except BusinessProfile.DoesNotExist:
+        marketing_text, cache_hit = await aget_or_generate_caption(
+            cache_key, user, business, prompt, max_tokens, input_data
+        )
+        if cache_hit:
+            input_data['cache_hit'] = True
+    except Exception as e:
+        marketing_text = caption_error_message(e)
+
+    # Only save if not an error message
+    if marketing_text and not marketing_text.startswith("❌ Error:"):
+        await sync_to_async(record_caption)(user, input_data, marketing_text, prompt)
+
+    print(f"DEBUG: AJAX request received. Marketing text: {marketing_text[:100]}...")
+    return JsonResponse({
+        'success': True,
+        'marketing_text': marketing_text
+    })
+
+
+def _ai_suggestions_page(request):
+    business = get_business_context(request.user)
+    if not business.exists:
         # If no business profile exists, show a form to create one
         if request.method == 'POST':
             profile_form = BusinessProfileForm(request.POST, request.FILES)
@@ -391,79 +327,77 @@ def ai_suggestions_view(request):
         language = request.POST.get("language", "english")
         length = request.POST.get("length", "small")
         
+        max_tokens = CAPTION_TOKENS.get(length, 100)
+        prompt = build_caption_prompt(business, user_input, language)
+        input_data = {
+            'user_input': user_input,
+            'language': language,
+            'length': length
+        }
+
+        # Repeated requests are answered from a rotating pool of earlier captions
+        cache_key = caption_cache_key(business, user_input, language, length)
+
         if user_input:  # Only save if there's actual input
             # Save search to history (this will handle duplicates automatically due to unique_together)
             SearchHistory.objects.get_or_create(
                 user=request.user,
                 search_query=user_input
             )
-        
-        token_map = {"small": 100, "medium": 200, "long": 300}
-        max_tokens = token_map.get(length, 100)
-        # Get location details
-        location_parts = []
-        if profile.town:
-            location_parts.append(profile.town)
-        if profile.state:
-            location_parts.append(profile.state)
-        location_str = ", ".join(location_parts) if location_parts else "your area"
-        
-        prompt = f"""Task: Output only a funny and engaging social media caption for a business named {profile.business_name}.
-Language: {language}
-Business Name: {profile.business_name}
-Services: {profile.description}
-Location: {location_str}
-Focus: {user_input}
-Instructions: Use at least 4 relevant emojis. Output only the caption text."""
+
         try:
-            response = cohere_client.generate(
-                model="command",
-                prompt=prompt,
-                max_tokens=max_tokens,
-                temperature=0.7
+            marketing_text, cache_hit = get_or_generate_caption(
+                cache_key, request.user, business, prompt, max_tokens, input_data
             )
-            marketing_text = response.generations[0].text.strip()
+            if cache_hit:
+                input_data['cache_hit'] = True
         except Exception as e:
-            marketing_text = f"❌ Error: {str(e)}"
+            marketing_text = caption_error_message(e)
         
         # Track text generation in user history
         # Only save if not an error message
         if marketing_text and not marketing_text.startswith("❌ Error:"):
-            UserHistory.objects.create(
-                user=request.user,
-                action_type='text_generation',
-                input_data={
-                    'user_input': user_input,
-                    'language': language,
-                    'length': length
-                },
-                output_data=marketing_text,
-                prompt_used=prompt
-            )
-        
-        # Check if this is an AJAX request
-        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-            print(f"DEBUG: AJAX request received. Marketing text: {marketing_text[:100]}...")
-            try:
-                return JsonResponse({
-                    'success': True,
-                    'marketing_text': marketing_text
-                })
-            except Exception as e:
-                print(f"DEBUG: Error in AJAX response: {e}")
-                return JsonResponse({
-                    'success': False,
-                    'error': str(e)
-                })
+            record_caption(request.user, input_data, marketing_text, prompt)
     
     return render(request, 'core/ai_suggestions.html', {
         'marketing_text': marketing_text,
-        'profile': profile,
+        'business': business,
         'previous_searches': previous_searches
     })
 
+@login_required
+@require_POST
+def bulk_captions_view(request):
+    """
+    Generate many captions in one request
+
+    Body (JSON): {"items": [{"focus": "...", "language": "english", "length": "small"}, ...]}
+    Returns per-item results in the same order (see caption_utils.generate_bulk_captions).
+    """
+    business = get_business_context(request.user)
+    if not business.exists:
+        return JsonResponse({'success': False, 'error': 'Please complete your business profile first.'}, status=400)
+    try:
+        payload = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON body.'}, status=400)
+
+    items, error = parse_bulk_items(payload.get('items') if isinstance(payload, dict) else None)
+    if error:
+        return JsonResponse({'success': False, 'error': error}, status=400)
+
+    results = generate_bulk_captions(request.user, business, items)
+    return JsonResponse({
+        'success': True,
+        'total': len(results),
+        'succeeded': sum(1 for result in results if result['success']),
+        'cache_hits': sum(1 for result in results if result['cache_hit']),
+        'results': results,
+    })
+
 @login_required
 def feedback_view(request):
+    """Feedback form"""
     return render(request, "core/feedback.html")
 
 @login_required
@@ -496,6 +430,7 @@ def user_history_view(request):
 
 @login_required
 def profile_view(request):
+    """Edit the business profile and logo used by every AI feature"""
     # Get or create business profile
     profile, created = BusinessProfile.objects.get_or_create(user=request.user)
     
@@ -529,6 +464,7 @@ def profile_view(request):
                             'content_type': logo_file.content_type
                         },
                         output_data=profile.image_url,
+                        public_id=cloudinary_result['public_id'],
                         prompt_used="Logo upload"
                     )
                     
@@ -625,14 +561,15 @@ def profile_view(request):
 def poster_generator_view(request):
     """
     Handles poster generation using Gemini 3 Pro Image (Nano Banana).
-    This model has better text rendering and emotional understanding than Imagen.
+    The POST only queues a PosterJob; the run_poster_worker command generates
+    the poster and the page polls poster_job_status_view for the result.
     """
-    try:
-        profile = BusinessProfile.objects.get(user=request.user)
-    except BusinessProfile.DoesNotExist:
+    business = get_business_context(request.user)
+    if not business.exists:
         messages.error(request, "You must create a business profile first.")
         return redirect('dashboard')
 
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     poster_url = None
     
     # Always load the most recent poster for this user (in case of timeout/broken pipe)
@@ -644,7 +581,10 @@ def poster_generator_view(request):
     if request.method == 'POST':
         # Check if GOOGLE_API_KEY is configured
         if not settings.GOOGLE_API_KEY:
-            messages.error(request, "Poster generation is currently unavailable. Please configure GOOGLE_API_KEY in your .env file.")
+            error = "Poster generation is currently unavailable. Please configure GOOGLE_API_KEY in your .env file."
+            if is_ajax:
+                return JsonResponse({'success': False, 'error': error})
+            messages.error(request, error)
             return redirect('dashboard')
         promotion_name = request.POST.get("promotion_name", "").strip()
         offer_type = request.POST.get("offer_type")
@@ -652,182 +592,159 @@ def poster_generator_view(request):
         language = request.POST.get("language")
 
         if not promotion_name:
+            if is_ajax:
+                return JsonResponse({'success': False, 'error': "Please provide a promotion name."})
             messages.error(request, "Please provide a promotion name.")
+        elif request.POST.get("mode") == "campaign":
+            # Campaign mode: one poster per language x offer combination
+            languages = [lang for lang in request.POST.getlist("campaign_languages") if lang]
+            offers = [offer for offer in request.POST.getlist("campaign_offers") if offer]
+            variant_count = len(languages) * len(offers)
+            error = None
+            if not variant_count:
+                error = "Please choose at least one language and one offer for the campaign."
+            elif variant_count > settings.POSTER_CAMPAIGN_MAX_VARIANTS:
+                error = f"A campaign can have at most {settings.POSTER_CAMPAIGN_MAX_VARIANTS} posters (you selected {variant_count})."
+            if error:
+                if is_ajax:
+                    return JsonResponse({'success': False, 'error': error})
+                messages.error(request, error)
+                return redirect('generate_poster')
+
+            regenerate = request.POST.get("regenerate") == "on"
+            render_mode = request.POST.get("render_mode") or None
+            campaign_id, jobs = queue_poster_campaign(request.user, business, promotion_name, languages, offers,
+                                                      regenerate=regenerate, render_mode=render_mode)
+            print(f"DEBUG: Queued poster campaign {campaign_id} with {len(jobs)} jobs")
+            if is_ajax:
+                return JsonResponse({
+                    'success': True,
+                    'campaign_id': str(campaign_id),
+                    'total': len(jobs),
+                    'status_url': reverse('poster_campaign_status', args=[campaign_id])
+                })
+            messages.info(request, f"🎨 Your campaign of {len(jobs)} posters is being generated.")
         else:
             final_offer = custom_offer if offer_type == "Other" else offer_type
-            
-            # Extract key business details for marketing
-            business_name = profile.business_name
-            business_type = profile.description.split('.')[0] if profile.description else "Business"
-            
-            # Build location string from detailed fields
-            location_parts = []
-            if profile.town:
-                location_parts.append(profile.town)
-            if profile.district:
-                location_parts.append(profile.district)
-            if profile.state:
-                location_parts.append(profile.state)
-            if profile.country:
-                location_parts.append(profile.country)
-            location = ", ".join(location_parts) if location_parts else "Your Location"
-            
-            # Add detailed address if available
-            if profile.address:
-                location = f"{profile.address}, {location}"
-            
-            phone = profile.phone if profile.phone else "Your Phone"
-            
-            # Format business hours
-            if profile.business_hours_start and profile.business_hours_end:
-                timing = f"{profile.business_hours_start.strftime('%I:%M %p')} - {profile.business_hours_end.strftime('%I:%M %p')}"
-            else:
-                timing = "9:00 AM - 8:00 PM"
-            
-            prompt_text = f"""
-You are a creative director. Include emotional, atmospheric, and cultural details relevant to the promotion theme (e.g., festivals, seasons, etc). Keep the business details exact, but describe the visuals vividly.
-Create a professional and eye-catching marketing poster for the business "{business_name}" to boost customer engagement and promote its latest offer.
-
-BUSINESS INFO:
-- Business Name: {business_name}
-- Business Type: {business_type}
-- Location: {location}
-- Phone: {phone}
-- Timing: {timing}
-
-PROMOTION:
-- Promotion Name: {promotion_name}
-- Main Offer: {final_offer}
-- Language: {language}
-
-DESIGN GUIDELINES:
-- Format optimized for Instagram and WhatsApp sharing
-- Display the business name clearly at the top
-- **MANDATORY: Include 2-3 keywords or service names related to {business_type} (e.g., "Hair • Makeup • Spa" or "Bridal Services • Facials • Styling") prominently on the poster**
-- Highlight the promotion name and main offer with bold and attractive fonts
-- Use colors and typography that match the business theme
-- **CRITICAL: Use ONLY cartoon/animated/illustrated style visuals. DO NOT generate realistic human photographs or images.**
-- Include relevant cartoon/animated visuals or illustrations:
-  - If {business_type} is "salon" or "beauty parlour", use cartoon/animated illustrations of beauty tools, cosmetics, or stylized beauty elements (combs, scissors, lipstick, mirrors, etc.)
-  - Otherwise, use cartoon/animated icons/illustrations that match the business type (e.g., cartoon tools, tech icons, food illustrations)
-  - **Absolutely NO realistic human faces or photographs - only cartoon/animated style**
-- Keep the layout clean and easy to read on mobile
-- Add marketing elements like badges, stickers, or call-to-action text (e.g., "Call Now", "Limited Offer", "Visit Today")
-- Ensure the design remains professional, family-friendly, and suitable for public social media marketing.
-
-POSTER GOAL:
-- Should look modern, polished, and shareable
-- Designed to attract attention and drive real engagement on social media
-- Must clearly communicate what services the business provides through keywords
-"""
-
+            regenerate = request.POST.get("regenerate") == "on"
+            render_mode = request.POST.get("render_mode") or None
+            job = queue_poster_job(request.user, business, promotion_name, final_offer, language,
+                                   regenerate=regenerate, render_mode=render_mode)
+            print(f"DEBUG: Queued poster job {job.id} (status={job.status})")
 
-
-
-            
-            print(prompt_text)
-            try:
-                print(f"DEBUG: About to generate image with Gemini 3 Pro Image (Nano Banana)")
-                
-                # --- NEW: Using Gemini 3 Pro Image (Nano Banana) for better text rendering ---
-                pil_image = generate_poster_gemini_3(prompt_text)
-                
-                if pil_image:
-                    print(f"DEBUG: Successfully generated PIL Image")
-                    
-                    # Convert PIL Image to bytes
-                    img_byte_arr = BytesIO()
-                    pil_image.save(img_byte_arr, format='PNG')
-                    image_bytes = img_byte_arr.getvalue()
-                    
-                    # Save the image locally
-                    filename = f"{uuid.uuid4()}.png"
-                    save_path = os.path.join(settings.MEDIA_ROOT, filename)
-                    print(f"DEBUG: Attempting to save to: {save_path}")
-                    
-                    # Save the image bytes
-                    with open(save_path, 'wb') as f:
-                        f.write(image_bytes)
-                    
-                    print(f"DEBUG: Image saved successfully")
-
-                    # Upload to Cloudinary
-                    print("DEBUG: Uploading to Cloudinary...")
-                    cloudinary_result = upload_image_to_cloudinary(
-                        image_bytes,
-                        folder="posters",
-                        public_id=f"poster_{request.user.username}_{uuid.uuid4().hex[:8]}"
-                    )
-                    
-                    if cloudinary_result['success']:
-                        poster_url = cloudinary_result['url']
-                        print(f"DEBUG: Cloudinary URL = {poster_url}")
-                        
-                        # Track poster generation
-                        PosterGeneration.objects.create(
-                            user=request.user,
-                            promotion_name=promotion_name,
-                            offer_type=final_offer,
-                            poster_url=poster_url
-                        )
-                        
-                        # Track in user history
-                        UserHistory.objects.create(
-                            user=request.user,
-                            action_type='poster_generation',
-                            input_data={
-                                'promotion_name': promotion_name,
-                                'offer_type': final_offer,
-                                'language': language,
-                                'business_name': business_name,
-                                'location': location,
-                                'phone': phone,
-                                'timing': timing
-                            },
-                            output_data=poster_url,
-                            prompt_used=prompt_text
-                        )
-                        
-                        print(f"DEBUG: About to return response with poster_url = {poster_url}")
-                        messages.success(request, "🎉 Poster generated successfully! Check below.")
-                    else:
-                        print(f"DEBUG: Cloudinary upload failed: {cloudinary_result['error']}")
-                        # Fallback to local storage
-                        poster_url = settings.MEDIA_URL + filename
-                        PosterGeneration.objects.create(
-                            user=request.user,
-                            promotion_name=promotion_name,
-                            offer_type=final_offer,
-                            poster_url=poster_url
-                        )
-                        messages.warning(request, "Poster generated but Cloudinary upload failed. Using local storage.")
-                else:
-                    print(f"DEBUG: Gemini 3 Pro Image failed to generate an image")
-                    messages.warning(request, "Image could not be generated (it may have been blocked by safety filters).")
-
-            except google.api_core.exceptions.ResourceExhausted as e:
-                # You will STILL get this error if you make requests too quickly.
-                messages.error(request, "🚦 Too many requests! Please wait a minute and try again.")
-                print(f"Quota Error: {e}")
-            except Exception as e:
-                messages.error(request, f"An unexpected error occurred: {e}")
-                print(f"General Error: {e}")
-                import traceback
-                print(f"DEBUG: Full traceback: {traceback.format_exc()}")
+            if is_ajax:
+                return JsonResponse({
+                    'success': True,
+                    'job_id': job.id,
+                    'status': job.status,
+                    'status_url': reverse('poster_job_status', args=[job.id]),
+                    'events_url': reverse('poster_job_events', args=[job.id])
+                })
+            if job.status == 'done':
+                messages.success(request, "🎉 Poster generated successfully! Check below.")
+            else:
+                messages.info(request, "🎨 Your poster is being generated. It will appear below in a moment.")
         
         # Redirect after POST to prevent resubmission on refresh
         return redirect('generate_poster')
 
+    # Resume polling for a poster that is still being generated
+    pending_job = PosterJob.objects.filter(user=request.user, status__in=['queued', 'running']).order_by('-created_at').first()
+
     context = {
-        'profile': profile,
+        'business': business,
         'poster_url': poster_url,
+        'pending_job': pending_job,
+        'default_render_mode': settings.POSTER_DEFAULT_RENDER_MODE,
         'MEDIA_URL': settings.MEDIA_URL,
     }
     return render(request, "core/generate_poster.html", context)
 
 
+@login_required
+async def poster_job_status_view(request, job_id):
+    """JSON status of a queued poster job, polled by the poster page"""
+    user = await request.auser()
+    job = await PosterJob.objects.filter(id=job_id, user=user).afirst()
+    if not job:
+        return JsonResponse({'success': False, 'error': 'Poster job not found.'}, status=404)
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'stage': job.stage,
+        'poster_url': job.poster_url,
+        'error': job.error,
+    })
+
+
+@login_required
+async def poster_job_events_view(request, job_id):
+    """
+    Server-sent events with the pipeline stages of a poster job
+
+    Async so that an open stream only costs a coroutine, not a worker thread,
+    when served by the ASGI app (parlorpal.asgi).
+    """
+    user = await request.auser()
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', 0))
+    except ValueError:
+        last_event_id = 0
+    return sse_response_headers(StreamingHttpResponse(
+        poster_job_events(job_id, user, last_event_id),
+        content_type='text/event-stream'
+    ))
+
+
+@login_required
+async def poster_campaign_status_view(request, campaign_id):
+    """JSON progress of a poster campaign, with wall-clock vs serial generation time"""
+    from .poster_utils import campaign_summary
+    user = await request.auser()
+    summary = await sync_to_async(campaign_summary)(campaign_id, user)
+    if not summary:
+        return JsonResponse({'success': False, 'error': 'Campaign not found.'}, status=404)
+    summary['success'] = True
+    return JsonResponse(summary)
+
+
+@login_required
+def metrics_view(request):
+    """Staff-only JSON snapshot of AI feature counters for this process"""
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Access denied. Staff only.'}, status=403)
+    from . import metrics
+    from .poster_cache import poster_cache_stats
+    data = metrics.snapshot()
+    data['poster_cache'] = poster_cache_stats()
+    data['rate_limits'] = bucket_stats()
+    data['caption_cache'] = caption_cache_stats()
+    data['text_providers'] = text_router_stats()
+    data['answer_cache'] = answer_cache.stats()
+    return JsonResponse(data)
+
+
+@login_required
+@require_POST
+def answer_cache_invalidate_view(request):
+    """
+    Staff-only: drop cached chatbot answers
+
+    POST 'page' (a URL path such as /generate_poster/) limits it to answers
+    given on that page; without it the whole cache is cleared.
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'success': False, 'error': 'Access denied. Staff only.'}, status=403)
+    page = request.POST.get('page', '').strip() or None
+    removed = answer_cache.invalidate(page)
+    print(f"DEBUG: {request.user.username} invalidated the chatbot answer cache ({page or 'all pages'}): {removed} entries")
+    return JsonResponse({'success': True, 'removed': removed, 'page': page})
+
+
 @login_required
 def insights_view(request):
+    """Charts of the user's posters, captions and videos over the last 30 days"""
     from datetime import timedelta
     from django.utils import timezone
     user = request.user
@@ -1008,164 +925,194 @@ def email_templates_view(request):
 
 @login_required
 @csrf_exempt
-def chatbot_view(request):
+async def chatbot_view(request):
+    """
+    Chat page and chatbot messages
+
+    Async: the queries of a message (page context, transcript, answer cache)
+    run in the request's sync thread, so Django closes their connection when
+    the request finishes; the provider calls, including a transcript summary,
+    hold no thread.
+    """
     if request.method == 'POST' and request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-        user_message = request.POST.get('message', '').strip()
-        current_page = request.POST.get('current_page', '').strip()
-        page_content = request.POST.get('page_content', '').strip()
-        if not user_message:
-            return JsonResponse({'success': False, 'error': 'Empty message.'})
-
-        # --- Fetch user business profile and recent activity ---
-        profile = BusinessProfile.objects.filter(user=request.user).first()
-        business_name = profile.business_name if profile and profile.business_name else "(not set)"
-        description = profile.description if profile and profile.description else "(not set)"
-        
-        # Location details
-        country = profile.country if profile and profile.country else "(not set)"
-        state = profile.state if profile and profile.state else "(not set)"
-        district = profile.district if profile and profile.district else "(not set)"
-        town = profile.town if profile and profile.town else "(not set)"
-        address = profile.address if profile and profile.address else "(not set)"
-        full_location = f"{town}, {district}, {state}, {country}" if all([town, district, state, country]) else "(not set)"
-        
-        phone = profile.phone if profile and profile.phone else "(not set)"
-        
-        # Business hours
-        if profile and profile.business_hours_start and profile.business_hours_end:
-            timing = f"{profile.business_hours_start.strftime('%I:%M %p')} - {profile.business_hours_end.strftime('%I:%M %p')}"
-        else:
-            timing = "(not set)"
-        
-        email = request.user.email if hasattr(request.user, 'email') else "(not set)"
-
-        # Recent posters
-        from core.models import PosterGeneration, UserHistory
-        last_posters = PosterGeneration.objects.filter(user=request.user).order_by('-id')[:3]
-        poster_list = []
-        for poster in last_posters:
-            poster_list.append(f"{poster.promotion_name} ({poster.offer_type})")
-        poster_str = ", ".join(poster_list) if poster_list else "No posters generated yet."
-
-        # Caption count
-        caption_count = UserHistory.objects.filter(user=request.user, action_type='text_generation').count()
-
-        # --- Multi-turn context: Store and use last 10 turns ---
-        history = request.session.get('chat_history', [])
-        history.append({'role': 'user', 'content': user_message})
-
-        # Build page-specific context
-        page_context = ""
-        if current_page:
-            page_context = f"\n\nCURRENT PAGE: {current_page}"
-            if page_content:
-                page_context += f"\n\nPAGE CONTENT (form fields, buttons, and elements visible to user):\n{page_content}\n\nUse this page content to help the user. If they ask about inputs, options, or features on the current page, refer to the PAGE CONTENT above."
-            else:
-                page_context += "\nThe user is currently on this page. Help them based on the page URL and context."
-
-        # --- Build rich system prompt ---
-        system_prompt = (
-            "You are ParlorPal’s AI assistant. Here is the user’s business profile and recent activity to help you answer their questions as a helpful, friendly, and knowledgeable assistant.\n"
-            f"Business Name: {business_name}\n"
-            f"Description: {description}\n"
-            f"Location: {full_location}\n" + f"Detailed Address: {address}\n"
-            f"Phone: {phone}\n"
-            f"Business Hours: {timing}\n"
-            f"Email: {email}\n"
-            f"Recent Posters: {poster_str}\n"
-            f"Captions Generated: {caption_count}\n"
-            f"{page_context}\n"
-            "Help the user with any questions about their business, marketing, or navigating ParlorPal.\n"
-            "If the user asks for captions, generate creative, engaging captions using their business info.\n"
-            "If the user asks about their business, use the profile info above.\n"
-            "If the user asks about navigation or what page they're on, use the CURRENT PAGE context above.\n"
-            "Always answer naturally and conversationally, as a real human assistant would.\n"
-        )
-        prompt_parts = [system_prompt]
-        for msg in history[-10:]:
-            prefix = "User:" if msg['role'] == 'user' else "Bot:"
-            prompt_parts.append(f"{prefix} {msg['content']}")
-        full_prompt = "\n".join(prompt_parts)
+        response, chat = await sync_to_async(_prepare_chat_message)(request)
+        if response is not None:
+            return response
+        user, conversation_id, user_message, business, current_page, page_content, context_key = chat
+
+        # --- Multi-turn context: append-only transcript with a running summary (see core.chat_transcript) ---
+        summary, turns = await aload_transcript(user, conversation_id)
+        # Only answers to opening questions are cached; later ones may lean on the earlier turns
+        if summary or turns:
+            context_key = None
+        full_prompt = _build_chat_prompt(user, business, current_page, page_content, summary, turns, user_message)
+
+        if request.POST.get('stream') == '1':
+            # Reply tokens are sent as server-sent events as the provider generates them
+            return sse_response_headers(StreamingHttpResponse(
+                chat_events(user, conversation_id, user_message, full_prompt, context_key),
+                content_type='text/event-stream'
+            ))
 
         try:
-            from google import genai
-            from google.genai import types
-            import os
-            client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=full_prompt,
-                config=types.GenerateContentConfig(
-                    thinking_config=types.ThinkingConfig(thinking_budget=0)
-                )
-            )
-            ai_reply = response.text
-            history.append({'role': 'bot', 'content': ai_reply})
-            request.session['chat_history'] = history[-10:]
+            ai_reply, provider = await agenerate_text(full_prompt, "chat", preferred=["gemini", "cohere"])
+            await sync_to_async(record_exchange)(user, conversation_id, user_message, ai_reply)
+            if context_key is not None:
+                # The answer cache syncs invalidations from the shared (database) cache
+                await sync_to_async(answer_cache.store)(user_message, context_key, ai_reply)
             return JsonResponse({'success': True, 'reply': ai_reply})
         except Exception as e:
+            if is_rate_limit_error(e):
+                return JsonResponse({'success': False, 'error': "🚦 Too many requests! Please wait a minute and try again."}, status=429)
             return JsonResponse({'success': False, 'error': str(e)})
     else:
-        # Optionally clear history on GET
-        request.session['chat_history'] = []
-        return render(request, 'core/chatbot.html', {'user': request.user})
-
-def email_subjects_view(request):
-    from django.contrib.auth.decorators import login_required
-    from django.utils.decorators import method_decorator
-    @login_required
-    def inner(request):
-        subject_lines = []
-        error = None
-        profile = BusinessProfile.objects.filter(user=request.user).first()
-        business_name = profile.business_name if profile and profile.business_name else "(not set)"
-        description = profile.description if profile and profile.description else "(not set)"
-        if request.method == 'POST':
-            offer = request.POST.get('offer', '').strip()
-            audience = request.POST.get('audience', '').strip()
-            tone = request.POST.get('tone', '').strip()
-            prompt = (
-                f"Suggest 5 engaging email subject lines for a business named '{business_name}'. "
-                f"Description: {description}. "
-                f"Offer: {offer}. "
-                f"Target audience: {audience}. "
-                f"Tone: {tone}. "
-                "Make them catchy, relevant, and suitable for a marketing campaign."
-            )
-            try:
-                from google import genai
-                from google.genai import types
-                import os
-                client = genai.Client(api_key=os.getenv('GEMINI_API_KEY'))
-                response = client.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=prompt,
-                    config=types.GenerateContentConfig(
-                        thinking_config=types.ThinkingConfig(thinking_budget=0)
-                    )
-                )
-                # Split lines if possible
-                lines = response.text.strip().split('\n')
-                subject_lines = [line for line in lines if line.strip()]
-            except Exception as e:
+        # Opening the chat page starts a new conversation
+        await sync_to_async(get_conversation_id)(request, reset=True)
+        return await sync_to_async(render)(request, 'core/chatbot.html', {'user': await request.auser()})
+
+
+def _prepare_chat_message(request):
+    """
+    Everything a chatbot message needs from the database before the transcript is loaded
+
+    Returns:
+        tuple: (response to send instead, None), or
+               (None, (user, conversation_id, user_message, business context, current page,
+                       page content, answer cache context))
+    """
+    user_message = request.POST.get('message', '').strip()
+    current_page = request.POST.get('current_page', '').strip()
+    page_content = request.POST.get('page_content', '')  # unstripped: it is hashed as sent
+    page_hash = request.POST.get('page_hash', '').strip()
+    if not user_message:
+        return JsonResponse({'success': False, 'error': 'Empty message.'}), None
+
+    # --- Navigation and how-to questions: answered from the URL map (see core.intent_router) ---
+    routed = route_intent(user_message, current_page, is_staff=request.user.is_staff)
+    if routed:
+        reply, links, intent = routed
+        record_exchange(request.user, get_conversation_id(request), user_message, reply)
+        if request.POST.get('stream') == '1':
+            return sse_response_headers(StreamingHttpResponse(
+                instant_chat_events(reply, links=links, intent=intent), content_type='text/event-stream'
+            )), None
+        return JsonResponse({'success': True, 'reply': reply, 'links': links, 'intent': intent}), None
+
+    # --- Page description: sent as a hash, uploaded only when we don't have it (see core.page_context) ---
+    page_content, page_context_missing = resolve_page_context(current_page, page_hash, page_content)
+    if page_context_missing:
+        return JsonResponse({'success': False, 'page_context_missing': True}), None
+
+    # --- User business profile and recent activity (cached, see core.business_context) ---
+    business = get_business_context(request.user)
+
+    # The exchange is stored only once the reply is complete
+    conversation_id = get_conversation_id(request)
+
+    # --- Repeated questions: answer from the similarity cache (see core.answer_cache) ---
+    context_key = answer_context(current_page, business)
+    cached_reply, similarity = answer_cache.lookup(user_message, context_key)
+    if cached_reply:
+        print(f"DEBUG: Chatbot answer cache hit ({similarity:.2f}) on {current_page}")
+        record_exchange(request.user, conversation_id, user_message, cached_reply)
+        if request.POST.get('stream') == '1':
+            return sse_response_headers(StreamingHttpResponse(
+                instant_chat_events(cached_reply, cached=True), content_type='text/event-stream'
+            )), None
+        return JsonResponse({'success': True, 'reply': cached_reply, 'cached': True}), None
+
+    return None, (request.user, conversation_id, user_message, business, current_page, page_content, context_key)
+
+
+def _build_chat_prompt(user, business, current_page, page_content, summary, turns, user_message):
+    """Chatbot prompt: business profile, current page, transcript and the new message"""
+    full_location = ", ".join(
+        business.get(part) for part in ('town', 'district', 'state', 'country')
+    )
+    email = user.email if hasattr(user, 'email') else "(not set)"
+
+    # Build page-specific context
+    page_context = ""
+    if current_page:
+        page_context = f"\n\nCURRENT PAGE: {current_page}"
+        if page_content:
+            page_context += f"\n\nPAGE CONTENT (form fields, buttons, and elements visible to user):\n{page_content}\n\nUse this page content to help the user. If they ask about inputs, options, or features on the current page, refer to the PAGE CONTENT above."
+        else:
+            page_context += "\nThe user is currently on this page. Help them based on the page URL and context."
+
+    # --- Build rich system prompt ---
+    system_prompt = (
+        "You are ParlorPal’s AI assistant. Here is the user’s business profile and recent activity to help you answer their questions as a helpful, friendly, and knowledgeable assistant.\n"
+        f"Business Name: {business.get('business_name')}\n"
+        f"Description: {business.get('description')}\n"
+        f"Location: {full_location}\n" + f"Detailed Address: {business.get('address')}\n"
+        f"Phone: {business.get('phone')}\n"
+        f"Business Hours: {business.get('timing')}\n"
+        f"Email: {email}\n"
+        f"Recent Posters: {business.recent_posters_text()}\n"
+        f"Captions Generated: {business.caption_count}\n"
+        f"{page_context}\n"
+        "Help the user with any questions about their business, marketing, or navigating ParlorPal.\n"
+        "If the user asks for captions, generate creative, engaging captions using their business info.\n"
+        "If the user asks about their business, use the profile info above.\n"
+        "If the user asks about navigation or what page they're on, use the CURRENT PAGE context above.\n"
+        "Always answer naturally and conversationally, as a real human assistant would.\n"
+    )
+    prompt_parts = [system_prompt]
+    if summary:
+        prompt_parts.append(f"Summary of the earlier conversation: {summary}")
+    prompt_parts.extend(format_turn(turn) for turn in turns)
+    prompt_parts.append(f"User: {user_message}")
+    return "\n".join(prompt_parts)
+
+@login_required
+async def email_subjects_view(request):
+    """
+    Email subject line ideas
+
+    The page posts the form over AJAX and gets {'success', 'subject_lines', 'cached'}
+    back; a plain form post still renders the page. Async so the provider call
+    holds no thread.
+    """
+    subject_lines = []
+    error = None
+    user = await request.auser()
+    business = await sync_to_async(get_business_context)(user)
+    if request.method == 'POST':
+        # "Other" options come with a custom text field
+        choices = {}
+        for field in ('offer', 'audience', 'tone'):
+            value = request.POST.get(field, '').strip()
+            if value == 'Other':
+                value = request.POST.get(f'{field}_custom', '').strip()
+            choices[field] = value
+        cached = False
+        try:
+            subject_lines, cached = await aget_or_generate_email_subjects(business, **choices)
+        except Exception as e:
+            if is_rate_limit_error(e):
+                error = "🚦 Too many requests! Please wait a minute and try again."
+            else:
                 error = str(e)
-        return render(request, 'core/email_subjects.html', {
-            'subject_lines': subject_lines,
-            'error': error,
-            'profile': profile
-        })
-    return inner(request)
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            if error:
+                return JsonResponse({'success': False, 'error': error})
+            return JsonResponse({'success': True, 'subject_lines': subject_lines, 'cached': cached})
+    return await sync_to_async(render)(request, 'core/email_subjects.html', {
+        'subject_lines': subject_lines,
+        'error': error,
+        'business': business
+    })
 
+@login_required
 def generate_video_view(request):
-    import os
-    import time
-    import requests
-    from django.contrib.auth.decorators import login_required
-    from django.utils.decorators import method_decorator
-    from .models import BusinessProfile
-    from django.conf import settings
-    video_url = None
-    error = None
+    """
+    Generate a short promotional video from a campaign, theme and script
+
+    The POST only queues a VideoJob; the run_video_poller command submits it
+    to Veo and tracks the operation, and the page polls video_job_status_view.
+    """
+    is_ajax = request.headers.get('X-Requested-With') == 'XMLHttpRequest'
     if request.method == 'POST':
         campaign_name = request.POST.get('campaign_name', '').strip()
         if campaign_name == 'Other':
@@ -1174,71 +1121,63 @@ def generate_video_view(request):
         if theme == 'Other':
             theme = request.POST.get('theme_custom', '').strip()
         aspect_ratio = request.POST.get('aspect_ratio', '16:9')
+        if aspect_ratio not in ('16:9', '9:16'):
+            aspect_ratio = '16:9'
         script = request.POST.get('script', '').strip()
-        api_key = os.getenv('GOOGLE_VERTEX_API_KEY')
-        # Fetch business profile details
-        profile = BusinessProfile.objects.filter(user=request.user).first()
-        business_name = profile.business_name if profile and profile.business_name else ""
-        description = profile.description if profile and profile.description else ""
-        try:
-            from google import genai
-            from google.genai import types
-            client = genai.Client(api_key=api_key)
-            prompt = (
-                f"Generate a marketing video using the following details.\n"
-                f"Script: {script}\n"
-                f"Theme: {theme}\n"
-                f"Campaign Name: {campaign_name}\n"
-                f"\nUse the details below as reference only (do not include verbatim):\n"
-                f"Business Name: {business_name}\n"
-                f"Description: {description}"
-            )
-            operation = client.models.generate_videos(
-                model="veo-3.0-generate-preview",
-                prompt=prompt,
-                config=types.GenerateVideosConfig(
-                    person_generation="allow_all",
-                    aspect_ratio=aspect_ratio,
-                ),
-            )
-            # Wait for operation to complete (polling)
-            for _ in range(30):  # Wait up to 10 minutes (20s * 30)
-                if operation.done:
-                    break
-                time.sleep(20)
-                operation = client.operations.get(operation)
-            if operation.done and hasattr(operation.response, 'generated_videos') and operation.response.generated_videos:
-                generated_video = operation.response.generated_videos[0]
-                if hasattr(generated_video.video, 'uri'):
-                    video_uri = generated_video.video.uri
-                    # Download the video file and save to media/videos
-                    try:
-                        media_videos_path = os.path.join(settings.MEDIA_ROOT, 'videos')
-                        os.makedirs(media_videos_path, exist_ok=True)
-                        filename = f"video_{int(time.time())}.mp4"
-                        file_path = os.path.join(media_videos_path, filename)
-                        r = requests.get(video_uri, stream=True)
-                        if r.status_code == 200:
-                            with open(file_path, 'wb') as f:
-                                for chunk in r.iter_content(chunk_size=8192):
-                                    f.write(chunk)
-                            video_url = settings.MEDIA_URL + f"videos/{filename}"
-                        else:
-                            error = 'Failed to download generated video.'
-                            video_url = 'https://www.w3schools.com/html/mov_bbb.mp4'  # Fallback
-                    except Exception as e:
-                        error = f"Video download failed: {str(e)}"
-                        video_url = 'https://www.w3schools.com/html/mov_bbb.mp4'  # Fallback
-                else:
-                    video_url = 'https://www.w3schools.com/html/mov_bbb.mp4'  # Fallback
-            else:
-                error = 'Video generation did not complete successfully.'
-        except Exception as e:
-            error = f"Video generation failed: {str(e)}"
-            video_url = 'https://www.w3schools.com/html/mov_bbb.mp4'  # Fallback
+
+        error = None
+        if not os.getenv('GOOGLE_VERTEX_API_KEY'):
+            error = "Video generation is currently unavailable. Please configure GOOGLE_VERTEX_API_KEY in your .env file."
+        elif not script:
+            error = "Please describe your video idea or script."
+        if error:
+            if is_ajax:
+                return JsonResponse({'success': False, 'error': error})
+            messages.error(request, error)
+            return redirect('generate_video')
+
+        # Business profile details (cached)
+        business = get_business_context(request.user)
+        job = queue_video_job(request.user, business, campaign_name, theme, aspect_ratio, script)
+        print(f"DEBUG: Queued video job {job.id}")
+        if is_ajax:
+            return JsonResponse({
+                'success': True,
+                'job_id': job.id,
+                'status': job.status,
+                'status_url': reverse('video_job_status', args=[job.id])
+            })
+        messages.info(request, "🎬 Your video is being generated. It will appear below in a few minutes.")
+        return redirect('generate_video')
+
+    # Resume polling for a video that is still being generated
+    pending_job = VideoJob.objects.filter(user=request.user, status__in=['queued', 'submitting', 'running']).first()
+    latest_job = VideoJob.objects.filter(user=request.user, status='done').first()
     return render(request, 'core/generate_video.html', {
-        'video_url': video_url,
-        'error': error
+        'video_url': latest_job.video_url if latest_job else None,
+        'pending_job': pending_job,
+    })
+
+
+@login_required
+async def video_job_status_view(request, job_id):
+    """JSON status of a queued video job, polled by the video page"""
+    from django.utils import timezone
+    user = await request.auser()
+    job = await VideoJob.objects.filter(id=job_id, user=user).afirst()
+    if not job:
+        return JsonResponse({'success': False, 'error': 'Video job not found.'}, status=404)
+    # Nothing changes before the poller's next check of the operation
+    poll_after = 3
+    if job.status == 'running' and job.next_poll_at:
+        poll_after = min(30, max(3, (job.next_poll_at - timezone.now()).total_seconds()))
+    return JsonResponse({
+        'success': True,
+        'job_id': job.id,
+        'status': job.status,
+        'video_url': job.video_url,
+        'error': job.error,
+        'poll_after': round(poll_after),
     })
 
 
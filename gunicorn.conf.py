@@ -0,0 +1,22 @@
+# Gunicorn settings for the web service (gunicorn reads ./gunicorn.conf.py on start)
+#
+# The app is served as ASGI by uvicorn workers: async views (chatbot, captions,
+# email subjects, poster progress) wait on the AI providers without holding a
+# thread, so one worker keeps hundreds of slow provider calls in flight.
+# Compare with the old WSGI setup: python manage.py benchmark_concurrency
+import os
+
+wsgi_app = "parlorpal.asgi:application"
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Workers are processes; concurrency within a worker comes from the event loop
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# Provider calls give up after TEXT_ROUTER_TIMEOUT (45s); leave room for that plus the response
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", "5"))
+
+# Open connections per worker before new ones wait in the listen backlog
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", "1000"))
@@ -2,6 +2,9 @@
 ASGI config for parlorpal project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Production serves it with gunicorn's uvicorn worker (see gunicorn.conf.py), so
+async views such as the chatbot and the poster progress stream do not tie up a
+thread while waiting.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -14,3 +17,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "parlorpal.settings")
 
 application = get_asgi_application()
+
+# Build the chatbot's page index (core.intent_router) now rather than on the first chat message
+from core.intent_router import route_index  # noqa: E402
+
+route_index()
@@ -14,6 +14,7 @@ from pathlib import Path
 # from decouple import config  # This import doesn't exist
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 
@@ -28,9 +29,142 @@ GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")  # For Gemini 3 Pro Image (Nano Ban
 GOOGLE_VERTEX_API_KEY = os.getenv("GOOGLE_VERTEX_API_KEY")
 VERTEX_IMAGE_ENDPOINT = os.getenv("VERTEX_IMAGE_ENDPOINT")
 GCP_PROJECT_ID= os.getenv("GCP_PROJECT_ID")
+
+# Pooled AI provider clients (core.genai_clients), one per API key per process
+AI_HTTP_MAX_CONNECTIONS = int(os.getenv("AI_HTTP_MAX_CONNECTIONS", "20"))
+AI_HTTP_MAX_KEEPALIVE = int(os.getenv("AI_HTTP_MAX_KEEPALIVE", "10"))
+AI_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("AI_HTTP_KEEPALIVE_EXPIRY", "60"))  # seconds an idle connection is kept
+
+# Token buckets shared by all processes on this node (core.rate_limit), per provider / model
+AI_RATE_LIMIT_DIR = os.getenv("AI_RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "parlorpal-ratelimit"))
+AI_RATE_LIMITS = {
+    'gemini': {'per_minute': int(os.getenv("GEMINI_RPM", "60")), 'burst': 5},
+    'gemini-image': {'per_minute': int(os.getenv("GEMINI_IMAGE_RPM", "10")), 'burst': 3},
+    'imagen': {'per_minute': int(os.getenv("IMAGEN_RPM", "10")), 'burst': 2},
+    'veo': {'per_minute': int(os.getenv("VEO_RPM", "2")), 'burst': 1},
+    'cohere': {'per_minute': int(os.getenv("COHERE_RPM", "40")), 'burst': 5},
+    'default': {'per_minute': 30, 'burst': 3},
+}
+AI_RATE_LIMIT_MAX_QUEUE = int(os.getenv("AI_RATE_LIMIT_MAX_QUEUE", "20"))  # callers allowed to wait per bucket
+AI_RATE_LIMIT_MAX_WAIT = float(os.getenv("AI_RATE_LIMIT_MAX_WAIT", "120"))  # seconds, background work
+AI_RATE_LIMIT_WEB_MAX_WAIT = float(os.getenv("AI_RATE_LIMIT_WEB_MAX_WAIT", "15"))  # seconds, inside a web request
+AI_RATE_LIMIT_MAX_RETRIES = int(os.getenv("AI_RATE_LIMIT_MAX_RETRIES", "2"))
+AI_RATE_LIMIT_BASE_DELAY = float(os.getenv("AI_RATE_LIMIT_BASE_DELAY", "2"))
+
+# Cached BusinessContext per user (core.business_context); signals invalidate it in the
+# process that saved the change, the timeout bounds staleness in other workers
+BUSINESS_CONTEXT_CACHE_SECONDS = int(os.getenv("BUSINESS_CONTEXT_CACHE_SECONDS", "300"))
+
+# Poster generation worker (python manage.py run_poster_worker)
+POSTER_WORKER_CONCURRENCY = int(os.getenv("POSTER_WORKER_CONCURRENCY", "2"))
+POSTER_WORKER_POLL_INTERVAL = float(os.getenv("POSTER_WORKER_POLL_INTERVAL", "2"))
+POSTER_JOB_STALE_SECONDS = int(os.getenv("POSTER_JOB_STALE_SECONDS", "600"))  # re-queue jobs of a crashed worker
+POSTER_CAMPAIGN_CONCURRENCY = int(os.getenv("POSTER_CAMPAIGN_CONCURRENCY", "3"))  # parallel model calls per campaign
+POSTER_CAMPAIGN_MAX_VARIANTS = int(os.getenv("POSTER_CAMPAIGN_MAX_VARIANTS", "9"))
+POSTER_MAX_RETRIES = int(os.getenv("POSTER_MAX_RETRIES", "3"))  # retries after a quota (429) error
+POSTER_RETRY_BASE_DELAY = float(os.getenv("POSTER_RETRY_BASE_DELAY", "5"))  # seconds, doubled on each retry
+
+# Video generation poller (python manage.py run_video_poller): one loop submits queued
+# VideoJobs to Veo and checks every running operation when its next_poll_at comes due
+VIDEO_POLLER_IDLE_INTERVAL = float(os.getenv("VIDEO_POLLER_IDLE_INTERVAL", "2"))  # seconds between queue checks
+VIDEO_POLL_EXPECTED_SECONDS = float(os.getenv("VIDEO_POLL_EXPECTED_SECONDS", "60"))  # until enough videos were timed
+VIDEO_POLL_MIN_INTERVAL = float(os.getenv("VIDEO_POLL_MIN_INTERVAL", "5"))
+VIDEO_POLL_MAX_INTERVAL = float(os.getenv("VIDEO_POLL_MAX_INTERVAL", "60"))
+VIDEO_POLL_BATCH_SIZE = int(os.getenv("VIDEO_POLL_BATCH_SIZE", "50"))  # operations checked per loop
+VIDEO_JOB_TIMEOUT_SECONDS = int(os.getenv("VIDEO_JOB_TIMEOUT_SECONDS", "1200"))  # give up on an operation after this
+VIDEO_JOB_STALE_SECONDS = int(os.getenv("VIDEO_JOB_STALE_SECONDS", "300"))  # re-queue submissions of a crashed poller
+
+# Hedged poster requests: Imagen is also asked once Gemini is slower than its observed percentile
+POSTER_PROVIDER_POOL_SIZE = int(os.getenv("POSTER_PROVIDER_POOL_SIZE", "8"))
+POSTER_HEDGE_PERCENTILE = float(os.getenv("POSTER_HEDGE_PERCENTILE", "95"))
+POSTER_HEDGE_MIN_SAMPLES = int(os.getenv("POSTER_HEDGE_MIN_SAMPLES", "20"))  # below this the default delay is used
+POSTER_HEDGE_DEFAULT_DELAY = float(os.getenv("POSTER_HEDGE_DEFAULT_DELAY", "45"))  # seconds
+POSTER_HEDGE_MIN_DELAY = float(os.getenv("POSTER_HEDGE_MIN_DELAY", "10"))
+POSTER_HEDGE_MAX_DELAY = float(os.getenv("POSTER_HEDGE_MAX_DELAY", "120"))
+
+# Poster result cache (identical prompt + model + language reuses the stored poster)
+POSTER_CACHE_TTL_SECONDS = int(os.getenv("POSTER_CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+POSTER_CACHE_MAX_ENTRIES = int(os.getenv("POSTER_CACHE_MAX_ENTRIES", "500"))
+
+# Width steps (px) of the Cloudinary renditions used in poster srcsets
+POSTER_RENDITION_WIDTHS = [160, 320, 480, 768, 1080]
+
+# Text generation router (captions, chat, email subjects): latency-aware routing, hedging, circuit breaker
+TEXT_ROUTER_POOL_SIZE = int(os.getenv("TEXT_ROUTER_POOL_SIZE", "8"))
+TEXT_ROUTER_TIMEOUT = float(os.getenv("TEXT_ROUTER_TIMEOUT", "45"))  # seconds before a request gives up
+TEXT_HEDGE_PERCENTILE = float(os.getenv("TEXT_HEDGE_PERCENTILE", "95"))
+TEXT_HEDGE_MIN_SAMPLES = int(os.getenv("TEXT_HEDGE_MIN_SAMPLES", "20"))  # below this the preferred order and default delay are used
+TEXT_HEDGE_DEFAULT_DELAY = float(os.getenv("TEXT_HEDGE_DEFAULT_DELAY", "8"))
+TEXT_HEDGE_MIN_DELAY = float(os.getenv("TEXT_HEDGE_MIN_DELAY", "1.5"))
+TEXT_HEDGE_MAX_DELAY = float(os.getenv("TEXT_HEDGE_MAX_DELAY", "20"))
+TEXT_BREAKER_FAILURES = int(os.getenv("TEXT_BREAKER_FAILURES", "5"))  # consecutive failures that open the breaker
+TEXT_BREAKER_COOLDOWN = float(os.getenv("TEXT_BREAKER_COOLDOWN", "30"))  # seconds before a trial call is allowed
+
+# AI caption cache: once POOL_SIZE captions exist for a request they are served in rotation
+CAPTION_CACHE_POOL_SIZE = int(os.getenv("CAPTION_CACHE_POOL_SIZE", "3"))
+CAPTION_CACHE_TTL_SECONDS = int(os.getenv("CAPTION_CACHE_TTL_SECONDS", str(24 * 3600)))
+CAPTION_CACHE_MAX_ENTRIES = int(os.getenv("CAPTION_CACHE_MAX_ENTRIES", "2000"))
+
+# Bulk captions (POST /ai/bulk/ and manage.py generate_bulk_captions)
+CAPTION_BULK_MAX_ITEMS = int(os.getenv("CAPTION_BULK_MAX_ITEMS", "50"))
+CAPTION_BATCH_SIZE = int(os.getenv("CAPTION_BATCH_SIZE", "5"))  # captions asked for in one provider call
+CAPTION_BULK_CONCURRENCY = int(os.getenv("CAPTION_BULK_CONCURRENCY", "4"))  # parallel provider calls per request
+
+# Festival drafts (manage.py pregenerate_festival_drafts): captions and a poster ready before the notification email
+FESTIVAL_DRAFT_LEAD_DAYS = int(os.getenv("FESTIVAL_DRAFT_LEAD_DAYS", "2"))  # start this many days before the notification date
+# Server-time hours "start-end" the command runs in without --force; 21-1 UTC is 02:30-06:30 IST
+FESTIVAL_DRAFT_OFF_PEAK_HOURS = tuple(int(hour) for hour in os.getenv("FESTIVAL_DRAFT_OFF_PEAK_HOURS", "21-1").split("-"))
+FESTIVAL_DRAFT_LANGUAGE = os.getenv("FESTIVAL_DRAFT_LANGUAGE", "english")
+FESTIVAL_DRAFT_OFFER = os.getenv("FESTIVAL_DRAFT_OFFER", "Festive offers on all services")
+
+# Chatbot transcript (ChatTurn rows + running ChatSummary instead of the session)
+CHAT_TRANSCRIPT_TOKEN_BUDGET = int(os.getenv("CHAT_TRANSCRIPT_TOKEN_BUDGET", "1500"))  # verbatim turns in the prompt
+CHAT_TRANSCRIPT_KEEP_TURNS = int(os.getenv("CHAT_TRANSCRIPT_KEEP_TURNS", "4"))  # latest turns never summarized
+CHAT_TRANSCRIPT_MAX_TURNS = int(os.getenv("CHAT_TRANSCRIPT_MAX_TURNS", "40"))  # rows kept per conversation
+CHAT_TRANSCRIPT_RETENTION_DAYS = int(os.getenv("CHAT_TRANSCRIPT_RETENTION_DAYS", "30"))
+CHAT_SUMMARY_MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "300"))
+CHAT_SUMMARY_CACHE_SECONDS = int(os.getenv("CHAT_SUMMARY_CACHE_SECONDS", "3600"))
+
+# Chat widget page descriptions, cached per page URL and content hash (core.page_context)
+PAGE_CONTEXT_CACHE_SECONDS = int(os.getenv("PAGE_CONTEXT_CACHE_SECONDS", str(7 * 24 * 3600)))
+PAGE_CONTEXT_MAX_CHARS = int(os.getenv("PAGE_CONTEXT_MAX_CHARS", "2000"))
+PAGE_CONTEXT_MAX_OPTIONS = int(os.getenv("PAGE_CONTEXT_MAX_OPTIONS", "12"))  # select options listed per field
+
+# Chatbot answer cache (core.answer_cache): similar questions on the same page reuse an answer
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.75"))  # trigram Jaccard needed for a hit
+ANSWER_CACHE_MIN_CHARS = int(os.getenv("ANSWER_CACHE_MIN_CHARS", "12"))  # shorter messages ("ok", "thanks") are never cached
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "20000"))  # per process, least recently used dropped first
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(6 * 3600)))
+ANSWER_CACHE_SYNC_SECONDS = int(os.getenv("ANSWER_CACHE_SYNC_SECONDS", "30"))  # how often other processes' invalidations are picked up
+
+# Email subject line suggestions (core.email_subjects), cached per profile version and inputs
+EMAIL_SUBJECTS_CACHE_SECONDS = int(os.getenv("EMAIL_SUBJECTS_CACHE_SECONDS", str(24 * 3600)))
+
+# Festival notification subjects (core.festival_subjects): variants generated once per festival and type
+FESTIVAL_SUBJECT_VARIANTS = int(os.getenv("FESTIVAL_SUBJECT_VARIANTS", "4"))
+FESTIVAL_SUBJECTS_CACHE_SECONDS = int(os.getenv("FESTIVAL_SUBJECTS_CACHE_SECONDS", str(7 * 24 * 3600)))
+FESTIVAL_SUBJECTS_RETRY_SECONDS = int(os.getenv("FESTIVAL_SUBJECTS_RETRY_SECONDS", "600"))  # fallback subjects are cached this long
+
+# Poster progress stream (server-sent events, served by the ASGI app)
+POSTER_EVENTS_POLL_INTERVAL = float(os.getenv("POSTER_EVENTS_POLL_INTERVAL", "0.5"))  # seconds between job reads
+POSTER_EVENTS_KEEPALIVE_SECONDS = float(os.getenv("POSTER_EVENTS_KEEPALIVE_SECONDS", "15"))
+POSTER_EVENTS_MAX_SECONDS = float(os.getenv("POSTER_EVENTS_MAX_SECONDS", "300"))  # the browser reconnects after this
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+# Composited posters: the model paints a text-free background, texts are drawn locally
+POSTER_DEFAULT_RENDER_MODE = os.getenv("POSTER_DEFAULT_RENDER_MODE", "composite")  # or "ai_text"
+POSTER_COMPOSITE_LAYOUT = os.getenv("POSTER_COMPOSITE_LAYOUT", "classic")  # see core.poster_compositor.LAYOUT_TEMPLATES
+POSTER_COMPOSITE_WIDTH = int(os.getenv("POSTER_COMPOSITE_WIDTH", "1080"))
+POSTER_BACKGROUND_TTL_SECONDS = int(os.getenv("POSTER_BACKGROUND_TTL_SECONDS", str(30 * 24 * 3600)))
+POSTER_BACKGROUND_MEMORY_CACHE = int(os.getenv("POSTER_BACKGROUND_MEMORY_CACHE", "16"))  # decoded backgrounds per process
+POSTER_FONT_DIRS = [
+    str(BASE_DIR / 'core' / 'fonts'),
+    '/usr/share/fonts/truetype/noto',
+    '/usr/share/fonts/opentype/noto',
+    '/usr/share/fonts/truetype/dejavu',
+]
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.1/howto/deployment/checklist/
@@ -161,6 +295,28 @@ DATABASES["sqlite"] = {
 }
 
 
+# Caches: "default" is per process (cheap hits for per-worker data such as the business
+# context); "shared" is seen by every worker and the background commands, for state one
+# process writes and the others must read (answer cache invalidations, page contexts).
+# Redis when REDIS_URL is set, otherwise a table in the default database
+# (python manage.py createcachetable).
+REDIS_URL = os.getenv("REDIS_URL")
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    } if REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.db.DatabaseCache",
+        "LOCATION": "parlorpal_shared_cache",
+        # Page contexts (one per page and form state) make up most entries
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("SHARED_CACHE_MAX_ENTRIES", "5000"))},
+    },
+}
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators